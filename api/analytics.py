@@ -0,0 +1,243 @@
+# analytics.py
+import logging
+import math
+from django.db import DatabaseError, IntegrityError, transaction
+from django.db.models import F
+
+from api.bulk import bulk_update_rows
+from api.grading import get_answer_key
+from api.models import QuestionStatistics, QuizAttempt, QuizStatistics, empty_histogram
+
+logger = logging.getLogger(__name__)
+
+MC_CHOICES = ('0', '1', '2', '3')
+OPTION_LABELS = {'0': 'A', '1': 'B', '2': 'C', '3': 'D'}
+QUESTION_FIELDS = ['attempt_count', 'correct_count', 'score_sum', 'score_squares',
+                   'correct_score_sum', 'choice_counts']
+
+
+def histogram_bucket(score):
+    return min(max(int(score // 10), 0), 9)
+
+
+def choice_key(question, result):
+    """
+    Bucket a stored MC answer as an option index, 'blank' or 'other'
+    """
+    if 'normalized_answer' in result:
+        answer = result['normalized_answer']
+    else:
+        # Graded before results kept the option index
+        user_answer = result.get('user_answer')
+        answer = question.normalize(user_answer if user_answer is not None else '')
+    if answer in MC_CHOICES:
+        return answer
+    return 'blank' if answer == '' else 'other'
+
+
+def _apply_results(question_stats, answer_key, score, results):
+    """
+    Add one attempt's per-question results to the question statistics rows
+    """
+    questions = {question.id: question for question in answer_key.questions}
+    for result in results or []:
+        stats = question_stats.get(result.get('question_id'))
+        if stats is None:
+            continue
+        stats.attempt_count += 1
+        stats.score_sum += score
+        stats.score_squares += score * score
+        if result.get('correct'):
+            stats.correct_count += 1
+            stats.correct_score_sum += score
+        question = questions.get(stats.question_id)
+        if question is not None and question.question_type == 'MC':
+            key = choice_key(question, result)
+            stats.choice_counts[key] = stats.choice_counts.get(key, 0) + 1
+
+
+def _question_stats_for(quiz, answer_key):
+    """
+    Return the quiz's question statistics keyed by question id, creating missing rows
+    """
+    question_stats = {
+        stats.question_id: stats
+        for stats in QuestionStatistics.objects.filter(quiz=quiz)
+    }
+    missing = [
+        QuestionStatistics(quiz=quiz, question_id=question.id)
+        for question in answer_key.questions
+        if question.id not in question_stats
+    ]
+    if missing:
+        QuestionStatistics.objects.bulk_create(missing, ignore_conflicts=True)
+        question_stats = {
+            stats.question_id: stats
+            for stats in QuestionStatistics.objects.filter(quiz=quiz)
+        }
+    return question_stats
+
+
+def record_attempt(attempt):
+    """
+    Fold a newly graded attempt into the running statistics of its quiz.
+
+    The counter UPDATE runs first so it takes the row (or, on SQLite, the
+    database) write lock before the JSON aggregates are read back, which
+    serializes concurrent submissions to the same quiz.
+    """
+    record_attempts(attempt.quiz, [attempt])
+
+
+def record_attempts(quiz, attempts):
+    """
+    Fold a batch of newly graded attempts of one quiz into its statistics
+    with the same number of queries as a single attempt
+    """
+    if not attempts:
+        return
+    try:
+        _record_attempts(quiz, attempts)
+    except DatabaseError:
+        # The attempts themselves are already stored; a rebuild brings the stats back in line
+        logger.exception('Could not update statistics for quiz %s', quiz.pk)
+
+
+def _record_attempts(quiz, attempts):
+    scores = [attempt.score for attempt in attempts]
+    count = len(scores)
+    score_sum = sum(scores)
+    score_squares = sum(score * score for score in scores)
+    answer_key = get_answer_key(quiz)
+
+    with transaction.atomic():
+        updated = QuizStatistics.objects.filter(quiz=quiz).update(
+            attempt_count=F('attempt_count') + count,
+            score_sum=F('score_sum') + score_sum,
+            score_squares=F('score_squares') + score_squares
+        )
+        if not updated:
+            try:
+                with transaction.atomic():
+                    QuizStatistics.objects.create(
+                        quiz=quiz, attempt_count=count, score_sum=score_sum, score_squares=score_squares
+                    )
+            except IntegrityError:
+                QuizStatistics.objects.filter(quiz=quiz).update(
+                    attempt_count=F('attempt_count') + count,
+                    score_sum=F('score_sum') + score_sum,
+                    score_squares=F('score_squares') + score_squares
+                )
+
+        stats = QuizStatistics.objects.only('quiz', 'histogram').get(quiz=quiz)
+        for score in scores:
+            stats.histogram[histogram_bucket(score)] += 1
+        stats.save(update_fields=['histogram', 'updated_at'])
+
+        question_stats = _question_stats_for(quiz, answer_key)
+        for attempt in attempts:
+            _apply_results(question_stats, answer_key, attempt.score, attempt.results)
+        bulk_update_rows(QuestionStatistics, list(question_stats.values()), QUESTION_FIELDS)
+
+
+def rebuild_quiz_statistics(quiz, chunk_size=2000):
+    """
+    Recompute a quiz's statistics from scratch from its stored attempts
+    """
+    answer_key = get_answer_key(quiz)
+    stats = QuizStatistics(quiz=quiz, histogram=empty_histogram())
+    question_stats = {
+        question.id: QuestionStatistics(quiz=quiz, question_id=question.id)
+        for question in answer_key.questions
+    }
+
+    attempts = QuizAttempt.objects.filter(quiz=quiz, status=QuizAttempt.GRADED).values('score', 'results')
+    for attempt in attempts.iterator(chunk_size=chunk_size):
+        score = attempt['score']
+        stats.attempt_count += 1
+        stats.score_sum += score
+        stats.score_squares += score * score
+        stats.histogram[histogram_bucket(score)] += 1
+        _apply_results(question_stats, answer_key, score, attempt['results'])
+
+    with transaction.atomic():
+        QuestionStatistics.objects.filter(quiz=quiz).delete()
+        QuestionStatistics.objects.bulk_create(question_stats.values())
+        stats.save()
+
+    logger.info('Rebuilt statistics for quiz %s from %s attempts', quiz.pk, stats.attempt_count)
+    return stats
+
+
+def discrimination(stats):
+    """
+    Point-biserial correlation between getting the question right and the quiz score
+    """
+    n = stats.attempt_count
+    correct = stats.correct_count
+    if n == 0 or correct in (0, n):
+        return None
+    mean = stats.score_sum / n
+    variance = stats.score_squares / n - mean * mean
+    if variance <= 1e-9:
+        return None
+    mean_correct = stats.correct_score_sum / correct
+    mean_wrong = (stats.score_sum - stats.correct_score_sum) / (n - correct)
+    p = correct / n
+    return (mean_correct - mean_wrong) / math.sqrt(variance) * math.sqrt(p * (1 - p))
+
+
+def quiz_analytics(quiz):
+    """
+    Build the analytics payload for a quiz from the stored aggregates only
+    """
+    stats = QuizStatistics.objects.filter(quiz=quiz).first()
+    if stats is None:
+        stats = QuizStatistics(quiz=quiz, histogram=empty_histogram())
+
+    n = stats.attempt_count
+    mean = stats.score_sum / n if n else None
+    std = math.sqrt(max(stats.score_squares / n - mean * mean, 0)) if n else None
+
+    question_stats = {
+        row.question_id: row
+        for row in QuestionStatistics.objects.filter(quiz=quiz)
+    }
+    questions = []
+    for question in quiz.questions.order_by('id'):
+        row = question_stats.get(question.id) or QuestionStatistics(quiz=quiz, question=question)
+        item = {
+            'question_id': question.id,
+            'question_text': question.question_text,
+            'question_type': question.question_type,
+            'attempts': row.attempt_count,
+            'percent_correct': row.correct_count / row.attempt_count * 100 if row.attempt_count else None,
+            'discrimination': discrimination(row),
+        }
+        if question.question_type == 'MC':
+            options = [question.option_a, question.option_b, question.option_c, question.option_d]
+            item['distribution'] = [
+                {
+                    'option': OPTION_LABELS[key],
+                    'text': options[int(key)],
+                    'count': row.choice_counts.get(key, 0)
+                }
+                for key in MC_CHOICES
+            ] + [
+                {'option': key, 'text': None, 'count': row.choice_counts.get(key, 0)}
+                for key in ('blank', 'other')
+            ]
+        questions.append(item)
+
+    return {
+        'quiz_id': quiz.pk,
+        'attempts': n,
+        'mean_score': mean,
+        'std_score': std,
+        'histogram': [
+            {'range': f'{bucket * 10}-{bucket * 10 + 9 if bucket < 9 else 100}', 'count': count}
+            for bucket, count in enumerate(stats.histogram)
+        ],
+        'questions': questions,
+        'updated_at': stats.updated_at,
+    }
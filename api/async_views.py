@@ -0,0 +1,163 @@
+# async_views.py
+"""
+Async versions of the hot read endpoints and of login, for deployments
+served through quizappapi/asgi.py. They return the same payloads as their
+DRF counterparts but wait on the database through the async ORM, so a slow
+client holds a coroutine rather than a worker thread.
+"""
+from functools import wraps
+
+from django.contrib.auth.models import AnonymousUser
+from django.http import HttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import exceptions, serializers, status
+from rest_framework.parsers import FormParser, JSONParser, MultiPartParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+from api.authentication import CachedJWTAuthentication, aget_cached_user, check_user, token_user_id
+from api.caching import aaccessible_quiz_ids, aget_quiz_version, response_cache, response_cache_key
+from api.logins import alogin
+from api.models import Class, Quiz, QuizAttempt
+from api.pagination import AttemptCursorPagination, IdCursorPagination
+from api.replicas import awrote_recently, reads_from_replica, replica_alias
+from api.serializers import (
+    ClassSerializer, CustomUserSerializer, EmailTokenObtainPairSerializer, QuizAttemptSerializer, QuizSerializer
+)
+
+jwt_authentication = CachedJWTAuthentication()
+
+
+def json_response(data, status_code=status.HTTP_200_OK):
+    return HttpResponse(JSONRenderer().render(data), status=status_code, content_type='application/json')
+
+
+async def authenticate(request):
+    """
+    JWTAuthentication with the user resolved through the user cache
+    """
+    header = jwt_authentication.get_header(request)
+    raw_token = jwt_authentication.get_raw_token(header) if header is not None else None
+    if raw_token is None:
+        return AnonymousUser()
+
+    validated_token = jwt_authentication.get_validated_token(raw_token)
+    return check_user(await aget_cached_user(token_user_id(validated_token)))
+
+
+def async_api_view(require_authentication=True, use_replica=True):
+    """
+    Wrap an async view taking (request, *args) where request is a DRF Request,
+    answering API errors the way DRF's exception handler does.
+
+    Its reads go to the replica, as for ReplicaReadMixin, unless use_replica
+    is off or the user wrote recently.
+    """
+    def decorator(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return json_response(
+                    {'detail': f'Method "{request.method}" not allowed.'},
+                    status.HTTP_405_METHOD_NOT_ALLOWED
+                )
+            try:
+                user = await authenticate(request)
+                if require_authentication and not user.is_authenticated:
+                    raise exceptions.NotAuthenticated()
+                api_request = Request(request)
+                api_request.user = user
+                replica = use_replica and replica_alias() is not None and not await awrote_recently(user)
+                with reads_from_replica(replica):
+                    return await view(api_request, *args, **kwargs)
+            except exceptions.APIException as exc:
+                detail = exc.detail if isinstance(exc.detail, (list, dict)) else {'detail': exc.detail}
+                return json_response(detail, exc.status_code)
+        return wrapper
+    return decorator
+
+
+async def paginated_response(request, queryset, paginator, serializer_class):
+    page = await paginator.apaginate_queryset(queryset, request)
+    serializer = serializer_class(page, many=True, context={'request': request})
+    return json_response(paginator.get_paginated_response(serializer.data).data)
+
+
+@async_api_view()
+async def profile(request):
+    return json_response(CustomUserSerializer(request.user, context={'request': request}).data)
+
+
+@async_api_view()
+async def class_list(request):
+    user = request.user
+    if user.is_teacher:
+        queryset = Class.objects.filter(teacher=user)
+    else:
+        queryset = Class.objects.filter(students=user)
+    queryset = ClassSerializer.setup_eager_loading(queryset, request)
+    return await paginated_response(request, queryset, IdCursorPagination(), ClassSerializer)
+
+
+@async_api_view()
+async def attempt_list(request):
+    user = request.user
+    if user.is_teacher:
+        queryset = QuizAttempt.objects.filter(quiz__teacher=user)
+    else:
+        queryset = QuizAttempt.objects.filter(student=user)
+    quiz_id = request.query_params.get('quiz')
+    if quiz_id is not None:
+        queryset = queryset.filter(quiz_id=quiz_id)
+    queryset = QuizAttemptSerializer.setup_eager_loading(queryset, request)
+    return await paginated_response(request, queryset, AttemptCursorPagination(), QuizAttemptSerializer)
+
+
+@async_api_view(require_authentication=False, use_replica=False)
+async def quiz_detail(request, pk):
+    user = request.user
+    if user.is_authenticated:
+        if user.is_teacher:
+            visible = Quiz.objects.filter(teacher=user)
+        else:
+            visible = Quiz.objects.filter(classes__students=user)
+        if pk not in await aaccessible_quiz_ids(user, visible):
+            raise exceptions.NotFound()
+
+    # Everyone allowed to open the quiz sees the same payload
+    key = response_cache_key('async-quiz-detail', request, await aget_quiz_version(pk), per_user=False)
+    store = response_cache()
+    content = await store.aget(key)
+    if content is None:
+        queryset = QuizSerializer.setup_eager_loading(Quiz.objects.filter(pk=pk), request)
+        quiz = await queryset.afirst()
+        if quiz is None:
+            raise exceptions.NotFound()
+        content = JSONRenderer().render(QuizSerializer(quiz, context={'request': request}).data)
+        await store.aset(key, content)
+    return HttpResponse(content, content_type='application/json')
+
+
+@csrf_exempt
+async def token_obtain(request):
+    """
+    The token endpoint, answering as /api/token/ does, with the password
+    hashed on the login pool while the event loop serves other requests
+    """
+    if request.method != 'POST':
+        return json_response({'detail': f'Method "{request.method}" not allowed.'}, status.HTTP_405_METHOD_NOT_ALLOWED)
+    serializer = EmailTokenObtainPairSerializer()
+    try:
+        data = Request(request, parsers=[JSONParser(), FormParser(), MultiPartParser()]).data
+        # Field checks only; validate() would log in synchronously
+        attrs = serializer.to_internal_value(data)
+        user = await alogin(attrs['username'], attrs['password'])
+    except exceptions.ParseError as exc:
+        return json_response({'detail': exc.detail}, exc.status_code)
+    except serializers.ValidationError as exc:
+        detail = exc.detail if isinstance(exc.detail, dict) else {api_settings.NON_FIELD_ERRORS_KEY: exc.detail}
+        return json_response(detail, status.HTTP_400_BAD_REQUEST)
+
+    refresh = serializer.get_token(user)
+    return json_response({'refresh': str(refresh), 'access': str(refresh.access_token)})
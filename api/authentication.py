@@ -0,0 +1,91 @@
+# authentication.py
+from django.conf import settings
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+
+from api.caching import aget_user_version, get_user_version, user_cache
+from api.models import CustomUser
+
+USER_KEY = 'user:{}:{}'
+
+
+def _user_key(user_id, version):
+    return USER_KEY.format(user_id, version)
+
+
+def cache_users():
+    # Off by default with a process-local cache, which only sees its own
+    # worker's version bumps; the authentication then costs what simplejwt's does
+    return getattr(settings, 'CACHE_AUTHENTICATED_USERS', False)
+
+
+def _users(user_id):
+    # The password hash stays out of the cache; it is loaded on first access
+    return CustomUser.objects.defer('password').filter(**{jwt_settings.USER_ID_FIELD: user_id})
+
+
+def get_cached_user(user_id):
+    """
+    The user with the given id, from the user cache when possible.
+
+    Entries are keyed by the user's version token, which the CustomUser
+    save and delete signals bump, so a changed or deleted user is never
+    served from the cache again. Without CACHE_AUTHENTICATED_USERS every
+    call reads the row.
+    """
+    if not cache_users():
+        return _users(user_id).first()
+    store = user_cache()
+    key = _user_key(user_id, get_user_version(user_id))
+    user = store.get(key)
+    if user is None:
+        user = _users(user_id).first()
+        if user is not None:
+            store.set(key, user)
+    return user
+
+
+async def aget_cached_user(user_id):
+    if not cache_users():
+        return await _users(user_id).afirst()
+    store = user_cache()
+    key = _user_key(user_id, await aget_user_version(user_id))
+    user = await store.aget(key)
+    if user is None:
+        user = await _users(user_id).afirst()
+        if user is not None:
+            await store.aset(key, user)
+    return user
+
+
+def check_user(user):
+    if user is None:
+        raise AuthenticationFailed(_('User not found'), code='user_not_found')
+    if not user.is_active:
+        raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+    return user
+
+
+def token_user_id(validated_token):
+    try:
+        return validated_token[jwt_settings.USER_ID_CLAIM]
+    except KeyError:
+        raise InvalidToken(_('Token contained no recognizable user identification'))
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication resolving the user through the user cache, so polling
+    clients do not cost a users-table query on every request.
+
+    Inert unless CACHE_AUTHENTICATED_USERS is on, which by default needs a
+    shared cache backend.
+    """
+
+    def get_user(self, validated_token):
+        if jwt_settings.CHECK_REVOKE_TOKEN:
+            # Needs the password hash, which is never cached
+            return super().get_user(validated_token)
+        return check_user(get_cached_user(token_user_id(validated_token)))
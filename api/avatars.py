@@ -0,0 +1,140 @@
+# avatars.py
+"""
+Resized variants of profile pictures.
+
+Each picture is known by a digest of its content (CustomUser.avatar_hash),
+and its variants are stored under avatars/<digest>/<size>.<format>. A new
+picture means a new digest and so new URLs, which is what makes the
+variants safe to cache forever. Variants are built when a picture is
+uploaded, or on the first request for one of them.
+"""
+import io
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.urls import reverse
+from PIL import Image, ImageOps
+
+from api.models import CustomUser
+from api.storage import content_hash
+
+AVATAR_DIR = 'avatars'
+FORMATS = {
+    'webp': ('WEBP', 'image/webp'),
+    'jpg': ('JPEG', 'image/jpeg'),
+}
+# Flattened onto white for formats without transparency
+BACKGROUND = (255, 255, 255)
+
+
+def avatar_sizes():
+    return tuple(getattr(settings, 'AVATAR_SIZES', (48, 128, 512)))
+
+
+def avatar_quality():
+    return getattr(settings, 'AVATAR_QUALITY', 80)
+
+
+def picture_hash(picture):
+    """
+    Digest of a profile picture, whether a fresh upload or a stored file.
+
+    Returns '' when the stored file cannot be read.
+    """
+    try:
+        if picture._committed:
+            with picture.storage.open(picture.name, 'rb') as file:
+                return content_hash(file)
+        return content_hash(picture)
+    except OSError:
+        return ''
+
+
+def variant_name(digest, size, extension):
+    return f'{AVATAR_DIR}/{digest}/{size}.{extension}'
+
+
+def variant_urls(digest, build_url):
+    """
+    {size: {format: url}} for every variant of a picture
+    """
+    return {
+        str(size): {
+            extension: build_url(reverse('avatar_variant', args=[digest, size, extension]))
+            for extension in FORMATS
+        }
+        for size in avatar_sizes()
+    }
+
+
+def _open_source(picture):
+    file = picture.storage.open(picture.name, 'rb') if picture._committed else picture
+    file.seek(0)
+    image = Image.open(file)
+    # JPEG can decode straight to a reduced scale, far cheaper than full size
+    image.draft('RGB', (max(avatar_sizes()),) * 2)
+    image = ImageOps.exif_transpose(image)
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'transparency' in image.info or image.mode in ('LA', 'PA') else 'RGB')
+    return image
+
+
+def _encode(image, image_format):
+    if image_format == 'JPEG' and image.mode == 'RGBA':
+        flattened = Image.new('RGB', image.size, BACKGROUND)
+        flattened.paste(image, mask=image.getchannel('A'))
+        image = flattened
+    output = io.BytesIO()
+    image.save(output, image_format, quality=avatar_quality(), optimize=image_format == 'JPEG')
+    return output.getvalue()
+
+
+def _store(name, content):
+    if default_storage.exists(name):
+        return
+    saved = default_storage.save(name, ContentFile(content))
+    if saved != name:
+        # Built concurrently by another request; keep theirs
+        default_storage.delete(saved)
+
+
+def build_variants(picture, digest):
+    """
+    Write every missing variant of a picture, decoding the source once
+    """
+    missing = [
+        (size, extension)
+        for size in avatar_sizes()
+        for extension in FORMATS
+        if not default_storage.exists(variant_name(digest, size, extension))
+    ]
+    if not missing:
+        return
+    source = _open_source(picture)
+    for size in sorted({size for size, _ in missing}, reverse=True):
+        resized = ImageOps.fit(source, (size, size), Image.Resampling.LANCZOS)
+        for extension in FORMATS:
+            if (size, extension) in missing:
+                _store(variant_name(digest, size, extension), _encode(resized, FORMATS[extension][0]))
+
+
+def variant_file(digest, size, extension):
+    """
+    Storage name of a variant, building the picture's variants if needed.
+
+    Returns None for unknown pictures, sizes and formats.
+    """
+    if size not in avatar_sizes() or extension not in FORMATS:
+        return None
+    name = variant_name(digest, size, extension)
+    if default_storage.exists(name):
+        return name
+    user = CustomUser.objects.filter(avatar_hash=digest).only('id', 'profile_picture', 'avatar_hash').first()
+    if user is None or not user.profile_picture:
+        return None
+    try:
+        build_variants(user.profile_picture, digest)
+    except OSError:
+        # Missing or unreadable source
+        return None
+    return name
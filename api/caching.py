@@ -0,0 +1,201 @@
+# caching.py
+import hashlib
+import time
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.http import HttpResponse
+from rest_framework.renderers import JSONRenderer
+
+QUIZ_VERSION_KEY = 'quiz:{}:version'
+QUIZ_LIST_VERSION_KEY = 'quiz:list:version'
+QUIZ_ACCESS_KEY = 'quiz:access:{}:{}:{}'
+REMOVALS_VERSION_KEY = 'collections:removals:version'
+USER_VERSION_KEY = 'user:{}:version'
+ROSTER_VERSION_KEY = 'class:{}:roster:version'
+
+
+def version_timeout():
+    # Process-local caches cannot see bumps made by other workers, so their
+    # version tokens expire to bound how long another worker can serve stale data
+    return getattr(settings, 'QUIZ_VERSION_TIMEOUT', None)
+
+
+def _get_version(key, store=cache):
+    version = store.get(key)
+    if version is None:
+        # A timestamp rather than a counter so an evicted version never
+        # comes back as a value an old cache entry was stored under
+        version = time.time_ns()
+        if not store.add(key, version, timeout=version_timeout()):
+            version = store.get(key, version)
+    return version
+
+
+def _get_versions(keys, store=cache):
+    """
+    _get_version for many keys with one read
+    """
+    versions = store.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            versions[key] = _get_version(key, store)
+    return [versions[key] for key in keys]
+
+
+async def _aget_version(key, store=cache):
+    version = await store.aget(key)
+    if version is None:
+        version = time.time_ns()
+        if not await store.aadd(key, version, timeout=version_timeout()):
+            version = await store.aget(key, version)
+    return version
+
+
+def get_quiz_version(quiz_id):
+    """
+    Return the current version token for a quiz, creating one if missing
+    """
+    return _get_version(QUIZ_VERSION_KEY.format(quiz_id))
+
+
+async def aget_quiz_version(quiz_id):
+    return await _aget_version(QUIZ_VERSION_KEY.format(quiz_id))
+
+
+def get_quiz_list_version():
+    """
+    Version token covering every quiz list. Roster changes bump the
+    students' user versions instead, which per-user entries also carry.
+    """
+    return _get_version(QUIZ_LIST_VERSION_KEY)
+
+
+async def aget_quiz_list_version():
+    return await _aget_version(QUIZ_LIST_VERSION_KEY)
+
+
+def bump_quiz_list_version():
+    cache.set(QUIZ_LIST_VERSION_KEY, time.time_ns(), timeout=version_timeout())
+
+
+def bump_quiz_version(*quiz_ids):
+    """
+    Invalidate everything cached for the given quizzes
+    """
+    if not quiz_ids:
+        return
+    version = time.time_ns()
+    keys = {QUIZ_VERSION_KEY.format(quiz_id): version for quiz_id in quiz_ids}
+    keys[QUIZ_LIST_VERSION_KEY] = version
+    cache.set_many(keys, timeout=version_timeout())
+
+
+def get_removals_version():
+    """
+    Version token bumped whenever rows leave a collection, which a
+    newest-updated_at validator alone cannot see
+    """
+    return _get_version(REMOVALS_VERSION_KEY)
+
+
+def bump_removals_version():
+    cache.set(REMOVALS_VERSION_KEY, time.time_ns(), timeout=version_timeout())
+
+
+def get_roster_versions(class_ids):
+    """
+    Version tokens for the rosters of the given classes. Joins and removals
+    bump these instead of writing the class rows, which a rush of joins
+    would all contend on.
+    """
+    return _get_versions([ROSTER_VERSION_KEY.format(class_id) for class_id in class_ids])
+
+
+def bump_roster_versions(class_ids):
+    version = time.time_ns()
+    cache.set_many({ROSTER_VERSION_KEY.format(class_id): version for class_id in class_ids},
+                   timeout=version_timeout())
+
+
+def user_cache():
+    return caches[getattr(settings, 'USER_CACHE_ALIAS', 'default')]
+
+
+def get_user_version(user_id):
+    """
+    Version token for everything cached about one user
+    """
+    return _get_version(USER_VERSION_KEY.format(user_id), user_cache())
+
+
+async def aget_user_version(user_id):
+    return await _aget_version(USER_VERSION_KEY.format(user_id), user_cache())
+
+
+def bump_user_version(*user_ids):
+    version = time.time_ns()
+    user_cache().set_many({USER_VERSION_KEY.format(user_id): version for user_id in user_ids},
+                          timeout=version_timeout())
+
+
+def response_cache():
+    return caches[getattr(settings, 'RESPONSE_CACHE_ALIAS', 'default')]
+
+
+def response_cache_key(prefix, request, *versions, per_user=True):
+    """
+    Key a rendered response by its full URL, the data versions and, unless
+    the payload is the same for everyone, the caller
+    """
+    user_id = 'any'
+    if per_user:
+        user_id = request.user.pk if request.user.is_authenticated else 'anon'
+    url = request.build_absolute_uri()
+    digest = hashlib.md5(f'{url}|{user_id}'.encode(), usedforsecurity=False).hexdigest()
+    return ':'.join([prefix, *(str(version) for version in versions), digest])
+
+
+def accessible_quiz_ids(user, queryset):
+    """
+    Ids of the quizzes a user can open, cached until quizzes or the user's classes change
+    """
+    key = QUIZ_ACCESS_KEY.format(get_quiz_list_version(), user.pk, get_user_version(user.pk))
+    quiz_ids = cache.get(key)
+    if quiz_ids is None:
+        quiz_ids = frozenset(queryset.values_list('id', flat=True))
+        cache.set(key, quiz_ids, timeout=version_timeout())
+    return quiz_ids
+
+
+async def aaccessible_quiz_ids(user, queryset):
+    """
+    accessible_quiz_ids for the async views, sharing its cache entries
+    """
+    key = QUIZ_ACCESS_KEY.format(await aget_quiz_list_version(), user.pk, await aget_user_version(user.pk))
+    quiz_ids = await cache.aget(key)
+    if quiz_ids is None:
+        quiz_ids = frozenset([quiz_id async for quiz_id in queryset.values_list('id', flat=True)])
+        await cache.aset(key, quiz_ids, timeout=version_timeout())
+    return quiz_ids
+
+
+def cached_response(request, key, build):
+    """
+    Serve rendered JSON from the response cache, or build, render and store it.
+
+    Only JSON requests are cached; on a hit neither the ORM nor the
+    serializers run.
+    """
+    renderer = getattr(request, 'accepted_renderer', None)
+    if renderer is None or renderer.format != 'json':
+        return build()
+
+    store = response_cache()
+    content = store.get(key)
+    if content is None:
+        response = build()
+        if response.status_code != 200:
+            return response
+        content = JSONRenderer().render(response.data)
+        store.set(key, content)
+    return HttpResponse(content, content_type='application/json')
@@ -0,0 +1,127 @@
+# exports.py
+import csv
+import json
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import router
+from django.http import StreamingHttpResponse
+
+from api.models import QuestionBank, QuizAttempt
+
+ATTEMPT_COLUMNS = {
+    'attempt_id': 'id',
+    'quiz_id': 'quiz_id',
+    'quiz_title': 'quiz__title',
+    'student_id': 'student_id',
+    'username': 'student__username',
+    'first_name': 'student__first_name',
+    'last_name': 'student__last_name',
+    'email': 'student__email',
+    'score': 'score',
+    'correct_questions': 'correct_questions',
+    'total_questions': 'total_questions',
+    'total_points': 'total_points',
+    'max_points': 'max_points',
+    'attempt_datetime': 'attempt_datetime',
+}
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+CHUNK_SIZE = 2000
+ROWS_PER_WRITE = 500
+
+
+class Echo:
+    """
+    File-like object whose write() hands the line straight back to the caller
+    """
+
+    def write(self, value):
+        return value
+
+
+def question_columns(question_ids):
+    columns = []
+    for question_id in question_ids:
+        columns.extend([f'q{question_id}_answer', f'q{question_id}_points'])
+    return columns
+
+
+def export_rows(attempts, question_ids=None, include_results=False):
+    """
+    Yield one flat dict per attempt, reading rows with values() in chunks.
+
+    With question_ids the per-question results are spread into
+    q<id>_answer / q<id>_points columns.
+    """
+    lookups = list(ATTEMPT_COLUMNS.values())
+    if question_ids is not None or include_results:
+        lookups.append('results')
+
+    rows = attempts.order_by('id').values(*lookups).iterator(chunk_size=CHUNK_SIZE)
+    for values in rows:
+        row = {column: values[lookup] for column, lookup in ATTEMPT_COLUMNS.items()}
+        if question_ids is not None:
+            answers = {result.get('question_id'): result for result in values['results'] or []}
+            for question_id in question_ids:
+                result = answers.get(question_id, {})
+                row[f'q{question_id}_answer'] = result.get('user_answer', '')
+                row[f'q{question_id}_points'] = result.get('points', '')
+        elif include_results:
+            row['results'] = values['results']
+        yield row
+
+
+def stream_csv(rows, columns):
+    writer = csv.DictWriter(Echo(), fieldnames=columns)
+    buffer = [writer.writeheader()]
+    for row in rows:
+        buffer.append(writer.writerow(row))
+        if len(buffer) >= ROWS_PER_WRITE:
+            yield ''.join(buffer)
+            buffer = []
+    if buffer:
+        yield ''.join(buffer)
+
+
+def stream_ndjson(rows):
+    encoder = DjangoJSONEncoder()
+    buffer = []
+    for row in rows:
+        buffer.append(encoder.encode(row) + '\n')
+        if len(buffer) >= ROWS_PER_WRITE:
+            yield ''.join(buffer)
+            buffer = []
+    if buffer:
+        yield ''.join(buffer)
+
+
+def export_response(attempts, filename, output='csv', flatten=False, question_ids=None):
+    """
+    Build a StreamingHttpResponse exporting the graded attempts of a queryset
+    """
+    # Bound now: the rows are read while streaming, after the view has returned
+    attempts = attempts.filter(status=QuizAttempt.GRADED).using(router.db_for_read(QuizAttempt))
+    if flatten:
+        if question_ids is None:
+            question_ids = QuestionBank.objects.filter(
+                quiz__in=attempts.values('quiz_id')
+            ).order_by('id').values_list('id', flat=True).distinct()
+        question_ids = list(question_ids)
+    else:
+        question_ids = None
+
+    rows = export_rows(attempts, question_ids, include_results=output == 'ndjson')
+    if output == 'ndjson':
+        content = stream_ndjson(rows)
+    else:
+        columns = list(ATTEMPT_COLUMNS)
+        if question_ids is not None:
+            columns += question_columns(question_ids)
+        content = stream_csv(rows, columns)
+
+    response = StreamingHttpResponse(content, content_type=EXPORT_FORMATS[output])
+    response['Content-Disposition'] = f'attachment; filename="{filename}.{output}"'
+    return response
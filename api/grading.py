@@ -0,0 +1,182 @@
+# grading.py
+import logging
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+TF_VALUES = {
+    'true': 'true', 't': 'true', '1': 'true', 'yes': 'true',
+    'false': 'false', 'f': 'false', '0': 'false', 'no': 'false',
+}
+
+QUESTION_FIELDS = ('id', 'question_type', 'correct_answer', 'option_a',
+                   'option_b', 'option_c', 'option_d', 'points')
+
+MAX_CACHED_KEYS = 256
+
+
+class CompiledQuestion:
+    """
+    A question with its correct answer normalized once, ready for comparison
+    """
+    __slots__ = ('id', 'key', 'question_type', 'points', 'correct',
+                 'correct_display', 'option_index', 'option_display')
+
+    def __init__(self, row):
+        self.id = row['id']
+        self.key = str(row['id'])
+        self.question_type = row['question_type']
+        self.points = row['points']
+        self.option_index = {}
+        self.option_display = {}
+
+        options = [row['option_a'], row['option_b'], row['option_c'], row['option_d']]
+        if self.question_type == 'MC':
+            for index, option in enumerate(options):
+                self.option_display[str(index)] = option
+                if option is not None:
+                    self.option_index.setdefault(option, str(index))
+
+        self.correct = self.normalize(row['correct_answer'])
+        self.correct_display = self.display(self.correct)
+
+    def normalize(self, raw):
+        answer = str(raw).strip()
+        if self.question_type == 'MC':
+            # Answers may be given as option text or as the option index
+            return self.option_index.get(answer, answer)
+        if self.question_type == 'TF':
+            answer = answer.lower()
+            return TF_VALUES.get(answer, answer)
+        if self.question_type == 'ID':
+            return answer.lower()
+        return answer
+
+    def display(self, answer):
+        if self.question_type != 'MC':
+            return answer
+        display = self.option_display.get(answer, answer)
+        if not display and answer in self.option_index:
+            display = answer
+        return display
+
+
+class AnswerKey:
+    """
+    Normalized answer key for one version of a quiz
+    """
+
+    def __init__(self, quiz_id, version, rows):
+        self.quiz_id = quiz_id
+        self.version = version
+        self.questions = [CompiledQuestion(row) for row in rows]
+        self.max_points = sum(question.points for question in self.questions)
+
+    def __len__(self):
+        return len(self.questions)
+
+    def grade(self, answers, show_correct_answers=False, normalized=False):
+        """
+        Grade a single submission in one pass over the compiled questions.
+
+        Each result keeps the normalized answer, the option index for MC,
+        so an attempt can be regraded with normalized=True after the
+        options' text was edited.
+        """
+        answers = answers or {}
+        debug = logger.isEnabledFor(logging.DEBUG)
+        correct_count = 0
+        total_points = 0
+        results = []
+
+        for question in self.questions:
+            raw_answer = answers.get(question.key, '')
+            answer = raw_answer if normalized else question.normalize(raw_answer)
+            is_correct = answer == question.correct
+
+            if debug:
+                logger.debug(
+                    'Quiz %s question %s (%s): answer=%r normalized=%r correct=%r -> %s',
+                    self.quiz_id, question.id, question.question_type,
+                    raw_answer, answer, question.correct, is_correct
+                )
+
+            if is_correct:
+                correct_count += 1
+                total_points += question.points
+
+            results.append({
+                'question_id': question.id,
+                'correct': is_correct,
+                'user_answer': question.display(answer),
+                'normalized_answer': answer,
+                'correct_answer': question.correct_display if show_correct_answers else None,
+                'points': question.points if is_correct else 0,
+                'max_points': question.points
+            })
+
+        max_points = self.max_points
+        score = (total_points / max_points) * 100 if max_points > 0 else 0
+
+        return {
+            'score': score,
+            'correct_questions': correct_count,
+            'total_questions': len(self.questions),
+            'total_points': total_points,
+            'max_points': max_points,
+            'results': results
+        }
+
+    def grade_many(self, submissions, show_correct_answers=False):
+        """
+        Grade a batch of answer dicts against this key
+        """
+        return [self.grade(answers, show_correct_answers) for answers in submissions]
+
+
+_answer_keys = OrderedDict()
+_answer_keys_lock = threading.Lock()
+
+
+def compile_answer_key(quiz, version=None):
+    """
+    Build an answer key from the quiz's current questions
+    """
+    rows = quiz.questions.values(*QUESTION_FIELDS)
+    return AnswerKey(quiz.pk, version, rows)
+
+
+def get_answer_key(quiz):
+    """
+    Return the compiled answer key for a quiz, compiling it at most once per version.
+
+    The version is the quiz's updated_at, which signals touch whenever the
+    quiz's questions change, so a key compiled by any worker is checked
+    against the row that was just read.
+    """
+    version = quiz.updated_at
+    with _answer_keys_lock:
+        answer_key = _answer_keys.get(quiz.pk)
+        if answer_key is not None and answer_key.version == version:
+            _answer_keys.move_to_end(quiz.pk)
+            return answer_key
+
+    answer_key = compile_answer_key(quiz, version)
+    with _answer_keys_lock:
+        _answer_keys[quiz.pk] = answer_key
+        _answer_keys.move_to_end(quiz.pk)
+        while len(_answer_keys) > MAX_CACHED_KEYS:
+            _answer_keys.popitem(last=False)
+    return answer_key
+
+
+def grade_submission(quiz, answers):
+    return get_answer_key(quiz).grade(answers, quiz.show_correct_answers)
+
+
+def grade_submissions(quiz, submissions):
+    """
+    Grade many answer dicts for the same quiz with a single answer key lookup
+    """
+    return get_answer_key(quiz).grade_many(submissions, quiz.show_correct_answers)
@@ -0,0 +1,16 @@
+# hashers.py
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+
+
+class ConfigurablePBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    """
+    PBKDF2-SHA256 with the work factor read from PASSWORD_HASH_ITERATIONS.
+
+    Hashes stored with any other iteration count are rehashed on the
+    user's next login, so the setting can move in either direction.
+    """
+
+    @property
+    def iterations(self):
+        return getattr(settings, 'PASSWORD_HASH_ITERATIONS', PBKDF2PasswordHasher.iterations)
@@ -0,0 +1,105 @@
+# imports.py
+import codecs
+import csv
+import json
+from django.conf import settings
+from django.db import transaction
+from rest_framework.exceptions import ParseError, ValidationError
+from rest_framework.parsers import BaseParser
+
+from api.models import QuestionBank
+from api.serializers import QuestionImportSerializer
+
+OPTION_FIELDS = ('option_a', 'option_b', 'option_c', 'option_d')
+BATCH_SIZE = 500
+
+
+def clamp_points(value):
+    """
+    Points as the question endpoints store them: a positive integer, 1 when missing or invalid
+    """
+    try:
+        points = int(value) if value else 1
+    except (ValueError, TypeError):
+        return 1
+    return max(points, 1)
+
+
+def csv_rows(lines, encoding=None):
+    """
+    Lazily read dict rows from an iterable of encoded CSV lines
+    """
+    encoding = encoding or settings.DEFAULT_CHARSET
+    if codecs.lookup(encoding).name == 'utf-8':
+        # Spreadsheet exports often start with a byte order mark
+        encoding = 'utf-8-sig'
+    return csv.DictReader(codecs.iterdecode(lines, encoding))
+
+
+class CSVParser(BaseParser):
+    """
+    Parses a text/csv body into an iterator of row dicts, read as it is consumed
+    """
+    media_type = 'text/csv'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        if stream is None:
+            return iter(())
+        encoding = (parser_context or {}).get('encoding')
+        return csv_rows(stream, encoding)
+
+
+def question_rows(request):
+    """
+    The rows of a bulk import, from a text/csv body, an uploaded CSV or JSON
+    file, a JSON array, or a JSON object holding a "questions" array
+    """
+    upload = request.FILES.get('file')
+    if upload is not None:
+        if upload.name.lower().endswith('.json'):
+            try:
+                rows = json.load(upload)
+            except ValueError as exc:
+                raise ParseError(f'Invalid JSON file: {exc}')
+        else:
+            return csv_rows(upload)
+    else:
+        rows = request.data
+    if isinstance(rows, dict):
+        rows = rows.get('questions')
+    if isinstance(rows, (list, csv.DictReader)):
+        return rows
+    raise ParseError('Expected a CSV file or a JSON array of questions')
+
+
+def import_questions(teacher, rows, quiz=None):
+    """
+    Validate rows one at a time and insert the valid ones in one transaction.
+
+    Returns (questions, errors), where errors holds the 1-based row number
+    and field errors of every rejected row.
+    """
+    validator = QuestionImportSerializer()
+    questions = []
+    errors = []
+    for number, row in enumerate(rows, start=1):
+        if not isinstance(row, dict):
+            errors.append({'row': number, 'errors': {'non_field_errors': ['Expected an object']}})
+            continue
+        data = {key: value for key, value in row.items() if key in validator.fields}
+        for field in OPTION_FIELDS:
+            # Empty CSV cells mean "no option", as when the field is left out
+            if data.get(field) == '':
+                data[field] = None
+        try:
+            values = validator.run_validation(data)
+        except ValidationError as exc:
+            errors.append({'row': number, 'errors': exc.detail})
+            continue
+        questions.append(QuestionBank(teacher=teacher, points=clamp_points(row.get('points')), **values))
+
+    with transaction.atomic():
+        questions = QuestionBank.objects.bulk_create(questions, batch_size=BATCH_SIZE)
+        if quiz is not None and questions:
+            quiz.questions.add(*questions)
+    return questions, errors
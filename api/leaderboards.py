@@ -0,0 +1,236 @@
+# leaderboards.py
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from api.bulk import bulk_increment
+from api.models import Class, ClassStanding, QuizAttempt
+
+TOP_SIZE = 100
+QUIZ_BOARD_KEY = 'leaderboard:quiz:{}'
+CLASS_BOARD_KEY = 'leaderboard:class:{}'
+STUDENT_FIELDS = ('student_id', 'student__username', 'student__first_name', 'student__last_name')
+
+
+def board_timeout():
+    # Boards are dropped whenever their scores change; the timeout only
+    # bounds how long an idle board keeps its cache memory
+    return getattr(settings, 'LEADERBOARD_CACHE_TIMEOUT', 300)
+
+
+def _entry(row):
+    return {
+        'student': {
+            'id': row['student_id'],
+            'username': row['student__username'],
+            'first_name': row['student__first_name'],
+            'last_name': row['student__last_name'],
+        },
+        'total_points': row['total_points'],
+    }
+
+
+def _quiz_scores(quiz_id):
+    return QuizAttempt.objects.filter(quiz_id=quiz_id, status=QuizAttempt.GRADED)
+
+
+def _class_scores(class_id):
+    # Standings of students since removed from the class do not count
+    return ClassStanding.objects.filter(class_obj_id=class_id, student__enrolled_classes=class_id)
+
+
+def _build_quiz_board(quiz_id):
+    attempts = _quiz_scores(quiz_id)
+    top = attempts.order_by('-total_points', 'id').values('total_points', *STUDENT_FIELDS)[:TOP_SIZE]
+    return {'participants': attempts.count(), 'top': [_entry(row) for row in top]}
+
+
+def _build_class_board(class_id):
+    standings = _class_scores(class_id)
+    top = standings.order_by('-total_points', 'student_id').values('total_points', *STUDENT_FIELDS)[:TOP_SIZE]
+    return {'participants': standings.count(), 'top': [_entry(row) for row in top]}
+
+
+def _get_board(key, build):
+    board = cache.get(key)
+    if board is None:
+        board = build()
+        cache.set(key, board, board_timeout())
+    return board
+
+
+def get_quiz_board(quiz_id):
+    """
+    The top TOP_SIZE attempts of a quiz and its number of participants.
+
+    Only this bounded summary is cached. It is dropped, not edited, when
+    scores change, so concurrent writers cannot overwrite each other.
+    """
+    return _get_board(QUIZ_BOARD_KEY.format(quiz_id), lambda: _build_quiz_board(quiz_id))
+
+
+def get_class_board(class_id):
+    return _get_board(CLASS_BOARD_KEY.format(class_id), lambda: _build_class_board(class_id))
+
+
+def _position(scores, points):
+    if points is None:
+        return None
+    # One COUNT on the (parent, -total_points) index; ties share a rank
+    return {'rank': scores.filter(total_points__gt=points).count() + 1, 'total_points': points}
+
+
+def quiz_position(quiz_id, student_id):
+    """
+    {'rank', 'total_points'} of a student's graded attempt, or None
+    """
+    scores = _quiz_scores(quiz_id)
+    return _position(scores, scores.filter(student_id=student_id).values_list('total_points', flat=True).first())
+
+
+def class_position(class_id, student_id):
+    scores = _class_scores(class_id)
+    return _position(scores, scores.filter(student_id=student_id).values_list('total_points', flat=True).first())
+
+
+def _add_to_standings(points_by_pair):
+    """
+    Add points to many (class_id, student_id) standings at once.
+
+    Missing rows are created at zero first, then every row is incremented
+    in the database, so concurrent submissions never lose points.
+    """
+    class_ids = {class_id for class_id, _ in points_by_pair}
+    student_ids = {student_id for _, student_id in points_by_pair}
+    standings = ClassStanding.objects.filter(class_obj_id__in=class_ids, student_id__in=student_ids)
+
+    def standing_ids():
+        return {
+            (class_id, student_id): standing_id
+            for standing_id, class_id, student_id in standings.values_list('id', 'class_obj_id', 'student_id')
+        }
+
+    with transaction.atomic():
+        ids = standing_ids()
+        missing = [pair for pair in points_by_pair if pair not in ids]
+        if missing:
+            ClassStanding.objects.bulk_create([
+                ClassStanding(class_obj_id=class_id, student_id=student_id, total_points=0)
+                for class_id, student_id in missing
+            ], ignore_conflicts=True)
+            ids = standing_ids()
+        bulk_increment(
+            ClassStanding, 'total_points',
+            [(ids[pair], points) for pair, points in points_by_pair.items()],
+            values={'updated_at': timezone.now()}
+        )
+
+
+def record_attempt(attempt):
+    """
+    Add a new attempt to the standings of every class that assigned the
+    quiz and has the student enrolled
+    """
+    record_attempts(attempt.quiz, [attempt])
+
+
+def record_attempts(quiz, attempts):
+    """
+    Add new attempts of one quiz to the standings of their classes, and
+    drop the cached boards they change
+    """
+    if not attempts:
+        return
+    cache.delete(QUIZ_BOARD_KEY.format(quiz.pk))
+
+    by_student = {attempt.student_id: attempt for attempt in attempts}
+    enrollments = Class.students.through.objects.filter(
+        class_id__in=quiz.classes.values('id'),
+        customuser_id__in=list(by_student)
+    ).values_list('class_id', 'customuser_id')
+
+    points_by_pair = {
+        (class_id, student_id): by_student[student_id].total_points
+        for class_id, student_id in enrollments
+    }
+    if not points_by_pair:
+        return
+    _add_to_standings(points_by_pair)
+    class_ids = {class_id for class_id, _ in points_by_pair}
+    cache.delete_many([CLASS_BOARD_KEY.format(class_id) for class_id in class_ids])
+
+
+def rebuild_class_standings(class_id, student_ids=None):
+    """
+    Recompute a class's standings from the attempts of its enrolled students.
+
+    With student_ids, only those students' rows are recomputed, which is
+    all a single join or removal needs.
+    """
+    attempts = QuizAttempt.objects.filter(
+        quiz__classes=class_id,
+        student__enrolled_classes=class_id,
+        status=QuizAttempt.GRADED
+    )
+    standings = ClassStanding.objects.filter(class_obj_id=class_id)
+    if student_ids is not None:
+        attempts = attempts.filter(student_id__in=student_ids)
+        standings = standings.filter(student_id__in=student_ids)
+    totals = attempts.values('student_id').annotate(points=Sum('total_points'))
+
+    with transaction.atomic():
+        standings.delete()
+        ClassStanding.objects.bulk_create([
+            ClassStanding(class_obj_id=class_id, student_id=row['student_id'], total_points=row['points'])
+            for row in totals
+        ])
+    cache.delete(CLASS_BOARD_KEY.format(class_id))
+
+
+def add_class_members(class_ids, student_ids):
+    """
+    Bring standings in line after students joined classes.
+
+    Members who just joined have no rows yet, and most have no points at
+    the classes' quizzes either, so this is one read that writes nothing.
+    Only classes where they already have graded attempts are rebuilt.
+    """
+    scored = (
+        QuizAttempt.objects.filter(quiz__classes__in=class_ids, student_id__in=student_ids, status=QuizAttempt.GRADED)
+        .values_list('quiz__classes', flat=True)
+        .distinct()
+    )
+    for class_id in list(scored):
+        rebuild_class_standings(class_id, student_ids)
+
+
+def invalidate_quiz(quiz):
+    """
+    Drop the cached boards for a quiz and rebuild the standings of its classes,
+    after its attempts were changed in bulk
+    """
+    cache.delete(QUIZ_BOARD_KEY.format(quiz.pk))
+    for class_id in quiz.classes.values_list('id', flat=True):
+        rebuild_class_standings(class_id)
+
+
+def leaderboard_response(board, me=None, limit=10):
+    """
+    Shape a board for the API: the top entries with ranks, plus the caller's position
+    """
+    entries = []
+    for index, entry in enumerate(board['top'][:limit]):
+        # Competition ranks; everyone above an entry is in the top list too
+        tied = entries and entries[-1]['total_points'] == entry['total_points']
+        entries.append({
+            'rank': entries[-1]['rank'] if tied else index + 1,
+            'student': entry['student'],
+            'total_points': entry['total_points'],
+        })
+    return {
+        'participants': board['participants'],
+        'entries': entries,
+        'me': me,
+    }
@@ -0,0 +1,97 @@
+# logins.py
+"""
+The login pipeline behind the token endpoints: one indexed lookup of the
+user by username or email, then one password hash on a bounded pool of
+hashing threads.
+
+Hashing dominates the cost of a login. hashlib releases the GIL while it
+runs, so the pool spreads logins over the cores, while its size keeps a
+rush of logins from starving every other request of CPU. Under ASGI the
+event loop only awaits the pool.
+"""
+import asyncio
+import os
+import threading
+from asgiref.sync import sync_to_async
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.contrib.auth.hashers import check_password, make_password
+from django.db.models import Q
+from rest_framework import serializers
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+
+from api.models import CustomUser
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def hash_workers():
+    return getattr(settings, 'LOGIN_HASH_WORKERS', None) or os.cpu_count() or 1
+
+
+def hash_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=hash_workers(), thread_name_prefix='login-hash')
+    return _executor
+
+
+def verify_password(password, encoded):
+    """
+    Check a password against a stored hash.
+
+    Returns (valid, new_hash), where new_hash is set when the stored hash
+    uses an outdated hasher or work factor and should be replaced.
+    """
+    outdated = []
+    valid = check_password(password, encoded, setter=outdated.append)
+    return valid, make_password(password) if outdated else None
+
+
+def _login_users(identifier):
+    # username and email are both unique, so this is one index lookup each
+    return CustomUser.objects.filter(Q(username=identifier) | Q(email=identifier))[:2]
+
+
+def _pick_user(users, identifier):
+    if not users:
+        raise serializers.ValidationError('No account found with the given credentials')
+    # One user's username may be another user's email; the username wins
+    return next((user for user in users if user.username == identifier), users[0])
+
+
+def _check_result(user, valid, new_hash):
+    if not valid:
+        raise serializers.ValidationError('Invalid password')
+    if not jwt_settings.USER_AUTHENTICATION_RULE(user):
+        raise serializers.ValidationError('User is inactive')
+    if new_hash is not None:
+        user.password = new_hash
+        user.save(update_fields=['password'])
+    return user
+
+
+def login(identifier, password):
+    """
+    The user that identifier (a username or email) and password log in as.
+
+    Raises ValidationError with the same messages the token endpoint
+    has always returned.
+    """
+    user = _pick_user(list(_login_users(identifier)), identifier)
+    valid, new_hash = hash_executor().submit(verify_password, password, user.password).result()
+    return _check_result(user, valid, new_hash)
+
+
+async def alogin(identifier, password):
+    user = _pick_user([user async for user in _login_users(identifier)], identifier)
+    valid, new_hash = await asyncio.get_running_loop().run_in_executor(
+        hash_executor(), verify_password, password, user.password
+    )
+    if new_hash is None:
+        return _check_result(user, valid, new_hash)
+    # Saving the new hash is a query, so it runs in a thread like any other
+    return await sync_to_async(_check_result)(user, valid, new_hash)
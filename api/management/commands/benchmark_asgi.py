@@ -0,0 +1,166 @@
+# benchmark_asgi.py
+import asyncio
+import io
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from django.conf import settings
+from django.core.asgi import get_asgi_application
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from api.models import Class, CustomUser, QuestionBank, Quiz, QuizAttempt
+
+PREFIX = 'bench-asgi'
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+class Command(BaseCommand):
+    help = ('Compare the attempt list served by WSGI worker threads with the async view under ASGI, '
+            'for many concurrent clients that read their responses slowly')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clients', type=int, default=200,
+                            help='Concurrent clients (default: 200)')
+        parser.add_argument('--requests', type=int, default=5,
+                            help='Requests per client (default: 5)')
+        parser.add_argument('--workers', type=int, default=8,
+                            help='WSGI worker threads (default: 8)')
+        parser.add_argument('--client-delay', type=float, default=0.3,
+                            help='Seconds each client takes to receive a response (default: 0.3)')
+
+    def handle(self, *args, **options):
+        self.host = (settings.ALLOWED_HOSTS or ['localhost'])[0].lstrip('.')
+        student, cleanup = self.create_fixture()
+        self.token = str(RefreshToken.for_user(student).access_token)
+        try:
+            for label, run in (('wsgi /api/attempts/', self.run_wsgi),
+                               ('asgi /api/async/attempts/', self.run_asgi)):
+                started = time.perf_counter()
+                latencies = run(options)
+                elapsed = time.perf_counter() - started
+                self.stdout.write(
+                    f'{label:<28} requests={len(latencies)}  '
+                    f'throughput={len(latencies) / elapsed:.0f}/s  '
+                    f'p50={statistics.median(latencies) * 1000:.0f}ms  '
+                    f'p99={percentile(latencies, 0.99) * 1000:.0f}ms'
+                )
+        finally:
+            cleanup()
+
+    def create_fixture(self):
+        """
+        Committed rows, since both servers read them from other threads
+        """
+        now = timezone.now()
+        teacher = CustomUser.objects.create(
+            username=f'{PREFIX}-teacher', email=f'{PREFIX}-teacher@bench.invalid', password='!', is_teacher=True
+        )
+        student = CustomUser.objects.create(
+            username=f'{PREFIX}-student', email=f'{PREFIX}-student@bench.invalid', password='!'
+        )
+        class_obj = Class.objects.create(name=PREFIX, teacher=teacher, join_code='BENCHASG')
+        class_obj.students.add(student)
+        questions = [
+            QuestionBank.objects.create(
+                teacher=teacher, question_text=f'Question {i}', question_type='TF', correct_answer='true'
+            )
+            for i in range(10)
+        ]
+        for i in range(20):
+            quiz = Quiz.objects.create(
+                title=f'{PREFIX} {i}', teacher=teacher,
+                start_datetime=now - timedelta(hours=1), end_datetime=now + timedelta(hours=1)
+            )
+            quiz.classes.add(class_obj)
+            quiz.questions.set(questions)
+            QuizAttempt.objects.create(student=student, quiz=quiz, total_questions=len(questions))
+
+        def cleanup():
+            CustomUser.objects.filter(username__startswith=PREFIX).delete()
+        return student, cleanup
+
+    def request_meta(self):
+        return {
+            'path': '/api/attempts/',
+            'query': b'fields=id,score,quiz.title',
+            'headers': [(b'host', self.host.encode()), (b'authorization', f'Bearer {self.token}'.encode())],
+        }
+
+    def run_wsgi(self, options):
+        handler = WSGIHandler()
+        meta = self.request_meta()
+
+        workers = threading.BoundedSemaphore(options['workers'])
+
+        def call():
+            started = time.perf_counter()
+            environ = {
+                'REQUEST_METHOD': 'GET', 'PATH_INFO': meta['path'], 'SCRIPT_NAME': '',
+                'QUERY_STRING': meta['query'].decode(), 'SERVER_NAME': self.host, 'SERVER_PORT': '80',
+                'HTTP_HOST': self.host, 'HTTP_AUTHORIZATION': f'Bearer {self.token}',
+                'wsgi.input': io.BytesIO(), 'wsgi.url_scheme': 'http', 'wsgi.errors': io.StringIO(),
+            }
+            # Waiting for a free worker counts towards the client's latency
+            with workers:
+                body = handler(environ, lambda status, headers, exc_info=None: None)
+                for _ in body:
+                    # The worker stays busy until the slow client has the bytes
+                    time.sleep(options['client_delay'])
+                body.close()
+            return time.perf_counter() - started
+
+        def client():
+            return [call() for _ in range(options['requests'])]
+
+        with ThreadPoolExecutor(max_workers=options['clients']) as pool:
+            results = list(pool.map(lambda _: client(), range(options['clients'])))
+        return [latency for latencies in results for latency in latencies]
+
+    def run_asgi(self, options):
+        application = get_asgi_application()
+        meta = self.request_meta()
+
+        async def call():
+            started = time.perf_counter()
+            scope = {
+                'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+                'scheme': 'http', 'path': '/api/async/attempts/', 'raw_path': b'/api/async/attempts/',
+                'query_string': meta['query'], 'root_path': '', 'headers': meta['headers'],
+                'server': (self.host, 80), 'client': ('127.0.0.1', 50000),
+            }
+
+            messages = [{'type': 'http.request', 'body': b'', 'more_body': False}]
+            disconnected = asyncio.Event()
+
+            async def receive():
+                if messages:
+                    return messages.pop()
+                # The client stays connected until the response is sent
+                await disconnected.wait()
+                return {'type': 'http.disconnect'}
+
+            async def send(message):
+                if message['type'] == 'http.response.body' and message.get('body'):
+                    # Only this coroutine waits on the slow client
+                    await asyncio.sleep(options['client_delay'])
+
+            await application(scope, receive, send)
+            return time.perf_counter() - started
+
+        async def client():
+            return [await call() for _ in range(options['requests'])]
+
+        async def main():
+            results = await asyncio.gather(*(client() for _ in range(options['clients'])))
+            return [latency for latencies in results for latency in latencies]
+
+        return asyncio.run(main())
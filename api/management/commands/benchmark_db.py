@@ -0,0 +1,105 @@
+# benchmark_db.py
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connection
+from django.utils import timezone
+
+from api.models import Class, CustomUser, QuestionBank, Quiz
+from api.submissions import submit_attempt
+
+PREFIX = 'bench-db'
+
+
+class Command(BaseCommand):
+    help = ('Measure concurrent quiz submission throughput on the database selected by DB_PROFILE; '
+            'run it once per profile to compare them')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--submissions', type=int, default=1000,
+                            help='Submissions in total (default: 1000)')
+        parser.add_argument('--threads', type=int, default=8,
+                            help='Concurrent submitting threads (default: 8)')
+
+    def handle(self, *args, **options):
+        quiz, students, answers, cleanup = self.create_fixture(options['submissions'])
+        batches = [students[i::options['threads']] for i in range(options['threads'])]
+
+        def submit_all(batch):
+            timings, errors = [], 0
+            try:
+                for student in batch:
+                    started = time.perf_counter()
+                    try:
+                        submit_attempt(quiz, student, answers)
+                    except OperationalError:
+                        # "database is locked" and friends
+                        errors += 1
+                    timings.append(time.perf_counter() - started)
+            finally:
+                connection.close()
+            return timings, errors
+
+        try:
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=options['threads']) as pool:
+                results = list(pool.map(submit_all, batches))
+            elapsed = time.perf_counter() - started
+        finally:
+            cleanup()
+
+        timings = sorted(timing for batch_timings, _ in results for timing in batch_timings)
+        errors = sum(batch_errors for _, batch_errors in results)
+        self.stdout.write(
+            f'profile={settings.DB_PROFILE}  {self.describe_connection()}  '
+            f'submissions={len(timings)}  threads={options["threads"]}  '
+            f'throughput={len(timings) / elapsed:.0f}/s  '
+            f'p50={statistics.median(timings) * 1000:.1f}ms  '
+            f'p99={timings[min(int(len(timings) * 0.99), len(timings) - 1)] * 1000:.1f}ms  '
+            f'errors={errors}'
+        )
+
+    def describe_connection(self):
+        if connection.vendor != 'sqlite':
+            return f'vendor={connection.vendor}'
+        with connection.cursor() as cursor:
+            journal_mode = cursor.execute('PRAGMA journal_mode').fetchone()[0]
+            synchronous = cursor.execute('PRAGMA synchronous').fetchone()[0]
+        return f'journal_mode={journal_mode}  synchronous={synchronous}'
+
+    def create_fixture(self, count):
+        """
+        Committed rows, since the submitting threads use their own connections
+        """
+        now = timezone.now()
+        teacher = CustomUser.objects.create(
+            username=f'{PREFIX}-teacher', email=f'{PREFIX}-teacher@bench.invalid', password='!', is_teacher=True
+        )
+        class_obj = Class.objects.create(name=PREFIX, teacher=teacher, join_code='BENCHDB2')
+        CustomUser.objects.bulk_create([
+            CustomUser(username=f'{PREFIX}-{i}', email=f'{PREFIX}-{i}@bench.invalid', password='!')
+            for i in range(count)
+        ], batch_size=1000)
+        students = list(CustomUser.objects.filter(username__startswith=f'{PREFIX}-', is_teacher=False))
+        class_obj.students.add(*students)
+
+        questions = [
+            QuestionBank.objects.create(
+                teacher=teacher, question_text=f'Question {i}', question_type='TF', correct_answer='true'
+            )
+            for i in range(10)
+        ]
+        quiz = Quiz.objects.create(
+            title=PREFIX, teacher=teacher,
+            start_datetime=now - timedelta(hours=1), end_datetime=now + timedelta(hours=1)
+        )
+        quiz.classes.add(class_obj)
+        quiz.questions.set(questions)
+        answers = {str(question.id): 'true' for question in questions}
+
+        def cleanup():
+            CustomUser.objects.filter(username__startswith=PREFIX).delete()
+        return quiz, students, answers, cleanup
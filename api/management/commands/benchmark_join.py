@@ -0,0 +1,73 @@
+# benchmark_join.py
+import statistics
+import time
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from api.models import Class, CustomUser
+from api.rosters import Enrollment, class_id_for_join_code, join_class, new_join_code
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Time class joins against rosters of growing size; all data is rolled back'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 10000],
+                            help='Roster sizes to measure (default: 100 1000 10000)')
+        parser.add_argument('--joins', type=int, default=100,
+                            help='Joins timed per roster size (default: 100)')
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                for size in options['sizes']:
+                    self.measure(size, options['joins'])
+                raise Rollback
+        except Rollback:
+            pass
+
+    def create_students(self, prefix, count):
+        CustomUser.objects.bulk_create([
+            CustomUser(username=f'{prefix}{i}', email=f'{prefix}{i}@bench.invalid', password='!')
+            for i in range(count)
+        ], batch_size=1000)
+        return list(CustomUser.objects.filter(username__startswith=prefix).order_by('id'))
+
+    def measure(self, size, joins):
+        teacher = CustomUser.objects.create(
+            username=f'bench-teacher-{size}', email=f'bench-teacher-{size}@bench.invalid',
+            password='!', is_teacher=True
+        )
+        class_obj = Class.objects.create(name=f'Bench {size}', teacher=teacher, join_code=new_join_code())
+        roster = self.create_students(f'bench-{size}-', size)
+        Enrollment.objects.bulk_create([
+            Enrollment(class_id=class_obj.pk, customuser_id=student.pk) for student in roster
+        ], batch_size=1000)
+        joiners = self.create_students(f'bench-{size}-join-', joins)
+
+        timings = []
+        with CaptureQueriesContext(connection) as context:
+            for student in joiners:
+                start = time.perf_counter()
+                join_class(class_id_for_join_code(class_obj.join_code), student)
+                timings.append((time.perf_counter() - start) * 1000)
+
+        timings.sort()
+        # Savepoints stand in for the BEGIN and COMMIT a join runs outside this rollback
+        queries = [
+            query['sql'] for query in context.captured_queries
+            if not query['sql'].startswith(('SAVEPOINT', 'RELEASE SAVEPOINT'))
+        ]
+        writes = [sql for sql in queries if not sql.startswith('SELECT')]
+        self.stdout.write(
+            f'roster={size:>7}  joins={joins}  '
+            f'median={statistics.median(timings):.2f}ms  '
+            f'p95={timings[int(len(timings) * 0.95) - 1]:.2f}ms  '
+            f'queries/join={len(queries) / joins:.1f}  '
+            f'writes/join={len(writes) / joins:.1f}'
+        )
@@ -0,0 +1,86 @@
+# benchmark_logins.py
+import os
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.contrib.auth import authenticate
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Q
+
+from api.logins import hash_workers, login
+from api.models import CustomUser
+
+PREFIX = 'bench-login'
+PASSWORD = 'bench-password'
+
+
+def legacy_login(identifier, password):
+    # What EmailTokenObtainPairSerializer used to do: a lookup, then
+    # authenticate() twice, each with its own query and password hash
+    user = CustomUser.objects.get(Q(username=identifier) | Q(email=identifier))
+    authenticate(username=user.username, password=password)
+    return authenticate(username=user.username, password=password)
+
+
+class Command(BaseCommand):
+    help = ('Measure logins per second, and per core, through the login pipeline and through '
+            'the previous authenticate()-based path')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--logins', type=int, default=200,
+                            help='Logins per measurement (default: 200)')
+        parser.add_argument('--threads', type=int, default=os.cpu_count() or 1,
+                            help='Concurrent request threads (default: CPU count)')
+
+    def handle(self, *args, **options):
+        cores = os.cpu_count() or 1
+        self.stdout.write(
+            f'iterations={settings.PASSWORD_HASH_ITERATIONS}  cores={cores}  '
+            f'hash_workers={hash_workers()}  threads={options["threads"]}'
+        )
+        identifiers, cleanup = self.create_users(options['logins'])
+        try:
+            for label, run in (('authenticate() x2', legacy_login), ('login pipeline', login)):
+                self.measure(label, run, identifiers, options['threads'], cores)
+        finally:
+            cleanup()
+
+    def create_users(self, count):
+        """
+        Committed rows, since the request threads use their own connections
+        """
+        encoded = make_password(PASSWORD)
+        CustomUser.objects.bulk_create([
+            CustomUser(username=f'{PREFIX}-{i}', email=f'{PREFIX}-{i}@bench.invalid', password=encoded)
+            for i in range(count)
+        ], batch_size=1000)
+        # Half by username, half by email
+        identifiers = [f'{PREFIX}-{i}' if i % 2 else f'{PREFIX}-{i}@bench.invalid' for i in range(count)]
+
+        def cleanup():
+            CustomUser.objects.filter(username__startswith=PREFIX).delete()
+        return identifiers, cleanup
+
+    def measure(self, label, run, identifiers, threads, cores):
+        def timed(identifier):
+            started = time.perf_counter()
+            try:
+                run(identifier, PASSWORD)
+            finally:
+                connection.close()
+            return time.perf_counter() - started
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            timings = list(pool.map(timed, identifiers))
+        elapsed = time.perf_counter() - started
+
+        rate = len(timings) / elapsed
+        self.stdout.write(
+            f'{label:<18} logins={len(timings)}  {rate:.1f}/s  '
+            f'{rate / min(threads, cores):.1f}/s per core  '
+            f'p50={statistics.median(timings) * 1000:.0f}ms'
+        )
@@ -0,0 +1,48 @@
+# build_avatars.py
+from django.core.management.base import BaseCommand
+
+from api.avatars import build_variants, picture_hash
+from api.bulk import bulk_update_rows
+from api.models import CustomUser
+
+
+class Command(BaseCommand):
+    help = ('Record the content digest of profile pictures stored before digests were kept, '
+            'and build the resized variants of every picture')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500,
+                            help='Users read and updated at a time (default: 500)')
+
+    def handle(self, *args, **options):
+        users = CustomUser.objects.exclude(profile_picture='').order_by('id').only(
+            'id', 'profile_picture', 'avatar_hash'
+        )
+        hashed, built, failed = 0, set(), 0
+        last_id = 0
+        while True:
+            chunk = list(users.filter(id__gt=last_id)[:options['chunk_size']])
+            if not chunk:
+                break
+            last_id = chunk[-1].id
+
+            missing = [user for user in chunk if not user.avatar_hash]
+            for user in missing:
+                user.avatar_hash = picture_hash(user.profile_picture)
+            bulk_update_rows(CustomUser, [user for user in missing if user.avatar_hash], ['avatar_hash'])
+            hashed += sum(1 for user in missing if user.avatar_hash)
+
+            for user in chunk:
+                # Users sharing a picture, like the default one, share its variants
+                if not user.avatar_hash or user.avatar_hash in built:
+                    continue
+                try:
+                    build_variants(user.profile_picture, user.avatar_hash)
+                    built.add(user.avatar_hash)
+                except OSError as exc:
+                    failed += 1
+                    self.stderr.write(f'User {user.id}: {exc}')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Recorded {hashed} digests, built variants of {len(built)} pictures, {failed} failed'
+        ))
@@ -0,0 +1,127 @@
+# collect_media.py
+import os
+import time
+from itertools import islice
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from api.avatars import AVATAR_DIR
+from api.models import CustomUser
+
+
+def batches(items, size):
+    items = iter(items)
+    while True:
+        batch = list(islice(items, size))
+        if not batch:
+            return
+        yield batch
+
+
+def scan(storage, directory, directories=False):
+    """
+    Files (or subdirectories) of a storage directory, read as they are
+    needed rather than listed whole
+    """
+    path = storage.path(directory)
+    if not os.path.isdir(path):
+        return
+    with os.scandir(path) as entries:
+        for entry in entries:
+            if entry.is_dir() == directories:
+                yield entry
+
+
+class Command(BaseCommand):
+    help = ('Delete profile pictures and avatar variants that no user refers to any more. '
+            'Files are checked against the users table a batch at a time.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Files checked and deleted per batch (default: 500)')
+        parser.add_argument('--min-age', type=int, default=3600,
+                            help='Keep files younger than this many seconds, which may belong to '
+                                 'uploads still in flight (default: 3600)')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Report what would be deleted without deleting it')
+
+    def handle(self, *args, **options):
+        self.batch_size = options['batch_size']
+        self.dry_run = options['dry_run']
+        self.cutoff = time.time() - options['min_age']
+
+        pictures, freed = self.sweep_pictures()
+        variants = self.sweep_variants()
+        verb = 'Would delete' if self.dry_run else 'Deleted'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} {pictures} profile pictures ({freed} bytes) and the variants of {variants} pictures'
+        ))
+
+    def referenced(self, field, values):
+        return set(CustomUser.objects.filter(**{f'{field}__in': values}).values_list(field, flat=True))
+
+    def delete(self, storage, name, stat):
+        """
+        Delete a file unless it changed since it was scanned. Storing an
+        identical upload again refreshes the file's modification time.
+        """
+        try:
+            if os.stat(storage.path(name)).st_mtime_ns != stat.st_mtime_ns:
+                return False
+        except FileNotFoundError:
+            return False
+        storage.delete(name)
+        return True
+
+    def sweep_pictures(self):
+        field = CustomUser._meta.get_field('profile_picture')
+        storage, directory = field.storage, field.upload_to.rstrip('/')
+        # The default picture is referenced by name when a picture is removed
+        keep = {field.get_default()}
+
+        deleted, freed = 0, 0
+        for batch in batches(scan(storage, directory), self.batch_size):
+            files = {f'{directory}/{entry.name}': entry.stat() for entry in batch}
+            files = {
+                name: stat for name, stat in files.items()
+                if name not in keep and stat.st_mtime < self.cutoff
+            }
+            referenced = self.referenced('profile_picture', list(files))
+            for name, stat in files.items():
+                if name in referenced:
+                    continue
+                if not self.dry_run:
+                    # A user may have picked the file up since the batch was checked
+                    if CustomUser.objects.filter(profile_picture=name).exists():
+                        continue
+                    if not self.delete(storage, name, stat):
+                        continue
+                freed += stat.st_size
+                deleted += 1
+        return deleted, freed
+
+    def sweep_variants(self):
+        deleted = 0
+        for batch in batches(scan(default_storage, AVATAR_DIR, directories=True), self.batch_size):
+            digests = [entry.name for entry in batch]
+            referenced = self.referenced('avatar_hash', digests)
+            for digest in digests:
+                if digest in referenced:
+                    continue
+                directory = f'{AVATAR_DIR}/{digest}'
+                files = {f'{directory}/{entry.name}': entry.stat() for entry in scan(default_storage, directory)}
+                if not all(stat.st_mtime < self.cutoff for stat in files.values()):
+                    continue
+                if not self.dry_run:
+                    if CustomUser.objects.filter(avatar_hash=digest).exists():
+                        continue
+                    removed = [self.delete(default_storage, name, stat) for name, stat in files.items()]
+                    if not all(removed):
+                        continue
+                    try:
+                        default_storage.delete(directory)
+                    except OSError:
+                        # A variant was built into it meanwhile
+                        continue
+                deleted += 1
+        return deleted
@@ -0,0 +1,16 @@
+# flush_quiz_sessions.py
+from django.core.management.base import BaseCommand
+
+from api.quiz_sessions import flush_sessions
+
+
+class Command(BaseCommand):
+    help = 'Write autosaved answers still buffered in the cache to their quiz sessions'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500,
+                            help='Sessions read and written per batch (default: 500)')
+
+    def handle(self, *args, **options):
+        written = flush_sessions(chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(f'Flushed {written} quiz sessions'))
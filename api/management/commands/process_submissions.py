@@ -0,0 +1,50 @@
+# process_submissions.py
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from api.submission_queue import grade_pending
+
+
+class Command(BaseCommand):
+    help = ('Grade submissions queued by take_quiz when ASYNC_SUBMISSIONS is on, in parallel with a '
+            'process pool. Instances may overlap; each claims its own batches.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help='Grading processes (default: CPU count; 1 grades in this process)')
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Submissions claimed from the queue per round (default: 500)')
+        parser.add_argument('--chunk-size', type=int, default=100,
+                            help='Submissions handed to a grading process at a time (default: 100)')
+        parser.add_argument('--poll-interval', type=float, default=1.0,
+                            help='Seconds to wait when the queue is empty (default: 1)')
+        parser.add_argument('--once', action='store_true',
+                            help='Exit once the queue is empty')
+
+    def handle(self, *args, **options):
+        executor = None
+        if options['workers'] > 1:
+            # Forked workers must not share the parent's database connections
+            connections.close_all()
+            executor = ProcessPoolExecutor(max_workers=options['workers'])
+
+        total = 0
+        try:
+            while True:
+                graded = grade_pending(executor, options['batch_size'], options['chunk_size'])
+                total += graded
+                if graded:
+                    self.stdout.write(f'Graded {graded} submissions')
+                    continue
+                if options['once']:
+                    break
+                time.sleep(options['poll_interval'])
+        except KeyboardInterrupt:
+            pass
+        finally:
+            if executor is not None:
+                executor.shutdown()
+        self.stdout.write(self.style.SUCCESS(f'Graded {total} submissions in total'))
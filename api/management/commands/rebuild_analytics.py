@@ -0,0 +1,27 @@
+# rebuild_analytics.py
+from django.core.management.base import BaseCommand
+
+from api.analytics import rebuild_quiz_statistics
+from api.models import Quiz
+
+
+class Command(BaseCommand):
+    help = 'Recompute quiz and question statistics from stored attempts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--quiz', type=int, nargs='+', dest='quiz_ids',
+                            help='Only rebuild these quizzes (default: all)')
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        quizzes = Quiz.objects.order_by('id')
+        if options['quiz_ids']:
+            quizzes = quizzes.filter(id__in=options['quiz_ids'])
+
+        count = 0
+        for quiz in quizzes.iterator():
+            stats = rebuild_quiz_statistics(quiz, options['chunk_size'])
+            count += 1
+            if options['verbosity'] >= 1:
+                self.stdout.write(f'Quiz {quiz.pk}: {stats.attempt_count} attempts')
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt statistics for {count} quizzes'))
@@ -0,0 +1,24 @@
+# rebuild_leaderboards.py
+from django.core.management.base import BaseCommand
+
+from api.leaderboards import rebuild_class_standings
+from api.models import Class
+
+
+class Command(BaseCommand):
+    help = 'Recompute class standings from stored attempts and drop cached leaderboards'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--class', type=int, nargs='+', dest='class_ids',
+                            help='Only rebuild these classes (default: all)')
+
+    def handle(self, *args, **options):
+        classes = Class.objects.order_by('id')
+        if options['class_ids']:
+            classes = classes.filter(id__in=options['class_ids'])
+
+        count = 0
+        for class_id in classes.values_list('id', flat=True).iterator():
+            rebuild_class_standings(class_id)
+            count += 1
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt standings for {count} classes'))
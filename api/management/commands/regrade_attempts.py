@@ -0,0 +1,40 @@
+# regrade_attempts.py
+from django.core.management.base import BaseCommand, CommandError
+
+from api.regrade import regrade_attempts
+
+
+class Command(BaseCommand):
+    help = 'Regrade stored quiz attempts after questions or answer keys change'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--question', type=int, nargs='+', dest='question_ids',
+                            help='Regrade attempts of every quiz containing these questions')
+        parser.add_argument('--quiz', type=int, nargs='+', dest='quiz_ids',
+                            help='Regrade attempts of these quizzes')
+        parser.add_argument('--all', action='store_true',
+                            help='Regrade every attempt of every quiz')
+        parser.add_argument('--chunk-size', type=int, default=2000)
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        question_ids = options['question_ids']
+        quiz_ids = options['quiz_ids']
+        if not (question_ids or quiz_ids or options['all']):
+            raise CommandError('Pass --question, --quiz or --all')
+
+        def progress(quiz, processed, updated):
+            if options['verbosity'] >= 1:
+                self.stdout.write(f'Quiz {quiz.pk}: {processed} attempts checked, {updated} updated')
+
+        summary = regrade_attempts(
+            question_ids=question_ids,
+            quiz_ids=quiz_ids,
+            chunk_size=options['chunk_size'],
+            batch_size=options['batch_size'],
+            progress=progress
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Regraded {summary['attempts']} attempts across {summary['quizzes']} quizzes "
+            f"({summary['updated']} changed)"
+        ))
@@ -0,0 +1,44 @@
+# sync_sqlite_replica.py
+import sqlite3
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from api.replicas import replica_alias
+
+
+class Command(BaseCommand):
+    help = ('Copy the primary SQLite database into the replica file set by SQLITE_REPLICA_PATH, '
+            'to try replica routing locally. Runs once, or every --interval seconds.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=None,
+                            help='Seconds between copies; copy once when omitted')
+
+    def handle(self, *args, **options):
+        alias = replica_alias()
+        if alias is None:
+            raise CommandError('No replica configured; set SQLITE_REPLICA_PATH')
+        primary, replica = connections['default'], connections[alias]
+        if primary.vendor != 'sqlite' or replica.vendor != 'sqlite':
+            raise CommandError('Only SQLite replicas can be copied')
+
+        try:
+            while True:
+                self.copy(primary.settings_dict['NAME'], replica.settings_dict['NAME'])
+                if options['interval'] is None:
+                    break
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
+
+    def copy(self, source_path, target_path):
+        # The backup API takes a consistent snapshot, even of a WAL database in use
+        source = sqlite3.connect(source_path)
+        target = sqlite3.connect(target_path)
+        try:
+            source.backup(target)
+        finally:
+            target.close()
+            source.close()
+        self.stdout.write(f'Copied {source_path} to {target_path}')
@@ -0,0 +1,43 @@
+# Generated by Django 5.1.4 on 2026-10-16 23:52
+
+import api.models
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_quizattempt_results'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuizStatistics',
+            fields=[
+                ('quiz', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='statistics', serialize=False, to='api.quiz')),
+                ('attempt_count', models.IntegerField(default=0)),
+                ('score_sum', models.FloatField(default=0)),
+                ('score_squares', models.FloatField(default=0)),
+                ('histogram', models.JSONField(default=api.models.empty_histogram)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='QuestionStatistics',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('attempt_count', models.IntegerField(default=0)),
+                ('correct_count', models.IntegerField(default=0)),
+                ('score_sum', models.FloatField(default=0)),
+                ('score_squares', models.FloatField(default=0)),
+                ('correct_score_sum', models.FloatField(default=0)),
+                ('choice_counts', models.JSONField(default=dict)),
+                ('question', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='statistics', to='api.questionbank')),
+                ('quiz', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='question_statistics', to='api.quiz')),
+            ],
+            options={
+                'unique_together': {('quiz', 'question')},
+            },
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.1.4 on 2026-10-16 23:53
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_quiz_statistics'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClassStanding',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_points', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='quizattempt',
+            index=models.Index(fields=['quiz', '-total_points'], name='attempt_quiz_points_idx'),
+        ),
+        migrations.AddField(
+            model_name='classstanding',
+            name='class_obj',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='standings', to='api.class'),
+        ),
+        migrations.AddField(
+            model_name='classstanding',
+            name='student',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='class_standings', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='classstanding',
+            index=models.Index(fields=['class_obj', '-total_points'], name='standing_class_points_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='classstanding',
+            unique_together={('class_obj', 'student')},
+        ),
+    ]
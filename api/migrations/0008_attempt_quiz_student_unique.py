@@ -0,0 +1,67 @@
+# Generated by Django 5.1.4 on 2026-10-17 10:05
+
+import logging
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Min
+
+logger = logging.getLogger(__name__)
+
+LISTED_DUPLICATES = 50
+
+
+def remove_duplicate_attempts(apps, schema_editor):
+    """
+    Keep the first attempt of every (quiz, student) pair so the constraint can be added.
+
+    Duplicates are only deleted when REMOVE_DUPLICATE_ATTEMPTS is set;
+    otherwise the migration stops and lists them. Run rebuild_analytics
+    and rebuild_leaderboards afterwards if any were removed.
+    """
+    QuizAttempt = apps.get_model('api', 'QuizAttempt')
+    first_ids = (
+        QuizAttempt.objects.values('quiz_id', 'student_id')
+        .annotate(first_id=Min('id'))
+        .values('first_id')
+    )
+    duplicates = list(
+        QuizAttempt.objects.exclude(id__in=first_ids)
+        .order_by('quiz_id', 'student_id', 'id')
+        .values_list('id', 'quiz_id', 'student_id')
+    )
+    if not duplicates:
+        return
+
+    if not getattr(settings, 'REMOVE_DUPLICATE_ATTEMPTS', False):
+        listed = '\n'.join(
+            f'  attempt {attempt_id} (quiz {quiz_id}, student {student_id})'
+            for attempt_id, quiz_id, student_id in duplicates[:LISTED_DUPLICATES]
+        )
+        if len(duplicates) > LISTED_DUPLICATES:
+            listed += f'\n  ... and {len(duplicates) - LISTED_DUPLICATES} more'
+        raise RuntimeError(
+            f'{len(duplicates)} quiz attempts repeat an earlier attempt by the same student:\n{listed}\n'
+            'Resolve them, or set REMOVE_DUPLICATE_ATTEMPTS=1 to keep only the first attempt of each student.'
+        )
+
+    QuizAttempt.objects.filter(id__in=[attempt_id for attempt_id, _, _ in duplicates]).delete()
+    quiz_ids = sorted({quiz_id for _, quiz_id, _ in duplicates})
+    logger.warning(
+        'Removed %s duplicate attempts from quizzes %s; run rebuild_analytics and rebuild_leaderboards',
+        len(duplicates), quiz_ids
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_updated_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_attempts, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='quizattempt',
+            constraint=models.UniqueConstraint(fields=('quiz', 'student'), name='attempt_quiz_student_unique'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.1.4 on 2026-10-17 00:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_quiz_sessions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='quizattempt',
+            name='answers',
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='quizattempt',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('graded', 'Graded')], default='graded', max_length=10),
+        ),
+        migrations.AddIndex(
+            model_name='quizattempt',
+            index=models.Index(condition=models.Q(('status', 'pending')), fields=['quiz', 'id'], name='attempt_pending_idx'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.1.4 on 2026-10-17 00:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_submission_queue'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='questionbank',
+            index=models.Index(fields=['teacher', 'question_type'], name='question_teacher_type_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='quiz',
+            index=models.Index(fields=['teacher', 'start_datetime'], name='quiz_teacher_start_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='quizattempt',
+            index=models.Index(fields=['student', 'attempt_datetime'], name='attempt_student_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='quizattempt',
+            index=models.Index(fields=['quiz', 'attempt_datetime'], name='attempt_quiz_time_idx'),
+        ),
+    ]
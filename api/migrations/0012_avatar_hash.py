@@ -0,0 +1,18 @@
+# Generated by Django 5.1.4 on 2026-10-17 00:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0011_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customuser',
+            name='avatar_hash',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=16),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.1.4 on 2026-10-17 00:31
+
+import api.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0012_avatar_hash'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='customuser',
+            name='profile_picture',
+            field=models.ImageField(blank=True, default='profile_pictures/profile.png', null=True, storage=api.storage.ContentAddressedStorage(), upload_to='profile_pictures/', verbose_name='Profile Picture'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.4 on 2026-10-17 00:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0013_content_addressed_pictures'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='quizattempt',
+            name='idempotency_key',
+            field=models.CharField(blank=True, default='', max_length=200),
+        ),
+    ]
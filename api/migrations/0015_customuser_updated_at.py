@@ -0,0 +1,20 @@
+# Generated by Django 5.1.4 on 2026-10-17 12:40
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0014_attempt_idempotency_key"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="customuser",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.1.4 on 2026-10-17 00:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0015_customuser_updated_at'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='quizattempt',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('grading', 'Grading'), ('graded', 'Graded')], default='graded', max_length=10),
+        ),
+        migrations.AddIndex(
+            model_name='quizattempt',
+            index=models.Index(condition=models.Q(('status', 'grading')), fields=['updated_at'], name='attempt_grading_idx'),
+        ),
+    ]
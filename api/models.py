@@ -6,16 +6,24 @@ from django.core.validators import MinLengthValidator, EmailValidator
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
+from api.storage import ContentAddressedStorage
+
 class CustomUser(AbstractUser):
     email = models.EmailField(_('email address'), unique=True, validators=[EmailValidator()])
     is_teacher = models.BooleanField(default=False)
     profile_picture = models.ImageField(
         upload_to='profile_pictures/',
+        # Stored under a digest of their content, so identical uploads share a file
+        storage=ContentAddressedStorage(),
         null=True,
         blank=True,
         verbose_name="Profile Picture",
         default='profile_pictures/profile.png'
     )
+    # Content digest of profile_picture, naming its resized variants (see api/avatars.py)
+    avatar_hash = models.CharField(max_length=16, blank=True, db_index=True, editable=False)
+    # Class and attempt lists embed users; their conditional GET validators read this
+    updated_at = models.DateTimeField(auto_now=True)
 
     groups = models.ManyToManyField(
         Group,
@@ -55,6 +63,7 @@ class Class(models.Model):
     teacher = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='created_classes')
     join_code = models.CharField(max_length=8, unique=True)
     students = models.ManyToManyField(CustomUser, related_name='enrolled_classes', blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         if self.section:
@@ -76,6 +85,12 @@ class QuestionBank(models.Model):
     option_c = models.CharField(max_length=200, blank=True, null=True)
     option_d = models.CharField(max_length=200, blank=True, null=True)
     points = models.IntegerField(default=1)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['teacher', 'question_type'], name='question_teacher_type_idx'),
+        ]
 
     def __str__(self):
         return f"{self.question_type}: {self.question_text[:50]}"
@@ -89,6 +104,12 @@ class Quiz(models.Model):
     time_limit_minutes = models.IntegerField(default=30)
     questions = models.ManyToManyField(QuestionBank)
     show_correct_answers = models.BooleanField(default=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['teacher', 'start_datetime'], name='quiz_teacher_start_idx'),
+        ]
 
     def is_active(self):
         now = timezone.now()
@@ -98,6 +119,15 @@ class Quiz(models.Model):
         return self.title
 
 class QuizAttempt(models.Model):
+    PENDING = 'pending'
+    # Claimed by a process_submissions worker
+    GRADING = 'grading'
+    GRADED = 'graded'
+    STATUSES = [
+        (PENDING, 'Pending'),
+        (GRADING, 'Grading'),
+        (GRADED, 'Graded'),
+    ]
     student = models.ForeignKey(CustomUser, on_delete=models.CASCADE)
     quiz = models.ForeignKey(Quiz, on_delete=models.CASCADE)
     score = models.FloatField(default=0)
@@ -107,6 +137,105 @@ class QuizAttempt(models.Model):
     max_points = models.IntegerField(default=0)
     attempt_datetime = models.DateTimeField(auto_now_add=True)
     results = models.JSONField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    status = models.CharField(max_length=10, choices=STATUSES, default=GRADED)
+    # Raw answers of a queued submission, cleared once it is graded
+    answers = models.JSONField(null=True, blank=True)
+    # Idempotency-Key of the submission that stored the attempt, for replaying retries
+    idempotency_key = models.CharField(max_length=200, blank=True, default='')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['quiz', '-total_points'], name='attempt_quiz_points_idx'),
+            # Attempt lists, which page in submission order
+            models.Index(fields=['student', 'attempt_datetime'], name='attempt_student_time_idx'),
+            models.Index(fields=['quiz', 'attempt_datetime'], name='attempt_quiz_time_idx'),
+            # Keeps the submission queue scan small however many graded rows exist
+            models.Index(fields=['quiz', 'id'], name='attempt_pending_idx', condition=models.Q(status='pending')),
+            # Finds claims abandoned by a worker that stopped mid-batch
+            models.Index(fields=['updated_at'], name='attempt_grading_idx', condition=models.Q(status='grading')),
+        ]
+        constraints = [
+            # One attempt per student and quiz, enforced even under concurrent submits
+            models.UniqueConstraint(fields=['quiz', 'student'], name='attempt_quiz_student_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.student.username} - {self.quiz.title}"
+
+class QuizSession(models.Model):
+    """
+    A student's open attempt at a quiz: its deadline and the answers saved so far
+    """
+    quiz = models.ForeignKey(Quiz, on_delete=models.CASCADE, related_name='sessions')
+    student = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='quiz_sessions')
+    started_at = models.DateTimeField(auto_now_add=True)
+    deadline = models.DateTimeField()
+    answers = models.JSONField(default=dict, blank=True)
+    answers_saved_at = models.DateTimeField(null=True, blank=True)
+    submitted_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['quiz', 'student'], name='session_quiz_student_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.student_id} - {self.quiz_id} until {self.deadline}"
+
+def empty_histogram():
+    return [0] * 10
+
+class QuizStatistics(models.Model):
+    """
+    Running aggregates for a quiz, updated as attempts come in
+    """
+    quiz = models.OneToOneField(Quiz, on_delete=models.CASCADE, primary_key=True, related_name='statistics')
+    attempt_count = models.IntegerField(default=0)
+    score_sum = models.FloatField(default=0)
+    score_squares = models.FloatField(default=0)
+    # Attempt counts per 10-point score band, 0-9 through 90-100
+    histogram = models.JSONField(default=empty_histogram)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Statistics for {self.quiz.title}"
+
+class QuestionStatistics(models.Model):
+    """
+    Running aggregates for one question within a quiz
+    """
+    quiz = models.ForeignKey(Quiz, on_delete=models.CASCADE, related_name='question_statistics')
+    question = models.ForeignKey(QuestionBank, on_delete=models.CASCADE, related_name='statistics')
+    attempt_count = models.IntegerField(default=0)
+    correct_count = models.IntegerField(default=0)
+    # Quiz scores of everyone who saw the question, and of those who got it right,
+    # kept for the point-biserial discrimination index
+    score_sum = models.FloatField(default=0)
+    score_squares = models.FloatField(default=0)
+    correct_score_sum = models.FloatField(default=0)
+    choice_counts = models.JSONField(default=dict)
+
+    class Meta:
+        unique_together = ('quiz', 'question')
+
+    def __str__(self):
+        return f"{self.quiz.title} - question {self.question_id}"
+
+class ClassStanding(models.Model):
+    """
+    A student's running point total across the quizzes of one class
+    """
+    class_obj = models.ForeignKey(Class, on_delete=models.CASCADE, related_name='standings')
+    student = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='class_standings')
+    total_points = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('class_obj', 'student')
+        indexes = [
+            models.Index(fields=['class_obj', '-total_points'], name='standing_class_points_idx'),
+        ]
 
     def __str__(self):
-        return f"{self.student.username} - {self.quiz.title}"
\ No newline at end of file
+        return f"{self.student.username} - {self.class_obj}: {self.total_points}"
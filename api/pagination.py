@@ -0,0 +1,83 @@
+# pagination.py
+from rest_framework.pagination import CursorPagination
+
+
+def reverse_ordering(ordering):
+    return tuple(field[1:] if field.startswith('-') else f'-{field}' for field in ordering)
+
+
+class IdCursorPagination(CursorPagination):
+    """
+    Keyset pagination on the primary key. Pages never run COUNT(*) and cost
+    the same no matter how deep the client scrolls.
+
+    Sync views paginate with CursorPagination as is. The async views call
+    apaginate_queryset, which reads the same page through the async ORM and
+    leaves the paginator in the same state, so DRF builds the links.
+    """
+    ordering = 'id'
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        window = self.page_window(queryset, request, view)
+        if window is None:
+            return None
+        return self.paginate_window([item async for item in window])
+
+    def page_window(self, queryset, request, view=None):
+        """
+        Read the cursor and return the slice of the queryset holding the
+        page, plus one row past it to tell whether another page follows
+        """
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        offset, reverse, position = self.cursor or (0, False, None)
+
+        queryset = queryset.order_by(*(reverse_ordering(self.ordering) if reverse else self.ordering))
+        if position is not None:
+            # The cursor points at the first ordering field; rows sharing its value are skipped by offset
+            field = self.ordering[0]
+            lookup = 'lt' if reverse != field.startswith('-') else 'gt'
+            queryset = queryset.filter(**{f'{field.lstrip("-")}__{lookup}': position})
+        return queryset[offset:offset + self.page_size + 1]
+
+    def position_of(self, row):
+        field = self.ordering[0].lstrip('-')
+        value = row[field] if isinstance(row, dict) else getattr(row, field)
+        return None if value is None else str(value)
+
+    def paginate_window(self, rows):
+        """
+        Take the page from the rows page_window fetched, and work out
+        which directions have more pages and where they start
+        """
+        offset, reverse, position = self.cursor or (0, False, None)
+        self.page = rows[:self.page_size]
+        more = len(rows) > self.page_size
+        following = self.position_of(rows[-1]) if more else None
+
+        if reverse:
+            self.page.reverse()
+            self.has_next = position is not None or offset > 0
+            self.has_previous = more
+            self.next_position, self.previous_position = position, following
+        else:
+            self.has_next = more
+            self.has_previous = position is not None or offset > 0
+            self.next_position, self.previous_position = following, position
+
+        self.display_page_controls = (self.has_previous or self.has_next) and self.template is not None
+        return self.page
+
+
+class AttemptCursorPagination(IdCursorPagination):
+    """
+    Attempts in submission order, with id breaking ties between equal timestamps
+    """
+    ordering = ('attempt_datetime', 'id')
@@ -0,0 +1,180 @@
+# quiz_sessions.py
+import time
+from datetime import timedelta
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from api.bulk import bulk_update_rows
+from api.models import QuizSession
+
+SESSION_KEY = 'quiz-session:{}:{}'
+
+
+def flush_interval():
+    # Seconds a session's answers may live only in the cache before being written
+    return getattr(settings, 'QUIZ_SESSION_FLUSH_INTERVAL', 30)
+
+
+def write_behind():
+    """
+    Whether autosaved answers are buffered in the cache between writes.
+
+    Only safe with a cache every worker shares: with a process-local one,
+    saves landing on different workers would each see their own answers.
+    settings only enables it for a shared cache; otherwise every save
+    writes through to the session row.
+    """
+    return getattr(settings, 'QUIZ_SESSION_WRITE_BEHIND', False)
+
+
+def sessions_required():
+    """
+    Whether timed quizzes only accept submissions from a started session.
+
+    Off by default, so clients that submit without calling start_attempt
+    keep working; the time limit is then only enforced for sessions.
+    """
+    return getattr(settings, 'QUIZ_SESSION_REQUIRED', False)
+
+
+def grace_period():
+    # Allowance for network latency on saves arriving just after the deadline
+    return timedelta(seconds=getattr(settings, 'QUIZ_SESSION_GRACE_SECONDS', 30))
+
+
+def session_deadline(quiz, started_at):
+    return min(started_at + timedelta(minutes=quiz.time_limit_minutes), quiz.end_datetime)
+
+
+def _state(session):
+    return {
+        'id': session.id,
+        'deadline': session.deadline,
+        'answers': dict(session.answers or {}),
+        'saved_at': session.answers_saved_at,
+        'flushed_at': time.time(),
+    }
+
+
+def _store(quiz_id, student_id, state):
+    if not write_behind():
+        return
+    remaining = (state['deadline'] + grace_period() - timezone.now()).total_seconds()
+    timeout = max(remaining, 0) + flush_interval() * 2
+    cache.set(SESSION_KEY.format(quiz_id, student_id), state, timeout)
+
+
+def start_session(quiz, student):
+    """
+    Open the student's session for a quiz, or resume the one already open.
+
+    Returns None when the session was already submitted.
+    """
+    now = timezone.now()
+    session, _ = QuizSession.objects.get_or_create(
+        quiz=quiz, student=student, defaults={'deadline': session_deadline(quiz, now)}
+    )
+    if session.submitted_at is not None:
+        return None
+    state = cache.get(SESSION_KEY.format(quiz.pk, student.pk)) if write_behind() else None
+    if state is None:
+        state = _state(session)
+        _store(quiz.pk, student.pk, state)
+    return state
+
+
+def get_session(quiz_id, student):
+    """
+    The open session of a student, from the cache when possible
+    """
+    state = cache.get(SESSION_KEY.format(quiz_id, student.pk)) if write_behind() else None
+    if state is None:
+        session = QuizSession.objects.filter(
+            quiz_id=quiz_id, student=student, submitted_at__isnull=True
+        ).first()
+        if session is None:
+            return None
+        state = _state(session)
+        _store(quiz_id, student.pk, state)
+    return state
+
+
+def is_open(state):
+    return timezone.now() <= state['deadline'] + grace_period()
+
+
+def remaining_seconds(state):
+    return max(int((state['deadline'] - timezone.now()).total_seconds()), 0)
+
+
+def save_answers(quiz_id, student, state, answers):
+    """
+    Merge answers into the session.
+
+    With write-behind the row is written at most once per flush interval,
+    and flush_sessions writes whatever is still pending in one batch.
+    Otherwise every save writes the row.
+    """
+    state['answers'].update({str(key): value for key, value in answers.items()})
+    state['saved_at'] = timezone.now()
+    if not write_behind() or time.time() - state['flushed_at'] >= flush_interval():
+        QuizSession.objects.filter(id=state['id']).update(
+            answers=state['answers'], answers_saved_at=state['saved_at']
+        )
+        state['flushed_at'] = time.time()
+    _store(quiz_id, student.pk, state)
+
+
+def submission_answers(state, answers):
+    """
+    The answers to grade for a final submission.
+
+    Answers sent with the submission override the saved ones, unless the
+    session's time is up, in which case only what was saved in time counts.
+    """
+    if state is None:
+        return answers
+    if not is_open(state):
+        return dict(state['answers'])
+    return {**state['answers'], **{str(key): value for key, value in answers.items()}}
+
+
+def close_session(quiz_id, student, state, answers):
+    QuizSession.objects.filter(id=state['id']).update(
+        answers=answers, answers_saved_at=timezone.now(), submitted_at=timezone.now()
+    )
+    cache.delete(SESSION_KEY.format(quiz_id, student.pk))
+
+
+def flush_sessions(chunk_size=500):
+    """
+    Write the cached answers of every open session that has unsaved changes.
+
+    Returns the number of sessions written; none without write-behind,
+    since every save was written already.
+    """
+    if not write_behind():
+        return 0
+    now = timezone.now()
+    open_sessions = QuizSession.objects.filter(
+        submitted_at__isnull=True,
+        deadline__gte=now - grace_period() - timedelta(seconds=flush_interval() * 2)
+    ).order_by('id').values_list('id', 'quiz_id', 'student_id', 'answers_saved_at')
+
+    written = 0
+    last_id = 0
+    while True:
+        rows = list(open_sessions.filter(id__gt=last_id)[:chunk_size])
+        if not rows:
+            return written
+        last_id = rows[-1][0]
+        keys = {SESSION_KEY.format(quiz_id, student_id): (session_id, saved_at)
+                for session_id, quiz_id, student_id, saved_at in rows}
+        pending = []
+        for key, state in cache.get_many(list(keys)).items():
+            session_id, saved_at = keys[key]
+            if state['saved_at'] is not None and (saved_at is None or state['saved_at'] > saved_at):
+                pending.append(QuizSession(id=session_id, answers=state['answers'], answers_saved_at=state['saved_at']))
+        bulk_update_rows(QuizSession, pending, ['answers', 'answers_saved_at'])
+        written += len(pending)
@@ -0,0 +1,107 @@
+# regrade.py
+import logging
+from django.utils import timezone
+
+from api import leaderboards
+from api.analytics import rebuild_quiz_statistics
+from api.bulk import bulk_update_rows
+from api.grading import get_answer_key
+from api.models import Quiz, QuizAttempt
+
+logger = logging.getLogger(__name__)
+
+GRADED_FIELDS = ['score', 'correct_questions', 'total_questions',
+                 'total_points', 'max_points', 'results']
+
+
+def stored_answers(results):
+    """
+    Rebuild a submission's answers dict from the results saved on an attempt.
+
+    Returns (answers, normalized). Results keep the normalized answer, the
+    option index for MC, which still matches after an option's text was
+    edited; attempts graded before it was kept fall back to the displayed
+    answer, which is normalized again.
+    """
+    results = [result for result in results or [] if result.get('question_id') is not None]
+    normalized = bool(results) and all('normalized_answer' in result for result in results)
+    field = 'normalized_answer' if normalized else 'user_answer'
+    answers = {str(result['question_id']): result.get(field, '') for result in results}
+    return answers, normalized
+
+
+def affected_quizzes(question_ids=None, quiz_ids=None, teacher=None):
+    quizzes = Quiz.objects.all()
+    if teacher is not None:
+        quizzes = quizzes.filter(teacher=teacher)
+    if question_ids:
+        quizzes = quizzes.filter(questions__in=question_ids)
+    if quiz_ids:
+        quizzes = quizzes.filter(id__in=quiz_ids)
+    return quizzes.distinct().order_by('id')
+
+
+def regrade_quiz(quiz, chunk_size=2000, batch_size=500, progress=None):
+    """
+    Regrade every attempt of a quiz from its stored answers.
+
+    Attempts are read in id order one chunk at a time and only rows whose
+    grade actually changed are written back, batch_size rows per UPDATE.
+    Returns a (processed, updated) tuple.
+    """
+    answer_key = get_answer_key(quiz)
+    # Queued submissions are graded by the submission worker
+    attempts = QuizAttempt.objects.filter(
+        quiz=quiz, status=QuizAttempt.GRADED
+    ).only('id', *GRADED_FIELDS).order_by('id')
+    processed = 0
+    updated = 0
+    last_id = 0
+    now = timezone.now()
+
+    while True:
+        # Fully consume each chunk before writing so the read cursor is never
+        # open across the UPDATEs
+        changed = []
+        count = 0
+        for attempt in attempts.filter(id__gt=last_id)[:chunk_size].iterator(chunk_size=chunk_size):
+            count += 1
+            last_id = attempt.id
+            answers, normalized = stored_answers(attempt.results)
+            graded = answer_key.grade(answers, quiz.show_correct_answers, normalized)
+            if any(getattr(attempt, field) != graded[field] for field in GRADED_FIELDS):
+                for field in GRADED_FIELDS:
+                    setattr(attempt, field, graded[field])
+                attempt.updated_at = now
+                changed.append(attempt)
+
+        if not count:
+            break
+
+        bulk_update_rows(QuizAttempt, changed, GRADED_FIELDS + ['updated_at'], batch_size)
+
+        processed += count
+        updated += len(changed)
+        if progress is not None:
+            progress(quiz, processed, updated)
+
+    if updated:
+        rebuild_quiz_statistics(quiz, chunk_size)
+        leaderboards.invalidate_quiz(quiz)
+
+    logger.info('Regraded quiz %s: %s attempts, %s changed', quiz.pk, processed, updated)
+    return processed, updated
+
+
+def regrade_attempts(question_ids=None, quiz_ids=None, teacher=None,
+                     chunk_size=2000, batch_size=500, progress=None):
+    """
+    Regrade all attempts touching the given questions and/or quizzes
+    """
+    summary = {'quizzes': 0, 'attempts': 0, 'updated': 0}
+    for quiz in affected_quizzes(question_ids, quiz_ids, teacher):
+        processed, updated = regrade_quiz(quiz, chunk_size, batch_size, progress)
+        summary['quizzes'] += 1
+        summary['attempts'] += processed
+        summary['updated'] += updated
+    return summary
@@ -0,0 +1,108 @@
+# replicas.py
+"""
+Read-replica routing.
+
+When settings.DATABASE_REPLICA names a database alias, ReplicaRouter sends
+the reads of safe requests there; everything else, and every write, uses
+the primary. A user who just wrote is kept on the primary for
+REPLICA_STICKY_SECONDS so they never read a replica that has not caught up
+with their own change yet. The sticky marks live in the default cache, so
+they only reach every worker when that cache is shared.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from rest_framework.permissions import SAFE_METHODS
+
+STICKY_KEY = 'db:sticky:{}'
+
+_use_replica = ContextVar('use_replica', default=False)
+
+
+def replica_alias():
+    return getattr(settings, 'DATABASE_REPLICA', None)
+
+
+def sticky_seconds():
+    return getattr(settings, 'REPLICA_STICKY_SECONDS', 10)
+
+
+def mark_write(user):
+    if replica_alias() and user.is_authenticated:
+        cache.set(STICKY_KEY.format(user.pk), True, sticky_seconds())
+
+
+def wrote_recently(user):
+    return user.is_authenticated and cache.get(STICKY_KEY.format(user.pk), False)
+
+
+async def awrote_recently(user):
+    return user.is_authenticated and await cache.aget(STICKY_KEY.format(user.pk), False)
+
+
+@contextmanager
+def reads_from_replica(enabled=True):
+    token = _use_replica.set(enabled)
+    try:
+        yield
+    finally:
+        _use_replica.reset(token)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        alias = replica_alias()
+        if alias and _use_replica.get():
+            return alias
+        return None
+
+    def db_for_write(self, model, **hints):
+        # Also for instances that were read from the replica
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica gets its schema from the primary
+        if db == replica_alias():
+            return False
+        return None
+
+
+class ReplicaReadMixin:
+    """
+    Serve the reads of safe requests from the replica.
+
+    Actions in primary_actions always read the primary: those whose
+    results are cached for everyone, where a lagging replica would leave a
+    stale entry behind, and those that follow up on the caller's own write.
+    """
+    primary_actions = ()
+
+    def use_replica(self, request):
+        return (
+            replica_alias() is not None
+            and request.method in SAFE_METHODS
+            and self.action not in self.primary_actions
+            and not wrote_recently(request.user)
+        )
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        # After authentication, so the user is loaded from the primary
+        self._replica_token = _use_replica.set(self.use_replica(request))
+
+    def dispatch(self, request, *args, **kwargs):
+        self._replica_token = None
+        try:
+            response = super().dispatch(request, *args, **kwargs)
+        finally:
+            # Also when the view raised, or the next request on this thread would inherit it
+            if self._replica_token is not None:
+                _use_replica.reset(self._replica_token)
+        if self.request.method not in SAFE_METHODS and response.status_code < 400:
+            mark_write(self.request.user)
+        return response
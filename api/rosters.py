@@ -0,0 +1,194 @@
+# rosters.py
+import secrets
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, router, transaction
+from django.db.models import Q
+from django.db.models.signals import m2m_changed
+
+from api.models import Class, CustomUser
+
+Enrollment = Class.students.through
+CLASS_FIELD = Class.students.field.m2m_column_name()
+STUDENT_FIELD = Class.students.field.m2m_reverse_name()
+
+JOIN_CODE_KEY = 'class:join:{}'
+# No 0/O or 1/I, so codes survive being read aloud or copied by hand
+JOIN_CODE_ALPHABET = 'ABCDEFGHJKLMNPQRSTUVWXYZ23456789'
+JOIN_CODE_LENGTH = 8
+JOIN_CODE_ATTEMPTS = 5
+
+
+def join_code_timeout():
+    return getattr(settings, 'JOIN_CODE_CACHE_TIMEOUT', 3600)
+
+
+def new_join_code():
+    return ''.join(secrets.choice(JOIN_CODE_ALPHABET) for _ in range(JOIN_CODE_LENGTH))
+
+
+def save_with_join_code(save):
+    """
+    Call save(join_code=...) with fresh random codes until one is not taken.
+
+    The unique index on join_code settles collisions, so two classes
+    created at the same moment can never end up sharing a code.
+    """
+    for attempt in range(JOIN_CODE_ATTEMPTS):
+        try:
+            with transaction.atomic():
+                return save(join_code=new_join_code())
+        except IntegrityError:
+            if attempt == JOIN_CODE_ATTEMPTS - 1:
+                raise
+
+
+def class_id_for_join_code(join_code):
+    """
+    Class id for a join code, cached so a rush of joins skips the class table
+    """
+    join_code = str(join_code or '').strip()
+    if not join_code:
+        return None
+    key = JOIN_CODE_KEY.format(join_code)
+    class_id = cache.get(key)
+    if class_id is None:
+        class_id = Class.objects.filter(join_code=join_code).values_list('id', flat=True).first()
+        if class_id is not None:
+            cache.set(key, class_id, join_code_timeout())
+    return class_id
+
+
+def forget_join_code(join_code):
+    if join_code:
+        cache.delete(JOIN_CODE_KEY.format(join_code))
+
+
+def join_class(class_id, student):
+    """
+    Enroll one student with a single insert on the roster table.
+
+    Returns False when the student was already enrolled; concurrent joins
+    by the same student are settled by the roster table's unique index.
+    """
+    try:
+        with transaction.atomic():
+            Enrollment.objects.create(**{CLASS_FIELD: class_id, STUDENT_FIELD: student.pk})
+    except IntegrityError:
+        return False
+    # Sent as student.enrolled_classes.add() would, without loading the class
+    m2m_changed.send(
+        sender=Enrollment, instance=student, action='post_add', reverse=True,
+        model=Class, pk_set={class_id}, using=router.db_for_write(Enrollment)
+    )
+    return True
+
+
+def is_enrolled(class_id, student_id):
+    """
+    Membership check as a single EXISTS on the roster table's unique index
+    """
+    return Enrollment.objects.filter(**{CLASS_FIELD: class_id, STUDENT_FIELD: student_id}).exists()
+
+
+def _student_key(identifier):
+    """
+    ('id', pk) for JSON integers, ('name', value) for usernames and emails.
+
+    Strings are never read as ids, so a numeric username such as a school
+    ID is looked up as a username and cannot select another student's pk.
+    """
+    if isinstance(identifier, int) and not isinstance(identifier, bool):
+        return 'id', identifier
+    value = str(identifier).strip()
+    return ('name', value) if value else None
+
+
+def resolve_students(identifiers):
+    """
+    Map student ids (JSON integers), usernames and emails to user ids.
+
+    Returns (student_ids, not_found) where not_found keeps the identifiers
+    that match no student, in the order given.
+    """
+    keys = [_student_key(identifier) for identifier in identifiers]
+    ids, names = set(), set()
+    for key in filter(None, keys):
+        kind, value = key
+        (ids if kind == 'id' else names).add(value)
+
+    rows = CustomUser.objects.filter(
+        Q(id__in=ids) | Q(username__in=names) | Q(email__in=names),
+        is_teacher=False
+    ).values_list('id', 'username', 'email')
+
+    found = {}
+    for student_id, username, email in rows:
+        found['id', student_id] = student_id
+        found['name', username] = student_id
+        found['name', email] = student_id
+
+    student_ids = []
+    not_found = []
+    for identifier, key in zip(identifiers, keys):
+        student_id = found.get(key)
+        if student_id is None:
+            not_found.append(identifier)
+        elif student_id not in student_ids:
+            student_ids.append(student_id)
+    return student_ids, not_found
+
+
+def _enrolled_ids(class_obj, student_ids):
+    return set(
+        Enrollment.objects.filter(
+            **{CLASS_FIELD: class_obj.pk, f'{STUDENT_FIELD}__in': student_ids}
+        ).values_list(STUDENT_FIELD, flat=True)
+    )
+
+
+def _roster_changed(class_obj, action, student_ids):
+    # bulk writes skip m2m_changed; send it so caches, timestamps and standings follow
+    m2m_changed.send(
+        sender=Enrollment, instance=class_obj, action=action, reverse=False,
+        model=CustomUser, pk_set=set(student_ids), using=router.db_for_write(Enrollment)
+    )
+
+
+def enroll_students(class_obj, student_ids):
+    """
+    Add students to a class with one conflict-ignoring insert.
+
+    Returns the ids that were newly enrolled.
+    """
+    if not student_ids:
+        return []
+    with transaction.atomic():
+        existing = _enrolled_ids(class_obj, student_ids)
+        added = [student_id for student_id in student_ids if student_id not in existing]
+        Enrollment.objects.bulk_create(
+            [Enrollment(**{CLASS_FIELD: class_obj.pk, STUDENT_FIELD: student_id}) for student_id in added],
+            ignore_conflicts=True
+        )
+    if added:
+        _roster_changed(class_obj, 'post_add', added)
+    return added
+
+
+def remove_students(class_obj, student_ids):
+    """
+    Remove students from a class with one filtered delete.
+
+    Returns the ids that were enrolled and have been removed.
+    """
+    if not student_ids:
+        return []
+    with transaction.atomic():
+        enrolled = _enrolled_ids(class_obj, student_ids)
+        removed = [student_id for student_id in student_ids if student_id in enrolled]
+        Enrollment.objects.filter(
+            **{CLASS_FIELD: class_obj.pk, f'{STUDENT_FIELD}__in': removed}
+        ).delete()
+    if removed:
+        _roster_changed(class_obj, 'post_remove', removed)
+    return removed
@@ -2,23 +2,172 @@
 from rest_framework import serializers
 from .models import CustomUser, Class, Quiz, QuestionBank, QuizAttempt
 from django.contrib.auth.password_validation import validate_password
-from django.db.models import Q
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch, Q
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
-from django.contrib.auth import authenticate
-import os
+from api.avatars import build_variants, variant_urls
+from api.logins import login
+from api.uploads import ProfilePictureField
 
-class CustomUserSerializer(serializers.ModelSerializer):
+def parse_field_tree(value):
+    """
+    Turn "score,quiz.title,quiz.teacher.username" into a nested dict of field names
+    """
+    tree = {}
+    for path in value.split(','):
+        node = tree
+        for name in path.strip().split('.'):
+            if name:
+                node = node.setdefault(name, {})
+    return tree
+
+class DynamicFieldsMixin:
+    """
+    Sparse fieldsets for read requests.
+
+    ``?fields=score,quiz.title`` limits the output to the listed fields and
+    ``?expand=quiz,quiz.teacher`` chooses which relations are rendered as
+    nested objects. Once either parameter is given, relations that are not
+    expanded are rendered as ids. Without them the full nested
+    representation is kept. Nested serializers are only built for expanded
+    relations, and setup_eager_loading() loads only what will be rendered.
+    """
+    expandable_fields = {}
+    implied_fields = {}
+
+    def __init__(self, *args, fields=None, expand=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._requested_fields = fields
+        self._requested_expand = expand
+
+    @staticmethod
+    def sparse_options_from_request(request):
+        """
+        Return (fields, expand, sparse) for a request's query parameters
+        """
+        if request is None or request.method not in ('GET', 'HEAD'):
+            return None, {}, False
+        params = request.query_params
+        if 'fields' not in params and 'expand' not in params:
+            return None, {}, False
+        fields = parse_field_tree(params['fields']) if params.get('fields') else None
+        return fields, parse_field_tree(params.get('expand', '')), True
+
+    def _sparse_options(self):
+        if self._requested_fields is not None or self._requested_expand is not None:
+            return self._requested_fields, self._requested_expand or {}, True
+        is_root = self.parent is None or (
+            isinstance(self.parent, serializers.ListSerializer) and self.parent.parent is None
+        )
+        if is_root:
+            return self.sparse_options_from_request(self.context.get('request'))
+        return None, {}, False
+
+    @classmethod
+    def _included(cls, name, fields):
+        return fields is None or name in fields or any(
+            name in implied for field, implied in cls.implied_fields.items() if field in fields
+        )
+
+    def get_fields(self):
+        fields = super().get_fields()
+        requested, expand, sparse = self._sparse_options()
+        model = self.Meta.model
+
+        for name, serializer_class in self.expandable_fields.items():
+            if name not in fields or not self._included(name, requested):
+                continue
+            many = model._meta.get_field(name).many_to_many
+            if not sparse:
+                fields[name] = serializer_class(many=many, read_only=True)
+            elif name in expand or (requested and requested.get(name)):
+                fields[name] = serializer_class(
+                    many=many,
+                    read_only=True,
+                    fields=requested.get(name) or None if requested else None,
+                    expand=expand.get(name, {})
+                )
+
+        if requested is not None:
+            fields = {name: field for name, field in fields.items() if self._included(name, requested)}
+        return fields
+
+    @classmethod
+    def setup_eager_loading(cls, queryset, request=None):
+        """
+        Apply the select_related/prefetch_related plan matching what the
+        serializer will render for this request
+        """
+        return cls._eager_loading_queryset(queryset, *cls.sparse_options_from_request(request))
+
+    @classmethod
+    def _eager_loading_plan(cls, fields, expand, sparse, prefix=''):
+        select = []
+        prefetch = []
+        model = cls.Meta.model
+        for name in cls.Meta.fields:
+            if not cls._included(name, fields):
+                continue
+            try:
+                model_field = model._meta.get_field(name)
+            except FieldDoesNotExist:
+                continue
+            if not model_field.is_relation:
+                continue
+
+            serializer_class = cls.expandable_fields.get(name)
+            expanded = serializer_class is not None and (
+                not sparse or name in expand or bool(fields and fields.get(name))
+            )
+            child_fields = fields.get(name) or None if fields else None
+            child_expand = expand.get(name, {})
+
+            if model_field.many_to_many:
+                if expanded:
+                    child_queryset = serializer_class._eager_loading_queryset(
+                        model_field.related_model.objects.all(), child_fields, child_expand, sparse
+                    )
+                    prefetch.append(Prefetch(f'{prefix}{name}', queryset=child_queryset))
+                else:
+                    prefetch.append(f'{prefix}{name}')
+            elif expanded:
+                select.append(f'{prefix}{name}')
+                child_select, child_prefetch = serializer_class._eager_loading_plan(
+                    child_fields, child_expand, sparse, prefix=f'{prefix}{name}__'
+                )
+                select.extend(child_select)
+                prefetch.extend(child_prefetch)
+        return select, prefetch
+
+    @classmethod
+    def _eager_loading_queryset(cls, queryset, fields, expand, sparse):
+        select, prefetch = cls._eager_loading_plan(fields, expand, sparse)
+        if select:
+            queryset = queryset.select_related(*select)
+        if prefetch:
+            queryset = queryset.prefetch_related(*prefetch)
+        return queryset
+
+class CustomUserSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     password = serializers.CharField(write_only=True, required=False, validators=[validate_password])
-    profile_picture = serializers.ImageField(required=False)
+    profile_picture = ProfilePictureField(required=False)
+    # Resized variants of profile_picture, {size: {format: url}}
+    avatar = serializers.SerializerMethodField()
 
     class Meta:
         model = CustomUser
         fields = ('id', 'username', 'email', 'password', 'first_name',
-                 'last_name', 'is_teacher', 'profile_picture')
+                 'last_name', 'is_teacher', 'profile_picture', 'avatar')
         extra_kwargs = {
             'password': {'write_only': True}
         }
 
+    def get_avatar(self, obj):
+        if not obj.avatar_hash:
+            return None
+        request = self.context.get('request')
+        return variant_urls(obj.avatar_hash, request.build_absolute_uri if request else str)
+
     def create(self, validated_data):
         user = CustomUser.objects.create_user(
             username=validated_data['username'],
@@ -38,71 +187,54 @@ class CustomUserSerializer(serializers.ModelSerializer):
         # Handle profile picture removal
         if validated_data.get('remove_profile_picture'):
             instance.profile_picture = 'profile_pictures/profile.png'
+            instance.avatar_hash = ''
             validated_data.pop('remove_profile_picture')
 
-        # Handle profile picture update
-        if 'profile_picture' in validated_data:
-            profile_picture = validated_data['profile_picture']
-            if profile_picture:
-                # Get file extension
-                ext = os.path.splitext(profile_picture.name)[1].lower()
-                # Create new filename
-                filename = f"{instance.username}{ext}"
-                # Set correct path
-                profile_picture.name = filename
-
-        return super().update(instance, validated_data)
+        instance = super().update(instance, validated_data)
+        if 'profile_picture' in validated_data and instance.avatar_hash:
+            # Built now so the first page showing the new picture need not wait
+            build_variants(instance.profile_picture, instance.avatar_hash)
+        return instance
 
 class EmailTokenObtainPairSerializer(TokenObtainPairSerializer):
     def validate(self, attrs):
-        # Get the username and password from the request
-        username = attrs.get('username')
-        password = attrs.get('password')
-
-        try:
-            # Try to fetch the user by username or email
-            user = CustomUser.objects.get(Q(username=username) | Q(email=username))
-
-            # Update the username in attrs to the actual username
-            # This is necessary because the parent class expects username
-            attrs['username'] = user.username
-
-            # Now authenticate with the actual username
-            credentials = {
-                'username': user.username,
-                'password': password
-            }
-
-            user = authenticate(**credentials)
-
-            if user is None:
-                raise serializers.ValidationError('Invalid password')
-
-            if not user.is_active:
-                raise serializers.ValidationError('User is inactive')
-
-            # If we get here, authentication was successful
-            return super().validate(attrs)
-
-        except CustomUser.DoesNotExist:
-            raise serializers.ValidationError('No account found with the given credentials')
+        # Log in by username or email with a single lookup and a single
+        # password hash, rather than authenticate() twice over
+        self.user = login(attrs.get('username'), attrs.get('password'))
+        refresh = self.get_token(self.user)
+        return {
+            'refresh': str(refresh),
+            'access': str(refresh.access_token),
+        }
 
-class ClassSerializer(serializers.ModelSerializer):
-    teacher = CustomUserSerializer(read_only=True)
-    students = CustomUserSerializer(many=True, read_only=True)
+class ClassSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    expandable_fields = {
+        'teacher': CustomUserSerializer,
+        'students': CustomUserSerializer,
+    }
 
     class Meta:
         model = Class
         fields = ('id', 'name', 'section', 'teacher', 'join_code', 'students')
+        # Join codes are generated by the server, see rosters.save_with_join_code
+        read_only_fields = ('teacher', 'join_code', 'students')
 
-class QuestionBankSerializer(serializers.ModelSerializer):
-    teacher = CustomUserSerializer(read_only=True)
+class QuestionBankSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     display_answer = serializers.SerializerMethodField()
 
+    expandable_fields = {
+        'teacher': CustomUserSerializer,
+    }
+    # correct_answer is rendered from display_answer
+    implied_fields = {
+        'correct_answer': ('display_answer',),
+    }
+
     class Meta:
         model = QuestionBank
         fields = ['id', 'teacher', 'question_text', 'question_type', 'correct_answer',
                  'option_a', 'option_b', 'option_c', 'option_d', 'points', 'display_answer']
+        read_only_fields = ['teacher']
 
     def get_display_answer(self, obj):
         if obj.question_type == 'MC':
@@ -120,23 +252,38 @@ class QuestionBankSerializer(serializers.ModelSerializer):
     def to_representation(self, instance):
         representation = super().to_representation(instance)
         # Replace correct_answer with display_answer for the response
-        representation['correct_answer'] = representation.pop('display_answer')
+        if 'display_answer' in representation:
+            representation['correct_answer'] = representation.pop('display_answer')
         return representation
 
-class QuizSerializer(serializers.ModelSerializer):
-    teacher = CustomUserSerializer(read_only=True)
-    questions = QuestionBankSerializer(many=True, read_only=True)
+class QuestionImportSerializer(serializers.ModelSerializer):
+    """
+    Validates one row of a bulk question import; points are clamped separately
+    """
+
+    class Meta:
+        model = QuestionBank
+        fields = ['question_text', 'question_type', 'correct_answer',
+                 'option_a', 'option_b', 'option_c', 'option_d']
+
+class QuizSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     question_ids = serializers.ListField(
         child=serializers.IntegerField(),
         write_only=True,
         required=False
     )
 
+    expandable_fields = {
+        'teacher': CustomUserSerializer,
+        'questions': QuestionBankSerializer,
+    }
+
     class Meta:
         model = Quiz
         fields = ('id', 'title', 'teacher', 'classes', 'start_datetime',
                  'end_datetime', 'time_limit_minutes', 'questions',
                  'show_correct_answers', 'question_ids')
+        read_only_fields = ('teacher', 'questions')
 
     def create(self, validated_data):
         question_ids = validated_data.pop('question_ids', [])
@@ -146,12 +293,15 @@ class QuizSerializer(serializers.ModelSerializer):
             quiz.questions.set(questions)
         return quiz
 
-class QuizAttemptSerializer(serializers.ModelSerializer):
-    student = CustomUserSerializer(read_only=True)
-    quiz = QuizSerializer(read_only=True)
+class QuizAttemptSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    expandable_fields = {
+        'student': CustomUserSerializer,
+        'quiz': QuizSerializer,
+    }
 
     class Meta:
         model = QuizAttempt
         fields = ['id', 'student', 'quiz', 'score', 'total_questions',
                  'correct_questions', 'total_points', 'max_points',
-                 'attempt_datetime', 'results']
\ No newline at end of file
+                 'attempt_datetime', 'results', 'status']
+        read_only_fields = ['student', 'quiz', 'status']
\ No newline at end of file
@@ -0,0 +1,235 @@
+# signals.py
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from api.avatars import picture_hash
+from api.caching import (
+    bump_quiz_list_version, bump_quiz_version, bump_removals_version, bump_roster_versions, bump_user_version
+)
+from api.leaderboards import add_class_members, rebuild_class_standings
+from api.models import Class, CustomUser, QuestionBank, Quiz, QuizAttempt
+from api.rosters import forget_join_code
+
+
+# The CustomUser fields a quiz payload shows of its teacher
+QUIZ_TEACHER_FIELDS = ('username', 'email', 'first_name', 'last_name', 'is_teacher',
+                       'profile_picture', 'avatar_hash')
+
+
+def _quiz_ids_for_question(question):
+    return list(Quiz.objects.filter(questions=question).values_list('id', flat=True))
+
+
+def _quiz_ids_for_class(class_obj):
+    return list(Quiz.objects.filter(classes=class_obj).values_list('id', flat=True))
+
+
+def _quizzes_changed(quiz_ids):
+    """
+    Mark quizzes as modified after a change to something they render
+    """
+    quiz_ids = list(quiz_ids)
+    if quiz_ids:
+        Quiz.objects.filter(id__in=quiz_ids).update(updated_at=timezone.now())
+        bump_quiz_version(*quiz_ids)
+
+
+@receiver(post_save, sender=Quiz)
+@receiver(post_delete, sender=Quiz)
+def quiz_changed(sender, instance, **kwargs):
+    bump_quiz_version(instance.pk)
+
+
+@receiver(post_delete, sender=Quiz)
+@receiver(post_delete, sender=Class)
+@receiver(post_delete, sender=QuestionBank)
+@receiver(post_delete, sender=QuizAttempt)
+@receiver(post_delete, sender=CustomUser)
+def row_removed(sender, **kwargs):
+    bump_removals_version()
+
+
+@receiver(m2m_changed, sender=Quiz.questions.through)
+def quiz_questions_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action.startswith('post_'):
+            _quizzes_changed([instance.pk])
+    elif action == 'pre_clear':
+        # Changed from the question side; remember the quizzes before the rows go
+        instance._affected_quiz_ids = _quiz_ids_for_question(instance)
+    elif action == 'post_clear':
+        _quizzes_changed(getattr(instance, '_affected_quiz_ids', []))
+    elif action.startswith('post_') and pk_set:
+        _quizzes_changed(pk_set)
+
+
+@receiver(post_save, sender=QuestionBank)
+def question_changed(sender, instance, **kwargs):
+    _quizzes_changed(_quiz_ids_for_question(instance))
+
+
+@receiver(pre_delete, sender=QuestionBank)
+def question_deleting(sender, instance, **kwargs):
+    instance._affected_quiz_ids = _quiz_ids_for_question(instance)
+
+
+@receiver(post_delete, sender=QuestionBank)
+def question_deleted(sender, instance, **kwargs):
+    _quizzes_changed(getattr(instance, '_affected_quiz_ids', []))
+
+
+@receiver(m2m_changed, sender=Quiz.classes.through)
+def quiz_classes_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action.startswith('post_'):
+            _quizzes_changed([instance.pk])
+    elif action == 'pre_clear':
+        instance._affected_quiz_ids = _quiz_ids_for_class(instance)
+    elif action == 'post_clear':
+        _quizzes_changed(getattr(instance, '_affected_quiz_ids', []))
+    elif action.startswith('post_') and pk_set:
+        _quizzes_changed(pk_set)
+
+
+@receiver(m2m_changed, sender=Class.students.through)
+def class_students_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    # Neither the class row nor any shared key is written, so a rush of
+    # joins to one class does not contend or clear everyone's caches
+    if action == 'pre_clear':
+        related = instance.enrolled_classes if reverse else instance.students
+        instance._roster_ids = list(related.values_list('id', flat=True))
+        return
+    if not action.startswith('post_'):
+        return
+
+    related_ids = getattr(instance, '_roster_ids', []) if action == 'post_clear' else list(pk_set or ())
+    class_ids, student_ids = (related_ids, [instance.pk]) if reverse else ([instance.pk], related_ids)
+    if not class_ids or not student_ids:
+        return
+    # Class lists embed rosters
+    bump_roster_versions(class_ids)
+    # Rosters decide which quizzes a student can list and open
+    bump_user_version(*student_ids)
+    if action in ('post_remove', 'post_clear'):
+        # The class leaves the removed students' class lists
+        bump_removals_version()
+
+
+@receiver(m2m_changed, sender=Quiz.classes.through)
+def quiz_classes_standings(sender, instance, action, reverse, pk_set, **kwargs):
+    # Class standings sum the attempts at the quizzes assigned to the class
+    if action == 'pre_clear' and not reverse:
+        instance._standing_class_ids = list(instance.classes.values_list('id', flat=True))
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if reverse:
+        class_ids = [instance.pk] if pk_set or action == 'post_clear' else []
+    elif action == 'post_clear':
+        class_ids = getattr(instance, '_standing_class_ids', [])
+    else:
+        class_ids = pk_set
+    for class_id in class_ids:
+        rebuild_class_standings(class_id)
+
+
+@receiver(m2m_changed, sender=Class.students.through)
+def class_students_standings(sender, instance, action, reverse, pk_set, **kwargs):
+    # Only the joining or leaving students' rows change
+    if action == 'pre_clear' and reverse:
+        instance._standing_class_ids = list(instance.enrolled_classes.values_list('id', flat=True))
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if action == 'post_add':
+        # Joining adds rows only for students with points there already
+        if pk_set:
+            class_ids, student_ids = (pk_set, [instance.pk]) if reverse else ([instance.pk], pk_set)
+            add_class_members(class_ids, student_ids)
+        return
+    if not reverse:
+        if pk_set or action == 'post_clear':
+            rebuild_class_standings(instance.pk, None if action == 'post_clear' else pk_set)
+        return
+    class_ids = getattr(instance, '_standing_class_ids', []) if action == 'post_clear' else pk_set
+    for class_id in class_ids:
+        rebuild_class_standings(class_id, [instance.pk])
+
+
+@receiver(pre_delete, sender=Quiz)
+def quiz_deleting(sender, instance, **kwargs):
+    instance._standing_class_ids = list(instance.classes.values_list('id', flat=True))
+
+
+@receiver(post_delete, sender=Quiz)
+def quiz_deleted(sender, instance, **kwargs):
+    # The quiz's attempts were deleted with it
+    for class_id in getattr(instance, '_standing_class_ids', []):
+        rebuild_class_standings(class_id)
+
+
+@receiver(pre_save, sender=Class)
+def class_saving(sender, instance, update_fields=None, **kwargs):
+    if instance.pk and (update_fields is None or 'join_code' in update_fields):
+        # A changed code must stop resolving to this class
+        instance._previous_join_code = Class.objects.filter(pk=instance.pk).values_list('join_code', flat=True).first()
+
+
+@receiver(post_save, sender=Class)
+def class_saved(sender, instance, **kwargs):
+    previous = getattr(instance, '_previous_join_code', None)
+    if previous != instance.join_code:
+        forget_join_code(previous)
+
+
+@receiver(pre_delete, sender=Class)
+def class_deleting(sender, instance, **kwargs):
+    instance._affected_quiz_ids = _quiz_ids_for_class(instance)
+
+
+@receiver(post_delete, sender=Class)
+def class_deleted(sender, instance, **kwargs):
+    forget_join_code(instance.join_code)
+    _quizzes_changed(getattr(instance, '_affected_quiz_ids', []))
+    bump_quiz_list_version()
+
+
+@receiver(post_save, sender=CustomUser)
+def user_changed(sender, instance, created, **kwargs):
+    if getattr(instance, '_profile_changed', False):
+        _quizzes_changed(Quiz.objects.filter(teacher=instance).values_list('id', flat=True))
+
+
+@receiver(post_save, sender=CustomUser)
+@receiver(post_delete, sender=CustomUser)
+def user_cache_stale(sender, instance, **kwargs):
+    # Profile edits, password changes, deactivation and deletion all save or
+    # delete the row; authentication must not keep serving the old user
+    bump_user_version(instance.pk)
+
+
+@receiver(pre_save, sender=CustomUser)
+def user_saving(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and 'profile_picture' not in update_fields:
+        return
+    picture = instance.profile_picture
+    if not picture:
+        instance.avatar_hash = ''
+    elif not picture._committed or not instance.avatar_hash:
+        # A new upload, or a picture stored before digests were kept
+        instance.avatar_hash = picture_hash(picture)
+
+
+@receiver(pre_save, sender=CustomUser)
+def user_changing(sender, instance, update_fields=None, **kwargs):
+    # Registered after user_saving, so avatar_hash is current. Quiz payloads
+    # embed the teacher's profile; logins, password changes and other saves
+    # that leave it as it was must not touch the quizzes
+    instance._profile_changed = False
+    if not instance.pk:
+        return
+    fields = [field for field in QUIZ_TEACHER_FIELDS if update_fields is None or field in update_fields]
+    if not fields:
+        return
+    previous = CustomUser.objects.filter(pk=instance.pk, is_teacher=True).values(*fields).first()
+    if previous is not None:
+        instance._profile_changed = any(getattr(instance, field) != previous[field] for field in fields)
@@ -0,0 +1,40 @@
+# storage.py
+"""
+Storage that names each file after a digest of its content.
+
+Identical uploads therefore share one file, and a stored file never
+changes under its name. Nothing is deleted when a reference to a file
+goes away, since other rows may share it; the collect_media command
+sweeps files that nothing refers to any more.
+"""
+import hashlib
+import os
+from django.core.files.storage import FileSystemStorage
+
+DIGEST_LENGTH = 16
+
+
+def content_hash(file):
+    digest = hashlib.sha256()
+    file.seek(0)
+    for chunk in iter(lambda: file.read(64 * 1024), b''):
+        digest.update(chunk)
+    file.seek(0)
+    return digest.hexdigest()[:DIGEST_LENGTH]
+
+
+class ContentAddressedStorage(FileSystemStorage):
+
+    def content_name(self, name, content):
+        directory, filename = os.path.split(name)
+        extension = os.path.splitext(filename)[1].lower()
+        return os.path.join(directory, content_hash(content) + extension)
+
+    def _save(self, name, content):
+        name = self.content_name(name, content)
+        if self.exists(name):
+            # Already stored. Refresh its age, so a sweep started before
+            # this upload does not take the file for an old orphan.
+            os.utime(self.path(name))
+            return name
+        return super()._save(name, content)
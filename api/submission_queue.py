@@ -0,0 +1,151 @@
+# submission_queue.py
+import logging
+from collections import defaultdict
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from api import leaderboards
+from api.analytics import record_attempts
+from api.bulk import bulk_update_rows
+from api.grading import get_answer_key
+from api.models import Quiz, QuizAttempt
+from api.regrade import GRADED_FIELDS
+
+logger = logging.getLogger(__name__)
+
+QUEUE_FIELDS = GRADED_FIELDS + ['status', 'answers', 'updated_at']
+
+
+def _grade_chunks(executor, answer_key, show_correct_answers, submissions, chunk_size):
+    """
+    Grade submissions against one answer key, spread over the pool in chunks
+    """
+    chunks = [submissions[start:start + chunk_size] for start in range(0, len(submissions), chunk_size)]
+    if executor is None:
+        return [answer_key.grade_many(chunk, show_correct_answers) for chunk in chunks]
+    # The compiled key is plain Python and pickles into the worker processes
+    futures = [executor.submit(answer_key.grade_many, chunk, show_correct_answers) for chunk in chunks]
+    return [future.result() for future in futures]
+
+
+def claim_timeout():
+    # Seconds after which a batch claimed by a worker that never finished is queued again
+    return getattr(settings, 'SUBMISSION_CLAIM_TIMEOUT', 300)
+
+
+def release_stale_claims():
+    cutoff = timezone.now() - timedelta(seconds=claim_timeout())
+    return QuizAttempt.objects.filter(status=QuizAttempt.GRADING, updated_at__lt=cutoff).update(
+        status=QuizAttempt.PENDING, updated_at=timezone.now()
+    )
+
+
+def claim_pending(batch_size):
+    """
+    Mark up to batch_size queued submissions as being graded by this worker.
+
+    Returns (ids, claimed_at). The claim time is written to updated_at and
+    identifies the claim at write-back. On PostgreSQL the rows are locked
+    with SKIP LOCKED, so concurrent workers claim disjoint batches; SQLite
+    serializes the claiming transactions. Should another worker still win
+    a row, the whole claim is rolled back and nothing is claimed.
+    """
+    claimed_at = timezone.now()
+    with transaction.atomic():
+        ids = list(
+            QuizAttempt.objects.filter(status=QuizAttempt.PENDING)
+            .select_for_update(skip_locked=True)
+            .order_by('quiz_id', 'id')
+            .values_list('id', flat=True)[:batch_size]
+        )
+        if not ids:
+            return [], claimed_at
+        claimed = QuizAttempt.objects.filter(id__in=ids, status=QuizAttempt.PENDING).update(
+            status=QuizAttempt.GRADING, updated_at=claimed_at
+        )
+        if claimed != len(ids):
+            transaction.set_rollback(True)
+            return [], claimed_at
+    return ids, claimed_at
+
+
+def grade_pending(executor=None, batch_size=500, chunk_size=100):
+    """
+    Claim and grade one batch of queued submissions, grouped by quiz.
+
+    Answer keys are compiled here and grading runs on the executor when
+    one is given. Scores are written back with one batched UPDATE, then
+    folded into the statistics and leaderboards, only for the rows this
+    worker still holds the claim on. Returns the number graded.
+    """
+    release_stale_claims()
+    ids, claimed_at = claim_pending(batch_size)
+    if not ids:
+        return 0
+    pending = list(
+        QuizAttempt.objects.filter(id__in=ids)
+        .select_related('student')
+        .only('id', 'quiz_id', 'answers', 'student__id', 'student__username',
+              'student__first_name', 'student__last_name')
+        .order_by('quiz_id', 'id')
+    )
+
+    by_quiz = defaultdict(list)
+    for attempt in pending:
+        by_quiz[attempt.quiz_id].append(attempt)
+    quizzes = Quiz.objects.in_bulk(list(by_quiz))
+
+    now = timezone.now()
+    graded = []
+    for quiz_id, attempts in by_quiz.items():
+        quiz = quizzes.get(quiz_id)
+        if quiz is None:
+            continue
+        answer_key = get_answer_key(quiz)
+        results = _grade_chunks(
+            executor, answer_key, quiz.show_correct_answers,
+            [attempt.answers or {} for attempt in attempts], chunk_size
+        )
+        for attempt, result in zip(attempts, (result for chunk in results for result in chunk)):
+            for field in GRADED_FIELDS:
+                setattr(attempt, field, result[field])
+            attempt.status = QuizAttempt.GRADED
+            attempt.answers = None
+            attempt.updated_at = now
+            attempt.quiz = quiz
+            graded.append(attempt)
+
+    with transaction.atomic():
+        # A claim held past claim_timeout() may have been released and taken
+        # by another worker, which then owns those rows
+        owned = set(
+            QuizAttempt.objects.select_for_update()
+            .filter(id__in=ids, status=QuizAttempt.GRADING, updated_at=claimed_at)
+            .values_list('id', flat=True)
+        )
+        graded = [attempt for attempt in graded if attempt.id in owned]
+        bulk_update_rows(QuizAttempt, graded, QUEUE_FIELDS)
+
+    graded_by_quiz = defaultdict(list)
+    for attempt in graded:
+        graded_by_quiz[attempt.quiz_id].append(attempt)
+    for quiz_id, attempts in graded_by_quiz.items():
+        record_attempts(quizzes[quiz_id], attempts)
+        leaderboards.record_attempts(quizzes[quiz_id], attempts)
+
+    logger.info('Graded %s queued submissions for %s quizzes', len(graded), len(graded_by_quiz))
+    return len(graded)
+
+
+def attempt_status(attempt_id):
+    """
+    Progress of a submission: its status, plus the graded result once done
+    """
+    row = QuizAttempt.objects.filter(id=attempt_id).values('id', 'status', *GRADED_FIELDS).first()
+    if row is None:
+        return None
+    if row['status'] != QuizAttempt.GRADED:
+        return {'id': row['id'], 'status': row['status']}
+    return row
@@ -0,0 +1,131 @@
+# submissions.py
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+
+from api import leaderboards
+from api.analytics import record_attempt
+from api.grading import grade_submission
+from api.models import QuizAttempt
+
+IDEMPOTENCY_KEY = 'submission:{}:{}:{}'
+MAX_IDEMPOTENCY_KEY_LENGTH = 200
+RESULT_FIELDS = ('score', 'correct_questions', 'total_questions', 'total_points', 'max_points', 'results')
+
+
+def idempotency_timeout():
+    return getattr(settings, 'SUBMISSION_IDEMPOTENCY_TIMEOUT', 24 * 60 * 60)
+
+
+def usable_key(idempotency_key):
+    if not idempotency_key or len(idempotency_key) > MAX_IDEMPOTENCY_KEY_LENGTH:
+        return ''
+    return idempotency_key
+
+
+def idempotency_cache_key(student, quiz, idempotency_key):
+    if not usable_key(idempotency_key):
+        return None
+    return IDEMPOTENCY_KEY.format(student.pk, quiz.pk, idempotency_key)
+
+
+def attempt_result(attempt_id):
+    """
+    The graded result of a stored attempt, shaped like grade_submission's
+    """
+    return QuizAttempt.objects.filter(id=attempt_id).values(*RESULT_FIELDS).first()
+
+
+def stored_result(student, quiz, idempotency_key):
+    """
+    The result a previous submission with the same key returned, if any.
+
+    The cache answers most retries. The key is also stored on the attempt,
+    so a retry served by another process, or after the entry was evicted,
+    still gets the attempt back rather than an "already attempted" error.
+    """
+    key = idempotency_cache_key(student, quiz, idempotency_key)
+    if key is None:
+        return None
+    stored = cache.get(key)
+    if stored is not None:
+        return stored
+    attempt_id = replayed_attempt_id(quiz, student, idempotency_key)
+    if attempt_id is None:
+        return None
+    # Shaped like what the first request returned in the current mode
+    stored = {'attempt_id': attempt_id} if queue_submissions() else attempt_result(attempt_id)
+    cache.set(key, stored, idempotency_timeout())
+    return stored
+
+
+def replayed_attempt_id(quiz, student, idempotency_key):
+    """
+    The id of the student's attempt if it was stored under this idempotency
+    key; a request with another key or none is not a retry of it
+    """
+    idempotency_key = usable_key(idempotency_key)
+    if not idempotency_key:
+        return None
+    return QuizAttempt.objects.filter(
+        quiz=quiz, student=student, idempotency_key=idempotency_key
+    ).values_list('id', flat=True).first()
+
+
+def queue_submissions():
+    """
+    Whether take_quiz stores answers for the submission worker instead of grading inline
+    """
+    return getattr(settings, 'ASYNC_SUBMISSIONS', False)
+
+
+def enqueue_attempt(quiz, student, answers, idempotency_key=None):
+    """
+    Store a pending attempt holding the raw answers, at most once per quiz and student.
+
+    Returns (attempt_id, created); like submit_attempt, a lost race only
+    yields the existing attempt's id when it was stored under the same
+    idempotency key.
+    """
+    try:
+        with transaction.atomic():
+            attempt = QuizAttempt.objects.create(
+                student=student, quiz=quiz, status=QuizAttempt.PENDING,
+                answers=answers, total_questions=0, idempotency_key=usable_key(idempotency_key)
+            )
+    except IntegrityError:
+        return replayed_attempt_id(quiz, student, idempotency_key), False
+
+    key = idempotency_cache_key(student, quiz, idempotency_key)
+    if key:
+        cache.set(key, {'attempt_id': attempt.id}, idempotency_timeout())
+    return attempt.id, True
+
+
+def submit_attempt(quiz, student, answers, idempotency_key=None):
+    """
+    Grade and store an attempt, at most once per quiz and student.
+
+    Returns (result, created). When another request already stored the
+    attempt, result is None, unless that request sent the same idempotency
+    key, in which case it is the stored attempt's result so the retry sees
+    what the first request returned.
+    """
+    graded = grade_submission(quiz, answers)
+    try:
+        with transaction.atomic():
+            attempt = QuizAttempt.objects.create(
+                student=student, quiz=quiz, idempotency_key=usable_key(idempotency_key), **graded
+            )
+    except IntegrityError:
+        # Lost the race to a concurrent submit; the unique constraint kept one attempt
+        existing = replayed_attempt_id(quiz, student, idempotency_key)
+        return (attempt_result(existing) if existing is not None else None), False
+
+    record_attempt(attempt)
+    leaderboards.record_attempt(attempt)
+
+    key = idempotency_cache_key(student, quiz, idempotency_key)
+    if key:
+        cache.set(key, graded, idempotency_timeout())
+    return graded, True
@@ -1,3 +1,1622 @@
-from django.test import TestCase
+import csv
+import io
+import json
+import os
+import shutil
+import struct
+import tempfile
+import time
+import zlib
+from datetime import timedelta
+from unittest.mock import patch
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.contrib.auth.hashers import MD5PasswordHasher
+from django.core.cache import cache, caches
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+from rest_framework.pagination import CursorPagination
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from api.models import Class, ClassStanding, CustomUser, QuestionBank, Quiz, QuizAttempt, QuizSession
+from api import leaderboards, submission_queue
+from api.caching import get_quiz_list_version
+from api.grading import grade_submission, grade_submissions
+from api.management.commands import collect_media
+from api.pagination import AttemptCursorPagination
+from api.quiz_sessions import start_session
+from api.regrade import regrade_attempts
+from api.replicas import ReplicaRouter
+from api.rosters import class_id_for_join_code
+from api.submissions import enqueue_attempt, submit_attempt
+
+
+FAST_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
+
+
+class QuizFixtureMixin:
+    """
+    Builds a teacher with classes, questions, quizzes and graded attempts
+    """
+
+    def create_fixture(self, students=4, quizzes=3, questions=3):
+        now = timezone.now()
+        self.teacher = CustomUser.objects.create_user(
+            username='teacher', email='teacher@example.com', password='pass', is_teacher=True
+        )
+        self.students = [
+            CustomUser.objects.create_user(
+                username=f'student{i}', email=f'student{i}@example.com', password='pass'
+            )
+            for i in range(students)
+        ]
+        self.class_obj = Class.objects.create(name='Math', teacher=self.teacher, join_code='MATH01')
+        self.class_obj.students.set(self.students)
+
+        self.questions = [
+            QuestionBank.objects.create(
+                teacher=self.teacher,
+                question_text=f'Question {i}',
+                question_type='MC',
+                correct_answer='0',
+                option_a='A', option_b='B', option_c='C', option_d='D',
+                points=2
+            )
+            for i in range(questions)
+        ]
+        self.quizzes = []
+        for i in range(quizzes):
+            quiz = Quiz.objects.create(
+                title=f'Quiz {i}',
+                teacher=self.teacher,
+                start_datetime=now - timedelta(hours=1),
+                end_datetime=now + timedelta(hours=1)
+            )
+            quiz.classes.add(self.class_obj)
+            quiz.questions.set(self.questions)
+            self.quizzes.append(quiz)
+            for student in self.students:
+                QuizAttempt.objects.create(
+                    student=student,
+                    quiz=quiz,
+                    score=50,
+                    total_questions=questions,
+                    results=[
+                        {'question_id': question.id, 'correct': False, 'user_answer': 'B',
+                         'correct_answer': None, 'points': 0, 'max_points': 2}
+                        for question in self.questions
+                    ]
+                )
+
+    def client_for(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client
+
+    def start_sessions(self, quizzes=None, students=None):
+        # take_quiz only grades timed quizzes inside a started session
+        for quiz in quizzes or self.quizzes:
+            for student in students or self.students:
+                start_session(quiz, student)
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class QueryBudgetTestCase(QuizFixtureMixin, TestCase):
+    """
+    Each endpoint must serve its rows in a fixed number of queries.
+
+    Conditional list endpoints spend one of them on the validator aggregate.
+    """
+
+    def assertQueryBudget(self, budget, client, url):
+        with CaptureQueriesContext(connection) as context:
+            response = client.get(url)
+        self.assertEqual(response.status_code, 200, response.content)
+        queries = '\n'.join(query['sql'] for query in context.captured_queries)
+        self.assertLessEqual(
+            len(context), budget,
+            f'{url} ran {len(context)} queries, budget is {budget}:\n{queries}'
+        )
+        return response
+
+    def setUp(self):
+        self.create_fixture(students=5, quizzes=4, questions=6)
+
+    def test_class_list(self):
+        self.assertQueryBudget(3, self.client_for(self.teacher), '/api/classes/')
+        self.assertQueryBudget(3, self.client_for(self.students[0]), '/api/classes/')
+
+    def test_quiz_list(self):
+        self.assertQueryBudget(3, self.client_for(self.teacher), '/api/quizzes/')
+        self.assertQueryBudget(3, self.client_for(self.students[0]), '/api/quizzes/')
+        self.assertQueryBudget(3, APIClient(), '/api/quizzes/')
+
+    def test_quiz_retrieve(self):
+        self.assertQueryBudget(3, APIClient(), f'/api/quizzes/{self.quizzes[0].id}/')
+
+    def test_question_list(self):
+        self.assertQueryBudget(1, self.client_for(self.teacher), '/api/questions/')
+
+    def test_attempt_list(self):
+        response = self.assertQueryBudget(4, self.client_for(self.teacher), '/api/attempts/')
+        self.assertEqual(len(response.json()['results']), 20)
+        self.assertQueryBudget(4, self.client_for(self.students[0]), '/api/attempts/')
+
+    def test_budget_does_not_grow_with_rows(self):
+        client = self.client_for(self.teacher)
+        with CaptureQueriesContext(connection) as before:
+            client.get('/api/attempts/')
+        self.create_more_attempts()
+        with CaptureQueriesContext(connection) as after:
+            response = client.get('/api/attempts/')
+        self.assertEqual(len(response.json()['results']), 40)
+        self.assertEqual(len(before), len(after))
+
+    def create_more_attempts(self):
+        for i in range(20):
+            student = CustomUser.objects.create_user(
+                username=f'extra{i}', email=f'extra{i}@example.com', password='pass'
+            )
+            QuizAttempt.objects.create(student=student, quiz=self.quizzes[i % 4], total_questions=6)
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class SparseFieldsTestCase(QuizFixtureMixin, TestCase):
+
+    def setUp(self):
+        self.create_fixture(students=3, quizzes=2, questions=4)
+        self.client = self.client_for(self.teacher)
+
+    def test_default_representation_is_fully_nested(self):
+        attempt = self.client.get('/api/attempts/').json()['results'][0]
+        self.assertEqual(attempt['student']['username'], 'student0')
+        self.assertEqual(len(attempt['quiz']['questions']), 4)
+        self.assertEqual(attempt['quiz']['questions'][0]['correct_answer'], 'A')
+
+    def test_fields_select_nested_subset(self):
+        with CaptureQueriesContext(connection) as context:
+            data = self.client.get('/api/attempts/?fields=score,quiz.title').json()['results']
+        self.assertEqual(data[0], {'quiz': {'title': 'Quiz 0'}, 'score': 50.0})
+        self.assertEqual(len(context), 2)
+
+    def test_unexpanded_relations_are_ids(self):
+        data = self.client.get('/api/attempts/?expand=quiz&fields=id,student,quiz.id,quiz.teacher').json()['results']
+        self.assertEqual(data[0]['student'], self.students[0].id)
+        self.assertEqual(data[0]['quiz'], {'id': self.quizzes[0].id, 'teacher': self.teacher.id})
+
+    def test_expand_many_relation(self):
+        data = self.client.get('/api/quizzes/?expand=questions&fields=id,questions.correct_answer').json()['results']
+        self.assertEqual(data[0]['questions'], [{'correct_answer': 'A'}] * 4)
+        data = self.client.get('/api/classes/?fields=name,students').json()['results']
+        self.assertEqual(data[0]['students'], [student.id for student in self.students])
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class PaginationTestCase(QuizFixtureMixin, TestCase):
+
+    def setUp(self):
+        self.create_fixture(students=5, quizzes=3, questions=2)
+        self.client = self.client_for(self.teacher)
+
+    def collect_pages(self, url):
+        seen = []
+        while url:
+            with CaptureQueriesContext(connection) as context:
+                data = self.client.get(url).json()
+            self.assertFalse(any('COUNT(' in query['sql'] for query in context.captured_queries))
+            seen.extend(item['id'] for item in data['results'])
+            url = data['next']
+        return seen
+
+    def test_attempts_walk_every_row_once(self):
+        seen = self.collect_pages('/api/attempts/?page_size=4&fields=id')
+        self.assertEqual(seen, list(QuizAttempt.objects.order_by('attempt_datetime', 'id').values_list('id', flat=True)))
+
+    def test_quizzes_for_student_are_not_repeated(self):
+        second = Class.objects.create(name='Science', teacher=self.teacher, join_code='SCI01')
+        second.students.add(self.students[0])
+        self.quizzes[0].classes.add(second)
+        self.client = self.client_for(self.students[0])
+        seen = self.collect_pages('/api/quizzes/?page_size=2&fields=id')
+        self.assertEqual(seen, [quiz.id for quiz in self.quizzes])
+
+    def test_async_pages_match_drf(self):
+        # Shared timestamps make the cursor carry an offset past the rows already seen
+        attempts = list(QuizAttempt.objects.order_by('id'))
+        for index, attempt in enumerate(attempts):
+            attempt.attempt_datetime = attempts[index // 4 * 4].attempt_datetime
+        QuizAttempt.objects.bulk_update(attempts, ['attempt_datetime'])
+
+        def page(url, paginate):
+            paginator = AttemptCursorPagination()
+            rows = paginate(paginator, QuizAttempt.objects.all(), Request(APIRequestFactory().get(url)))
+            return [row.id for row in rows], paginator.get_next_link(), paginator.get_previous_link()
+
+        def walk(url, link):
+            seen = []
+            while url:
+                expected = page(url, CursorPagination.paginate_queryset)
+                self.assertEqual(page(url, async_to_sync(AttemptCursorPagination.apaginate_queryset)), expected)
+                seen.append(expected)
+                url = expected[link]
+            return seen
+
+        ids = [attempt.id for attempt in attempts]
+        forward = walk('/api/attempts/?page_size=3', 1)
+        self.assertEqual(sorted(sum((rows for rows, _, _ in forward), [])), ids)
+        backward = walk(forward[-1][2], 2)
+        self.assertEqual([rows for rows, _, _ in backward], [rows for rows, _, _ in reversed(forward[:-1])])
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class ExportTestCase(QuizFixtureMixin, TestCase):
+
+    def setUp(self):
+        self.create_fixture(students=3, quizzes=2, questions=2)
+        self.client = self.client_for(self.teacher)
+
+    def read(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content).decode()
+
+    def test_quiz_csv_with_flattened_results(self):
+        content = self.read(f'/api/quizzes/{self.quizzes[0].id}/export/?flatten=true')
+        rows = list(csv.DictReader(io.StringIO(content)))
+        self.assertEqual(len(rows), 3)
+        question_id = self.questions[0].id
+        self.assertEqual(rows[0]['username'], 'student0')
+        self.assertEqual(rows[0][f'q{question_id}_answer'], 'B')
+        self.assertEqual(rows[0][f'q{question_id}_points'], '0')
+
+    def test_class_ndjson(self):
+        content = self.read(f'/api/classes/{self.class_obj.id}/export/?output=ndjson')
+        rows = [json.loads(line) for line in content.splitlines()]
+        self.assertEqual(len(rows), 6)
+        self.assertEqual(len(rows[0]['results']), 2)
+
+    def test_students_cannot_export(self):
+        response = self.client_for(self.students[0]).get(f'/api/classes/{self.class_obj.id}/export/')
+        self.assertEqual(response.status_code, 403)
+
+    def test_unknown_output_is_rejected(self):
+        response = self.client.get(f'/api/quizzes/{self.quizzes[0].id}/export/?output=xml')
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class AnalyticsTestCase(QuizFixtureMixin, TestCase):
+
+    def setUp(self):
+        self.create_fixture(students=4, quizzes=1, questions=2)
+        self.quiz = self.quizzes[0]
+        QuizAttempt.objects.all().delete()
+        self.start_sessions()
+        first, second = (str(question.id) for question in self.questions)
+        submissions = [
+            {first: 'A', second: 'A'},
+            {first: 'A', second: 'B'},
+            {first: 'B', second: 'C'},
+            {first: '', second: 'B'},
+        ]
+        for student, answers in zip(self.students, submissions):
+            self.client_for(student).post(
+                f'/api/quizzes/{self.quiz.id}/take_quiz/', {'answers': answers}, format='json'
+            )
+
+    def get_analytics(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client_for(self.teacher).get(f'/api/quizzes/{self.quiz.id}/analytics/')
+        self.assertEqual(response.status_code, 200)
+        self.assertLessEqual(len(context), 4)
+        return response.json()
+
+    def test_incremental_statistics(self):
+        data = self.get_analytics()
+        self.assertEqual(data['attempts'], 4)
+        self.assertEqual(data['mean_score'], 37.5)
+        self.assertEqual(data['histogram'][0]['count'], 2)
+        self.assertEqual(data['histogram'][5]['count'], 1)
+        self.assertEqual(data['histogram'][9]['count'], 1)
+
+        first = data['questions'][0]
+        self.assertEqual(first['percent_correct'], 50)
+        self.assertAlmostEqual(first['discrimination'], 0.9045, places=3)
+        counts = {choice['option']: choice['count'] for choice in first['distribution']}
+        self.assertEqual(counts, {'A': 2, 'B': 1, 'C': 0, 'D': 0, 'blank': 1, 'other': 0})
+
+    def test_rebuild_matches_incremental(self):
+        incremental = self.get_analytics()
+        call_command('rebuild_analytics', quiz_ids=[self.quiz.id], stdout=io.StringIO())
+        rebuilt = self.get_analytics()
+        incremental.pop('updated_at')
+        rebuilt.pop('updated_at')
+        self.assertEqual(incremental, rebuilt)
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class LeaderboardTestCase(QuizFixtureMixin, TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.create_fixture(students=4, quizzes=2, questions=2)
+        QuizAttempt.objects.all().delete()
+        # Bulk deletes skip the signals; start from empty standings too
+        ClassStanding.objects.all().delete()
+        self.start_sessions()
+
+    def submit(self, student, quiz, correct):
+        answers = {
+            str(question.id): 'A' if index < correct else 'B'
+            for index, question in enumerate(self.questions)
+        }
+        self.client_for(student).post(f'/api/quizzes/{quiz.id}/take_quiz/', {'answers': answers}, format='json')
+
+    def test_quiz_leaderboard_follows_submissions(self):
+        url = f'/api/quizzes/{self.quizzes[0].id}/leaderboard/'
+        # Warm the cached board so later submissions update it in place
+        self.assertEqual(self.client_for(self.teacher).get(url).json()['participants'], 0)
+        for student, correct in zip(self.students, [1, 2, 0, 1]):
+            self.submit(student, self.quizzes[0], correct)
+
+        data = self.client_for(self.students[3]).get(url).json()
+        self.assertEqual(data['participants'], 4)
+        self.assertEqual(
+            [(entry['rank'], entry['student']['username']) for entry in data['entries']],
+            [(1, 'student1'), (2, 'student0'), (2, 'student3'), (4, 'student2')]
+        )
+        self.assertEqual(data['me'], {'rank': 2, 'total_points': 2})
+
+        cache.clear()
+        self.assertEqual(self.client_for(self.students[3]).get(url).json(), data)
+
+    def test_class_leaderboard_sums_quizzes(self):
+        url = f'/api/classes/{self.class_obj.id}/leaderboard/'
+        self.client_for(self.teacher).get(url)
+        self.submit(self.students[0], self.quizzes[0], 1)
+        self.submit(self.students[0], self.quizzes[1], 1)
+        self.submit(self.students[1], self.quizzes[0], 2)
+
+        data = self.client_for(self.students[0]).get(url).json()
+        self.assertEqual(
+            [(entry['rank'], entry['student']['username'], entry['total_points']) for entry in data['entries']],
+            [(1, 'student0', 4), (1, 'student1', 4)]
+        )
+        self.assertEqual(data['me'], {'rank': 1, 'total_points': 4})
+
+        call_command('rebuild_leaderboards', stdout=io.StringIO())
+        self.assertEqual(self.client_for(self.students[0]).get(url).json(), data)
+
+    def test_cached_boards_hold_only_the_top(self):
+        self.submit(self.students[0], self.quizzes[0], 1)
+        self.client_for(self.teacher).get(f'/api/quizzes/{self.quizzes[0].id}/leaderboard/')
+        board = cache.get(leaderboards.QUIZ_BOARD_KEY.format(self.quizzes[0].id))
+        self.assertEqual(set(board), {'participants', 'top'})
+
+        with patch.object(leaderboards, 'TOP_SIZE', 1):
+            cache.clear()
+            self.submit(self.students[1], self.quizzes[0], 2)
+            self.submit(self.students[2], self.quizzes[0], 2)
+            data = self.client_for(self.students[0]).get(f'/api/quizzes/{self.quizzes[0].id}/leaderboard/').json()
+        self.assertEqual(data['participants'], 3)
+        self.assertEqual([entry['student']['username'] for entry in data['entries']], ['student1'])
+        self.assertEqual(data['me'], {'rank': 3, 'total_points': 2})
+
+    def test_class_standings_follow_assignments_and_rosters(self):
+        for student in self.students[:2]:
+            self.submit(student, self.quizzes[0], 2)
+        url = f'/api/classes/{self.class_obj.id}/leaderboard/'
+        other = Class.objects.create(name='Other', teacher=self.teacher, join_code='OTHER1')
+        other_url = f'/api/classes/{other.id}/leaderboard/'
+        teacher = self.client_for(self.teacher)
+        self.assertEqual(teacher.get(other_url).json()['participants'], 0)
+
+        self.client_for(self.students[0]).post('/api/classes/join/', {'join_code': 'OTHER1'}, format='json')
+        self.quizzes[0].classes.add(other)
+        data = teacher.get(other_url).json()
+        self.assertEqual((data['participants'], data['entries'][0]['total_points']), (1, 4))
+
+        other.students.add(self.students[1])
+        self.assertEqual(teacher.get(other_url).json()['participants'], 2)
+        other.quizzes.remove(self.quizzes[0])
+        self.assertEqual(teacher.get(other_url).json()['participants'], 0)
+
+        response = teacher.patch(f'/api/classes/{self.class_obj.id}/', {'remove_student': self.students[0].id},
+                                 format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertNotIn('student0', [entry['student']['username'] for entry in teacher.get(url).json()['entries']])
+        self.assertEqual(teacher.get(url).json()['participants'], 1)
+        self.quizzes[0].delete()
+        self.assertEqual(teacher.get(url).json()['participants'], 0)
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class QuizResponseCacheTestCase(QuizFixtureMixin, TestCase):
+
+    def setUp(self):
+        cache.clear()
+        caches['responses'].clear()
+        self.create_fixture(students=2, quizzes=2, questions=2)
+        self.quiz = self.quizzes[0]
+        self.url = f'/api/quizzes/{self.quiz.id}/'
+
+    def test_warm_reads_skip_the_database(self):
+        for client in (APIClient(), self.client_for(self.students[0])):
+            first = client.get(self.url)
+            with CaptureQueriesContext(connection) as context:
+                second = client.get(self.url)
+            self.assertEqual(len(context), 0)
+            self.assertEqual(first.json(), second.json())
+
+        client = self.client_for(self.students[0])
+        client.get('/api/quizzes/')
+        with CaptureQueriesContext(connection) as context:
+            client.get('/api/quizzes/')
+        self.assertEqual(len(context), 0)
+
+    def test_question_change_invalidates_payload(self):
+        client = APIClient()
+        client.get(self.url)
+        question = self.questions[0]
+        question.question_text = 'Edited'
+        question.save()
+        data = client.get(self.url).json()
+        self.assertEqual(data['questions'][0]['question_text'], 'Edited')
+
+    def test_roster_change_invalidates_access(self):
+        outsider = CustomUser.objects.create_user(username='outsider', email='o@example.com', password='pass')
+        client = self.client_for(outsider)
+        self.assertEqual(client.get(self.url).status_code, 404)
+        self.assertEqual(client.get('/api/quizzes/').json()['results'], [])
+        self.class_obj.students.add(outsider)
+        self.assertEqual(client.get(self.url).status_code, 200)
+        self.assertEqual(len(client.get('/api/quizzes/').json()['results']), 2)
+
+    def test_only_embedded_teacher_fields_invalidate_payload(self):
+        client = APIClient()
+        client.get(self.url)
+        updated_at = Quiz.objects.get(pk=self.quiz.pk).updated_at
+        # A login rehashing the password, and a full save changing nothing shown
+        self.teacher.set_password('rehashed')
+        self.teacher.save(update_fields=['password'])
+        self.teacher.last_login = timezone.now()
+        self.teacher.save()
+        self.assertEqual(Quiz.objects.get(pk=self.quiz.pk).updated_at, updated_at)
+        with CaptureQueriesContext(connection) as context:
+            client.get(self.url)
+        self.assertEqual(len(context), 0)
+
+        self.teacher.first_name = 'Ada'
+        self.teacher.save()
+        self.assertEqual(client.get(self.url).json()['teacher']['first_name'], 'Ada')
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class ConditionalListTestCase(QuizFixtureMixin, TestCase):
+
+    def setUp(self):
+        cache.clear()
+        caches['responses'].clear()
+        self.create_fixture(students=2, quizzes=2, questions=2)
+        self.client = self.client_for(self.teacher)
+
+    def revalidate(self, url):
+        etag = self.client.get(url)['ETag']
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        return etag, response, context
+
+    def test_unchanged_lists_answer_not_modified(self):
+        for url in ('/api/classes/', '/api/quizzes/', '/api/attempts/'):
+            etag, response, context = self.revalidate(url)
+            self.assertEqual(response.status_code, 304, url)
+            self.assertEqual(response['ETag'], etag)
+            self.assertEqual(response.content, b'')
+            self.assertLessEqual(len(context), 1, url)
+
+    def test_edits_change_the_validator(self):
+        etag, _, _ = self.revalidate('/api/attempts/')
+        question = self.questions[0]
+        question.question_text = 'Edited'
+        question.save()
+        response = self.client.get('/api/attempts/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_removals_change_the_validator(self):
+        etag, _, _ = self.revalidate('/api/classes/')
+        Class.objects.create(name='Extra', teacher=self.teacher, join_code='EXTRA1').delete()
+        response = self.client.get('/api/classes/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+        client = self.client_for(self.students[0])
+        etag = client.get('/api/classes/')['ETag']
+        self.class_obj.students.remove(self.students[0])
+        response = client.get('/api/classes/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'], [])
+
+    def test_embedded_users_change_the_validator(self):
+        student = self.students[1]
+        client = self.client_for(self.students[0])
+        for url in ('/api/classes/?expand=students', '/api/attempts/?expand=student'):
+            viewer = client if url.startswith('/api/classes/') else self.client
+            first = viewer.get(url)
+            student.first_name = f'Renamed for {url}'
+            student.save()
+            response = viewer.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+            self.assertEqual(response.status_code, 200, url)
+            self.assertIn(f'Renamed for {url}', response.content.decode())
+
+    def test_if_modified_since_sees_removals(self):
+        response = self.client.get('/api/classes/')
+        # A removal in a later second than the list was fetched
+        with patch('api.caching.time.time_ns', return_value=time.time_ns() + 5 * 10 ** 9):
+            Class.objects.create(name='Extra', teacher=self.teacher, join_code='EXTRA1').delete()
+        response = self.client.get('/api/classes/', HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, 200)
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class TakeQuizTestCase(QuizFixtureMixin, TestCase):
+
+    def setUp(self):
+        self.create_fixture(students=2, quizzes=1, questions=3)
+        self.quiz = self.quizzes[0]
+        QuizAttempt.objects.all().delete()
+        self.start_sessions()
+
+    def test_grades_option_text_and_index(self):
+        answers = {
+            str(self.questions[0].id): 'A',
+            str(self.questions[1].id): '0',
+            str(self.questions[2].id): 'C',
+        }
+        response = self.client_for(self.students[0]).post(
+            f'/api/quizzes/{self.quiz.id}/take_quiz/', {'answers': answers}, format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['correct_questions'], 2)
+        self.assertEqual(data['total_points'], 4)
+        self.assertEqual(data['max_points'], 6)
+        self.assertEqual([result['user_answer'] for result in data['results']], ['A', 'A', 'C'])
+        self.assertEqual(QuizAttempt.objects.get(student=self.students[0]).total_points, 4)
+
+    def test_answer_key_follows_question_changes(self):
+        client = self.client_for(self.students[0])
+        question = self.questions[0]
+        question.correct_answer = '2'
+        question.save()
+        response = client.post(
+            f'/api/quizzes/{self.quiz.id}/take_quiz/',
+            {'answers': {str(question.id): 'C'}},
+            format='json'
+        )
+        self.assertEqual(response.json()['correct_questions'], 1)
+
+    def submit(self, client, answers, **headers):
+        return client.post(
+            f'/api/quizzes/{self.quiz.id}/take_quiz/', {'answers': answers}, format='json', headers=headers
+        )
+
+    def test_idempotent_retry_replays_the_result(self):
+        cache.clear()
+        client = self.client_for(self.students[0])
+        first = self.submit(client, {str(self.questions[0].id): 'A'}, **{'Idempotency-Key': 'abc'})
+        with CaptureQueriesContext(connection) as context:
+            retry = self.submit(client, {str(self.questions[0].id): 'A'}, **{'Idempotency-Key': 'abc'})
+        self.assertEqual(retry.status_code, 200)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(retry.json(), first.json())
+        # Only the quiz lookup; nothing is graded or written
+        self.assertEqual(len(context), 1)
+        self.assertEqual(self.submit(client, {}).status_code, 400)
+        self.assertEqual(QuizAttempt.objects.filter(student=self.students[0]).count(), 1)
+
+    def test_retry_is_replayed_after_a_cache_miss(self):
+        cache.clear()
+        client = self.client_for(self.students[0])
+        first = self.submit(client, {str(self.questions[0].id): 'A'}, **{'Idempotency-Key': 'abc'})
+        # As if the retry reached another worker, or the entry was evicted
+        cache.clear()
+        retry = self.submit(client, {str(self.questions[0].id): 'A'}, **{'Idempotency-Key': 'abc'})
+        self.assertEqual(retry.status_code, 200)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(retry.json(), first.json())
+        self.assertEqual(self.submit(client, {}, **{'Idempotency-Key': 'other'}).status_code, 400)
+
+        with self.settings(ASYNC_SUBMISSIONS=True):
+            client = self.client_for(self.students[1])
+            first = self.submit(client, {}, **{'Idempotency-Key': 'abc'})
+            self.assertEqual(first.status_code, 202)
+            cache.clear()
+            retry = self.submit(client, {}, **{'Idempotency-Key': 'abc'})
+            self.assertEqual(retry.status_code, 202)
+            self.assertEqual(retry['Idempotent-Replayed'], 'true')
+            self.assertEqual(retry.json()['id'], first.json()['id'])
+
+    def test_racing_submit_does_not_duplicate(self):
+        QuizAttempt.objects.create(
+            student=self.students[0], quiz=self.quiz, total_questions=3, total_points=6, idempotency_key='retry-key'
+        )
+        self.assertEqual(submit_attempt(self.quiz, self.students[0], {}), (None, False))
+        result, created = submit_attempt(self.quiz, self.students[0], {}, 'retry-key')
+        self.assertFalse(created)
+        self.assertEqual(result['total_points'], 6)
+        self.assertEqual(QuizAttempt.objects.filter(student=self.students[0]).count(), 1)
+
+    def test_racing_submit_with_another_key_is_not_a_replay(self):
+        attempt = QuizAttempt.objects.create(
+            student=self.students[0], quiz=self.quiz, total_questions=3, total_points=6, idempotency_key='first'
+        )
+        self.assertEqual(submit_attempt(self.quiz, self.students[0], {}, 'second'), (None, False))
+        self.assertEqual(enqueue_attempt(self.quiz, self.students[0], {}, 'second'), (None, False))
+        self.assertEqual(enqueue_attempt(self.quiz, self.students[0], {}, 'first'), (attempt.id, False))
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class GradingTestCase(QuizFixtureMixin, TestCase):
+
+    def setUp(self):
+        self.create_fixture(students=1, quizzes=1, questions=1)
+        self.quiz = self.quizzes[0]
+        self.quiz.questions.add(
+            QuestionBank.objects.create(
+                teacher=self.teacher, question_text='True?', question_type='TF', correct_answer='True', points=1
+            ),
+            QuestionBank.objects.create(
+                teacher=self.teacher, question_text='Capital?', question_type='ID', correct_answer='Manila', points=3
+            ),
+        )
+        self.mc, self.tf, self.identification = (str(question.id) for question in self.quiz.questions.order_by('id'))
+
+    def test_batch_matches_single_grading(self):
+        submissions = [
+            {self.mc: '0', self.tf: 'yes', self.identification: ' manila '},
+            {self.mc: 'A', self.tf: 'f'},
+            {},
+            {'999999': 'A', self.identification: 'Cebu'},
+        ]
+        batch = grade_submissions(self.quiz, submissions)
+        self.assertEqual(batch, [grade_submission(self.quiz, answers) for answers in submissions])
+
+        self.assertEqual([graded['total_points'] for graded in batch], [6, 2, 0, 0])
+        self.assertEqual([graded['correct_questions'] for graded in batch], [3, 1, 0, 0])
+        self.assertEqual({graded['total_questions'] for graded in batch}, {3})
+        self.assertEqual(batch[0]['score'], 100)
+        blank = batch[2]['results']
+        self.assertEqual([result['question_id'] for result in blank], [int(self.mc), int(self.tf), int(self.identification)])
+        self.assertEqual([result['user_answer'] for result in blank], ['', '', ''])
+        self.assertEqual(batch[1]['results'][0]['user_answer'], 'A')
+        self.assertEqual(batch[1]['results'][0]['normalized_answer'], '0')
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class RegradeTestCase(QuizFixtureMixin, TestCase):
+
+    def setUp(self):
+        self.create_fixture(students=2, quizzes=1, questions=1)
+        self.quiz = self.quizzes[0]
+        self.question = self.questions[0]
+        QuizAttempt.objects.all().delete()
+
+    def test_regrade_survives_edited_option_text(self):
+        key = str(self.question.id)
+        submit_attempt(self.quiz, self.students[0], {key: 'A'})
+        submit_attempt(self.quiz, self.students[1], {key: 'B'})
+
+        # The key was wrong, and the options get clearer wording while it is fixed
+        self.question.correct_answer = '1'
+        self.question.option_a, self.question.option_b = 'Apple', 'Banana'
+        self.question.save()
+        regrade_attempts(quiz_ids=[self.quiz.id])
+
+        attempts = {attempt.student_id: attempt for attempt in QuizAttempt.objects.all()}
+        self.assertEqual(attempts[self.students[0].id].total_points, 0)
+        self.assertEqual(attempts[self.students[1].id].total_points, 2)
+        self.assertEqual(attempts[self.students[1].id].results[0]['user_answer'], 'Banana')
+
+    def test_legacy_results_regrade_from_displayed_answers(self):
+        QuizAttempt.objects.create(
+            student=self.students[0], quiz=self.quiz, total_questions=1,
+            results=[{'question_id': self.question.id, 'correct': False, 'user_answer': 'B'}]
+        )
+        self.question.correct_answer = '1'
+        self.question.save()
+        regrade_attempts(quiz_ids=[self.quiz.id])
+        attempt = QuizAttempt.objects.get()
+        self.assertEqual(attempt.total_points, 2)
+        self.assertEqual(attempt.results[0]['normalized_answer'], '1')
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class QuestionImportTestCase(QuizFixtureMixin, TestCase):
+
+    def setUp(self):
+        self.create_fixture(students=1, quizzes=1, questions=1)
+        self.client = self.client_for(self.teacher)
+
+    def test_csv_reports_bad_rows_and_clamps_points(self):
+        body = (
+            'question_text,question_type,correct_answer,option_a,option_b,option_c,option_d,points\n'
+            'Pick A,MC,0,A,B,,,3\n'
+            'Broken,XX,0,,,,,1\n'
+            'Sky is blue,TF,true,,,,,-4\n'
+        )
+        response = self.client.post('/api/questions/bulk/', body, content_type='text/csv')
+        self.assertEqual(response.status_code, 201, response.content)
+        data = response.json()
+        self.assertEqual(data['created'], 2)
+        self.assertEqual([error['row'] for error in data['errors']], [2])
+        self.assertIn('question_type', data['errors'][0]['errors'])
+        created = QuestionBank.objects.filter(id__in=data['question_ids']).order_by('id')
+        self.assertEqual([question.points for question in created], [3, 1])
+        self.assertIsNone(created[0].option_c)
+
+    def test_json_rows_are_added_to_quiz_in_one_insert(self):
+        quiz = self.quizzes[0]
+        rows = [
+            {'question_text': f'Imported {i}', 'question_type': 'ID', 'correct_answer': 'x', 'points': 2}
+            for i in range(1000)
+        ]
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.post(
+                '/api/questions/bulk/', {'quiz': quiz.id, 'questions': rows}, format='json'
+            )
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(response.json()['created'], 1000)
+        self.assertEqual(quiz.questions.count(), 1001)
+        self.assertLess(len(context), 20)
+
+    def test_rejects_other_teachers_quiz(self):
+        other = CustomUser.objects.create_user(
+            username='other', email='other@example.com', password='pass', is_teacher=True
+        )
+        rows = [{'question_text': 'Q', 'question_type': 'ID', 'correct_answer': 'x'}]
+        response = self.client_for(other).post(
+            f'/api/questions/bulk/?quiz={self.quizzes[0].id}', rows, format='json'
+        )
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(QuestionBank.objects.filter(teacher=other).exists())
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class RosterTestCase(QuizFixtureMixin, TestCase):
+
+    def setUp(self):
+        self.create_fixture(students=2, quizzes=1, questions=1)
+        self.client = self.client_for(self.teacher)
+        self.newcomers = [
+            CustomUser.objects.create_user(username=f'new{i}', email=f'new{i}@example.com', password='pass')
+            for i in range(3)
+        ]
+        self.url = f'/api/classes/{self.class_obj.id}/'
+
+    def test_add_by_id_username_and_email(self):
+        identifiers = [self.newcomers[0].id, 'new1', 'new2@example.com', 'student0', 'nobody', 'teacher']
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.post(self.url + 'add_students/', {'students': identifiers}, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        data = response.json()
+        self.assertEqual(data['added'], [student.id for student in self.newcomers])
+        self.assertEqual(data['already_enrolled'], [self.students[0].id])
+        self.assertEqual(data['not_found'], ['nobody', 'teacher'])
+        self.assertEqual(self.class_obj.students.count(), 5)
+        # Neither the roster nor the teacher is loaded to check membership
+        self.assertFalse(any('"api_customuser"."password"' in query['sql'] for query in context.captured_queries))
+
+    def test_remove_many(self):
+        response = self.client.post(
+            self.url + 'remove_students/', {'students': ['student0', self.newcomers[0].id]}, format='json'
+        )
+        data = response.json()
+        self.assertEqual(data['removed'], [self.students[0].id])
+        self.assertEqual(data['not_enrolled'], [self.newcomers[0].id])
+        self.assertEqual(list(self.class_obj.students.all()), [self.students[1]])
+
+    def test_strings_are_usernames_and_emails(self):
+        numeric = CustomUser.objects.create_user(username='20231234', email='id@example.com', password='pass')
+        response = self.client.post(
+            self.url + 'add_students/',
+            {'students': ['20231234', str(self.newcomers[0].id), self.newcomers[1].id]},
+            format='json'
+        )
+        data = response.json()
+        self.assertEqual(data['added'], [numeric.id, self.newcomers[1].id])
+        self.assertEqual(data['not_found'], [str(self.newcomers[0].id)])
+
+    def test_roster_changes_reach_students(self):
+        client = self.client_for(self.newcomers[0])
+        self.assertEqual(client.get('/api/quizzes/').json()['results'], [])
+        self.client.post(self.url + 'add_students/', {'students': ['new0']}, format='json')
+        self.assertEqual(len(client.get('/api/quizzes/').json()['results']), 1)
+
+    def test_only_the_teacher_changes_the_roster(self):
+        response = self.client_for(self.students[0]).post(
+            self.url + 'add_students/', {'students': ['new0']}, format='json'
+        )
+        self.assertEqual(response.status_code, 403)
+        other = CustomUser.objects.create_user(
+            username='other', email='other@example.com', password='pass', is_teacher=True
+        )
+        other_class = Class.objects.create(name='Other', teacher=other, join_code='OTHER1')
+        response = self.client.post(
+            f'/api/classes/{other_class.id}/add_students/', {'students': ['new0']}, format='json'
+        )
+        self.assertEqual(response.status_code, 404)
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class JoinClassTestCase(QuizFixtureMixin, TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.create_fixture(students=2, quizzes=1, questions=1)
+        self.newcomer = CustomUser.objects.create_user(username='new', email='new@example.com', password='pass')
+        self.client = self.client_for(self.newcomer)
+
+    def join(self, join_code):
+        return self.client.post('/api/classes/join/', {'join_code': join_code}, format='json')
+
+    def test_join_once_without_loading_the_roster(self):
+        self.assertEqual(self.join('NOPE').status_code, 404)
+        self.join('MATH01')
+        self.client = self.client_for(self.students[0])
+        with CaptureQueriesContext(connection) as context:
+            response = self.join('MATH01')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(any('"api_customuser"' in query['sql'] for query in context.captured_queries))
+        self.assertTrue(self.class_obj.students.filter(id=self.newcomer.id).exists())
+
+    def test_join_reaches_quiz_list(self):
+        self.assertEqual(self.client.get('/api/quizzes/').json()['results'], [])
+        self.assertEqual(self.join('MATH01').status_code, 200)
+        self.assertEqual(len(self.client.get('/api/quizzes/').json()['results']), 1)
+
+    def test_join_writes_only_the_roster(self):
+        self.client_for(self.students[0]).get('/api/quizzes/')
+        teacher_etag = self.client_for(self.teacher).get('/api/classes/')['ETag']
+        list_version = get_quiz_list_version()
+        updated_at = Class.objects.get(pk=self.class_obj.pk).updated_at
+        class_id_for_join_code('MATH01')
+
+        with CaptureQueriesContext(connection) as context:
+            self.assertEqual(self.join('MATH01').status_code, 200)
+        statements = [query['sql'].split()[0] for query in context.captured_queries]
+        self.assertEqual([verb for verb in statements if verb not in ('SAVEPOINT', 'RELEASE')], ['INSERT', 'SELECT'])
+
+        self.assertEqual(Class.objects.get(pk=self.class_obj.pk).updated_at, updated_at)
+        self.assertEqual(get_quiz_list_version(), list_version)
+        self.assertFalse(ClassStanding.objects.filter(student=self.newcomer).exists())
+        self.assertNotEqual(self.client_for(self.teacher).get('/api/classes/')['ETag'], teacher_etag)
+        self.assertEqual(len(self.client.get('/api/classes/').json()['results']), 1)
+
+    def test_join_counts_points_from_shared_quizzes(self):
+        science = Class.objects.create(name='Science', teacher=self.teacher, join_code='SCI01')
+        self.quizzes[0].classes.add(science)
+        science.students.add(self.students[0])
+        QuizAttempt.objects.filter(student=self.students[0]).update(total_points=2)
+        leaderboards.rebuild_class_standings(self.class_obj.pk)
+        self.class_obj.students.remove(self.students[0])
+        self.assertFalse(ClassStanding.objects.filter(class_obj=self.class_obj, student=self.students[0]).exists())
+
+        self.client = self.client_for(self.students[0])
+        self.assertEqual(self.join('MATH01').status_code, 200)
+        standing = ClassStanding.objects.get(class_obj=self.class_obj, student=self.students[0])
+        self.assertEqual(standing.total_points, 2)
+
+    def test_join_codes_are_generated(self):
+        response = self.client_for(self.teacher).post(
+            '/api/classes/', {'name': 'Physics', 'join_code': 'MINE'}, format='json'
+        )
+        self.assertEqual(response.status_code, 201, response.content)
+        join_code = response.json()['join_code']
+        self.assertNotEqual(join_code, 'MINE')
+        self.assertEqual(len(join_code), 8)
+        self.assertEqual(self.join(join_code).status_code, 200)
+
+    def test_changed_code_stops_resolving(self):
+        self.assertEqual(self.join('MATH01').status_code, 200)
+        self.class_obj.join_code = 'MATH02'
+        self.class_obj.save()
+        self.client = self.client_for(self.students[0])
+        self.assertEqual(self.join('MATH01').status_code, 404)
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS, QUIZ_SESSION_GRACE_SECONDS=0, QUIZ_SESSION_WRITE_BEHIND=True)
+class QuizSessionTestCase(QuizFixtureMixin, TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.create_fixture(students=1, quizzes=1, questions=3)
+        self.quiz = self.quizzes[0]
+        QuizAttempt.objects.all().delete()
+        self.client = self.client_for(self.students[0])
+        self.url = f'/api/quizzes/{self.quiz.id}/'
+
+    def save(self, answers):
+        return self.client.post(self.url + 'save_answers/', {'answers': answers}, format='json')
+
+    def test_autosave_is_buffered_and_graded_on_submit(self):
+        self.assertEqual(self.save({}).status_code, 400)
+        started = self.client.post(self.url + 'start_attempt/').json()
+        self.assertLessEqual(started['remaining_seconds'], 30 * 60)
+
+        first, second = (str(question.id) for question in self.questions[:2])
+        self.save({first: 'A'})
+        with CaptureQueriesContext(connection) as context:
+            response = self.save({second: 'A'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(context), 0)
+        self.assertEqual(QuizSession.objects.get().answers, {})
+
+        # Resuming returns the buffered answers
+        resumed = self.client.post(self.url + 'start_attempt/').json()
+        self.assertEqual(resumed['answers'], {first: 'A', second: 'A'})
+
+        data = self.client.post(self.url + 'take_quiz/', {'answers': {}}, format='json').json()
+        self.assertEqual(data['correct_questions'], 2)
+        session = QuizSession.objects.get()
+        self.assertIsNotNone(session.submitted_at)
+        self.assertEqual(session.answers, {first: 'A', second: 'A'})
+
+    def test_flush_writes_pending_answers_in_one_batch(self):
+        self.client.post(self.url + 'start_attempt/')
+        self.save({str(self.questions[0].id): 'B'})
+        call_command('flush_quiz_sessions', stdout=io.StringIO())
+        self.assertEqual(QuizSession.objects.get().answers, {str(self.questions[0].id): 'B'})
+
+    def test_time_limit_is_enforced(self):
+        self.client.post(self.url + 'start_attempt/')
+        first = str(self.questions[0].id)
+        self.save({first: 'A'})
+        call_command('flush_quiz_sessions', stdout=io.StringIO())
+        QuizSession.objects.update(deadline=timezone.now() - timedelta(minutes=1))
+        cache.clear()
+
+        self.assertEqual(self.save({first: 'B'}).status_code, 400)
+        answers = {str(question.id): 'A' for question in self.questions}
+        data = self.client.post(self.url + 'take_quiz/', {'answers': answers}, format='json').json()
+        # Only the answer saved before the deadline counts
+        self.assertEqual(data['correct_questions'], 1)
+
+    @override_settings(QUIZ_SESSION_REQUIRED=True)
+    def test_timed_quizzes_can_require_a_session(self):
+        response = self.client.post(self.url + 'take_quiz/', {'answers': {}}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'error': 'Start the quiz before submitting'})
+        self.assertFalse(QuizAttempt.objects.exists())
+
+    def test_submitting_without_a_session_is_graded(self):
+        response = self.client.post(self.url + 'take_quiz/', {'answers': {}}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(QuizAttempt.objects.get().student, self.students[0])
+
+    @override_settings(QUIZ_SESSION_WRITE_BEHIND=False)
+    def test_saves_write_through_without_a_shared_cache(self):
+        self.client.post(self.url + 'start_attempt/')
+        first, second = (str(question.id) for question in self.questions[:2])
+        self.save({first: 'A'})
+        # As if the next save reached another worker
+        cache.clear()
+        self.save({second: 'B'})
+        self.assertEqual(QuizSession.objects.get().answers, {first: 'A', second: 'B'})
+        output = io.StringIO()
+        call_command('flush_quiz_sessions', stdout=output)
+        self.assertIn('Flushed 0', output.getvalue())
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS, ASYNC_SUBMISSIONS=True)
+class SubmissionQueueTestCase(QuizFixtureMixin, TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.create_fixture(students=3, quizzes=1, questions=2)
+        self.quiz = self.quizzes[0]
+        QuizAttempt.objects.all().delete()
+        self.start_sessions()
+
+    def submit(self, student, answer):
+        answers = {str(question.id): answer for question in self.questions}
+        return self.client_for(student).post(
+            f'/api/quizzes/{self.quiz.id}/take_quiz/', {'answers': answers}, format='json'
+        )
+
+    def test_queued_submissions_are_graded_by_the_worker(self):
+        responses = [self.submit(student, answer) for student, answer in zip(self.students, 'ABA')]
+        self.assertEqual([response.status_code for response in responses], [202] * 3)
+        attempt_id = responses[0].json()['id']
+        self.assertEqual(responses[0].json()['status'], 'pending')
+        self.assertEqual(self.submit(self.students[0], 'A').status_code, 400)
+
+        client = self.client_for(self.students[0])
+        self.assertEqual(client.get(f'/api/attempts/{attempt_id}/status/').status_code, 202)
+        self.assertEqual(self.client_for(self.teacher).get(f'/api/quizzes/{self.quiz.id}/leaderboard/').json()['participants'], 0)
+
+        call_command('process_submissions', once=True, workers=1, stdout=io.StringIO())
+
+        data = client.get(f'/api/attempts/{attempt_id}/status/').json()
+        self.assertEqual(data['status'], 'graded')
+        self.assertEqual(data['total_points'], 4)
+        self.assertIsNone(QuizAttempt.objects.get(id=attempt_id).answers)
+        self.assertEqual(self.quiz.statistics.attempt_count, 3)
+        board = self.client_for(self.teacher).get(f'/api/quizzes/{self.quiz.id}/leaderboard/').json()
+        self.assertEqual([entry['total_points'] for entry in board['entries']], [4, 4, 0])
+
+    def test_overlapping_workers_grade_each_submission_once(self):
+        for student, answer in zip(self.students, 'ABA'):
+            self.submit(student, answer)
+        get_answer_key = submission_queue.get_answer_key
+        overlapped = []
+
+        def answer_key_with_overlap(quiz):
+            # While the first worker grades, its claim times out and a second worker takes the batch
+            if not overlapped:
+                overlapped.append(True)
+                with self.settings(SUBMISSION_CLAIM_TIMEOUT=0):
+                    overlapped.append(submission_queue.grade_pending())
+            return get_answer_key(quiz)
+
+        with patch.object(submission_queue, 'get_answer_key', answer_key_with_overlap):
+            self.assertEqual(submission_queue.grade_pending(), 0)
+        self.assertEqual(overlapped, [True, 3])
+        self.assertEqual(self.quiz.statistics.attempt_count, 3)
+        self.assertEqual(
+            sorted(ClassStanding.objects.filter(class_obj=self.class_obj).values_list('total_points', flat=True)),
+            [0, 4, 4]
+        )
+        self.assertEqual(submission_queue.grade_pending(), 0)
+
+    def test_status_is_private(self):
+        attempt_id = self.submit(self.students[0], 'A').json()['id']
+        response = self.client_for(self.students[1]).get(f'/api/attempts/{attempt_id}/status/')
+        self.assertEqual(response.status_code, 404)
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class AsyncReadTestCase(QuizFixtureMixin, TestCase):
+
+    def setUp(self):
+        cache.clear()
+        caches['responses'].clear()
+        self.create_fixture(students=3, quizzes=2, questions=2)
+
+    def token_client(self, user):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(user).access_token}')
+        return client
+
+    def assertSamePayload(self, client, sync_url, async_url):
+        expected = client.get(sync_url)
+        actual = client.get(async_url)
+        self.assertEqual(actual.status_code, expected.status_code)
+        self.assertEqual(actual.json(), expected.json())
+        return actual
+
+    def test_payloads_match_the_sync_endpoints(self):
+        for user in (self.teacher, self.students[0]):
+            client = self.token_client(user)
+            self.assertSamePayload(client, '/api/users/profile/', '/api/async/users/profile/')
+            self.assertSamePayload(client, '/api/classes/', '/api/async/classes/')
+            self.assertSamePayload(client, '/api/attempts/?fields=id,score,quiz.title', '/api/async/attempts/?fields=id,score,quiz.title')
+            quiz_id = self.quizzes[0].id
+            self.assertSamePayload(client, f'/api/quizzes/{quiz_id}/', f'/api/async/quizzes/{quiz_id}/')
+
+    def test_cursor_pages_walk_every_row(self):
+        client = self.token_client(self.teacher)
+        url, seen = '/api/async/attempts/?page_size=4&fields=id', []
+        while url:
+            data = client.get(url).json()
+            seen.extend(item['id'] for item in data['results'])
+            url = data['next']
+        self.assertEqual(seen, list(QuizAttempt.objects.order_by('attempt_datetime', 'id').values_list('id', flat=True)))
+
+    def test_authentication_and_access(self):
+        self.assertEqual(APIClient().get('/api/async/classes/').status_code, 401)
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION='Bearer not-a-token')
+        self.assertEqual(client.get('/api/async/classes/').status_code, 401)
+        self.assertEqual(APIClient().get(f'/api/async/quizzes/{self.quizzes[0].id}/').status_code, 200)
+        outsider = CustomUser.objects.create_user(username='outsider', email='o@example.com', password='pass')
+        response = self.token_client(outsider).get(f'/api/async/quizzes/{self.quizzes[0].id}/')
+        self.assertEqual(response.status_code, 404)
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class QueryPlanTestCase(QuizFixtureMixin, TestCase):
+    """
+    The hot viewset queries must be answered through indexes, never a full table scan
+    """
+
+    def setUp(self):
+        cache.clear()
+        caches['responses'].clear()
+        self.create_fixture(students=3, quizzes=2, questions=2)
+
+    def query_plan(self, sql, params=()):
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            return [row[-1] for row in cursor.fetchall()]
+
+    def query_plans(self, user, urls):
+        client = self.client_for(user)
+        with CaptureQueriesContext(connection) as context:
+            for url in urls:
+                self.assertEqual(client.get(url).status_code, 200, url)
+        return [
+            (query['sql'], self.query_plan(query['sql']))
+            for query in context.captured_queries if query['sql'].startswith('SELECT')
+        ]
+
+    def assertUsesIndexes(self, sql, plan):
+        # SCAN is a full pass over a table or index; SEARCH seeks through an index
+        scans = [step for step in plan if step.startswith('SCAN')]
+        self.assertEqual(scans, [], sql)
+
+    def test_list_queries_use_indexes(self):
+        quiz_id = self.quizzes[0].id
+        urls = {
+            self.teacher: ['/api/attempts/', f'/api/attempts/?quiz={quiz_id}', '/api/quizzes/',
+                           '/api/classes/', '/api/questions/', '/api/questions/?type=MC'],
+            self.students[0]: ['/api/attempts/', f'/api/attempts/?quiz={quiz_id}', '/api/quizzes/',
+                               '/api/classes/'],
+        }
+        plans = []
+        for user, user_urls in urls.items():
+            plans.extend(self.query_plans(user, user_urls))
+        for sql, plan in plans:
+            self.assertUsesIndexes(sql, plan)
+
+        steps = {step for _, plan in plans for step in plan}
+        for index in ('attempt_student_time_idx', 'attempt_quiz_time_idx', 'question_teacher_type_idx'):
+            self.assertTrue(any(index in step for step in steps), index)
+
+    def test_leaderboard_queries_use_indexes(self):
+        urls = [f'/api/quizzes/{self.quizzes[0].id}/leaderboard/', f'/api/classes/{self.class_obj.id}/leaderboard/']
+        plans = self.query_plans(self.students[0], urls)
+        for sql, plan in plans:
+            self.assertUsesIndexes(sql, plan)
+        steps = {step for _, plan in plans for step in plan}
+        for index in ('attempt_quiz_points_idx', 'standing_class_points_idx'):
+            self.assertTrue(any(index in step for step in steps), (index, steps))
+
+    def test_duplicate_attempt_check_uses_the_unique_index(self):
+        queryset = QuizAttempt.objects.filter(quiz=self.quizzes[0], student=self.students[0])
+        sql, params = queryset.query.sql_with_params()
+        plan = self.query_plan(sql, params)
+        self.assertUsesIndexes(sql, plan)
+        self.assertTrue(any('quiz_id=? AND student_id=?' in step for step in plan), plan)
+
+
+class DuplicateAttemptMigrationTestCase(TransactionTestCase):
+    before = [('api', '0007_updated_at')]
+    after = [('api', '0008_attempt_quiz_student_unique')]
+
+    def setUp(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.before)
+        apps = executor.loader.project_state(self.before).apps
+        CustomUser = apps.get_model('api', 'CustomUser')
+        Quiz = apps.get_model('api', 'Quiz')
+        QuizAttempt = apps.get_model('api', 'QuizAttempt')
+
+        teacher = CustomUser.objects.create(username='teacher', email='teacher@example.com', is_teacher=True)
+        student = CustomUser.objects.create(username='student', email='student@example.com')
+        now = timezone.now()
+        quiz = Quiz.objects.create(
+            teacher=teacher, title='Quiz', start_datetime=now, end_datetime=now + timedelta(days=1)
+        )
+        for score in (100, 0):
+            QuizAttempt.objects.create(quiz=quiz, student=student, score=score, total_questions=1)
+        self.quiz_id = quiz.id
+
+    def tearDown(self):
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM api_quizattempt')
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def migrate(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.after)
+        return executor.loader.project_state(self.after).apps
+
+    def test_duplicates_stop_the_migration(self):
+        with self.assertRaisesMessage(RuntimeError, '1 quiz attempts repeat an earlier attempt'):
+            self.migrate()
+
+    @override_settings(REMOVE_DUPLICATE_ATTEMPTS=True)
+    def test_removal_keeps_the_first_attempt(self):
+        with self.assertLogs('api.migrations', 'WARNING') as logs:
+            apps = self.migrate()
+        self.assertIn('Removed 1 duplicate attempts', logs.output[0])
+        attempts = apps.get_model('api', 'QuizAttempt').objects.filter(quiz_id=self.quiz_id)
+        self.assertEqual(list(attempts.values_list('score', flat=True)), [100])
+
+
+class RecordingReplicaRouter(ReplicaRouter):
+    """
+    ReplicaRouter noting the models it sends to the replica
+    """
+    replica_reads = []
+
+    def db_for_read(self, model, **hints):
+        alias = super().db_for_read(model, **hints)
+        if alias is not None:
+            self.replica_reads.append(model)
+        return alias
+
+
+# The "replica" is the test database itself, so only the routing is observed
+@override_settings(
+    PASSWORD_HASHERS=FAST_HASHERS,
+    DATABASE_REPLICA='default',
+    DATABASE_ROUTERS=['api.tests.RecordingReplicaRouter'],
+)
+class ReplicaRoutingTestCase(QuizFixtureMixin, TestCase):
+
+    def setUp(self):
+        cache.clear()
+        caches['responses'].clear()
+        self.create_fixture(students=2, quizzes=2, questions=2)
+        RecordingReplicaRouter.replica_reads.clear()
+
+    def replica_reads(self, client, method, url, **kwargs):
+        RecordingReplicaRouter.replica_reads.clear()
+        response = getattr(client, method)(url, **kwargs)
+        self.assertLess(response.status_code, 400)
+        if response.streaming:
+            b''.join(response.streaming_content)
+        return set(RecordingReplicaRouter.replica_reads)
+
+    def test_safe_requests_read_the_replica(self):
+        client = self.client_for(self.teacher)
+        self.assertIn(QuizAttempt, self.replica_reads(client, 'get', '/api/attempts/'))
+        self.assertIn(Class, self.replica_reads(client, 'get', '/api/classes/'))
+        # Export rows are read while streaming, after the view returned
+        export = self.replica_reads(client, 'get', f'/api/quizzes/{self.quizzes[0].id}/export/')
+        self.assertIn(QuizAttempt, export)
+
+    def test_cached_and_follow_up_actions_read_the_primary(self):
+        client = self.client_for(self.teacher)
+        self.assertEqual(self.replica_reads(client, 'get', '/api/quizzes/'), set())
+        self.assertEqual(self.replica_reads(client, 'get', f'/api/quizzes/{self.quizzes[0].id}/'), set())
+        attempt = QuizAttempt.objects.filter(student=self.students[0]).first()
+        student_client = self.client_for(self.students[0])
+        self.assertEqual(self.replica_reads(student_client, 'get', f'/api/attempts/{attempt.id}/status/'), set())
+
+    def test_writers_stick_to_the_primary(self):
+        client = self.client_for(self.students[0])
+        self.assertEqual(
+            self.replica_reads(client, 'put', '/api/users/update_profile/', data={'first_name': 'Ann'}), set()
+        )
+        self.assertEqual(self.replica_reads(client, 'get', '/api/classes/'), set())
+        # Other users are unaffected
+        self.assertIn(Class, self.replica_reads(self.client_for(self.students[1]), 'get', '/api/classes/'))
+
+        cache.clear()
+        self.assertIn(Class, self.replica_reads(client, 'get', '/api/classes/'))
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS, CACHE_AUTHENTICATED_USERS=True)
+class CachedAuthenticationTestCase(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        caches['users'].clear()
+        self.user = CustomUser.objects.create_user(username='poller', email='poller@example.com', password='pass')
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.user).access_token}')
+
+    def test_repeat_requests_skip_the_user_query(self):
+        self.assertEqual(self.client.get('/api/users/profile/').status_code, 200)
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get('/api/users/profile/')
+        self.assertEqual(response.json()['username'], 'poller')
+        self.assertEqual(len(context), 0)
+
+    def test_changes_take_effect_on_the_next_request(self):
+        self.client.get('/api/users/profile/')
+        response = self.client.put('/api/users/update_profile/', {'first_name': 'Polly'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.get('/api/users/profile/').json()['first_name'], 'Polly')
+
+        response = self.client.post(
+            '/api/users/change_password/', {'old_password': 'pass', 'new_password': 'a-Much-longer-pass-42'},
+            format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.check_password('a-Much-longer-pass-42'))
+        self.assertEqual(self.user.first_name, 'Polly')
+
+    def test_deactivated_and_deleted_users_are_rejected(self):
+        self.assertEqual(self.client.get('/api/users/profile/').status_code, 200)
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get('/api/users/profile/').status_code, 401)
+        self.assertEqual(self.client.get('/api/async/users/profile/').status_code, 401)
+
+        self.user.is_active = True
+        self.user.save()
+        self.assertEqual(self.client.get('/api/async/users/profile/').status_code, 200)
+        self.assertEqual(self.client.delete('/api/users/delete_account/').status_code, 204)
+        self.assertEqual(self.client.get('/api/users/profile/').status_code, 401)
+        self.assertEqual(self.client.get('/api/async/users/profile/').status_code, 401)
+
+    def test_unshared_cache_reads_the_user_every_time(self):
+        with self.settings(CACHE_AUTHENTICATED_USERS=False):
+            self.assertEqual(self.client.get('/api/users/profile/').status_code, 200)
+            # As if another worker deactivated the user; this worker's cache never hears of it
+            with patch('api.signals.bump_user_version'):
+                self.user.is_active = False
+                self.user.save()
+            self.assertEqual(self.client.get('/api/users/profile/').status_code, 401)
+            self.assertEqual(self.client.get('/api/async/users/profile/').status_code, 401)
+
+
+class CountingHasher(MD5PasswordHasher):
+    verified = 0
+
+    def verify(self, password, encoded):
+        CountingHasher.verified += 1
+        return super().verify(password, encoded)
+
+
+@override_settings(PASSWORD_HASHERS=['api.tests.CountingHasher'])
+class LoginTestCase(TestCase):
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(username='ana', email='ana@example.com', password='pass')
+        CountingHasher.verified = 0
+
+    def test_one_lookup_and_one_hash_per_login(self):
+        for identifier in ('ana', 'ana@example.com'):
+            CountingHasher.verified = 0
+            with CaptureQueriesContext(connection) as context:
+                response = APIClient().post('/api/token/', {'username': identifier, 'password': 'pass'}, format='json')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(set(response.json()), {'refresh', 'access'})
+            self.assertEqual(len(context), 1)
+            self.assertEqual(CountingHasher.verified, 1)
+
+    def test_failed_logins(self):
+        inactive = CustomUser.objects.create_user(username='gone', email='gone@example.com', password='pass')
+        inactive.is_active = False
+        inactive.save()
+        cases = [
+            ({'username': 'nobody', 'password': 'pass'}, 'No account found with the given credentials'),
+            ({'username': 'ana', 'password': 'wrong'}, 'Invalid password'),
+            ({'username': 'gone', 'password': 'pass'}, 'User is inactive'),
+        ]
+        for url in ('/api/token/', '/api/async/token/'):
+            for data, message in cases:
+                response = APIClient().post(url, data, format='json')
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.json(), {'non_field_errors': [message]})
+            response = APIClient().post(url, {'username': 'ana'}, format='json')
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('password', response.json())
+
+    def test_async_login_issues_working_tokens(self):
+        response = APIClient().post('/api/async/token/', {'username': 'ana@example.com', 'password': 'pass'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.json()['access']}")
+        self.assertEqual(client.get('/api/async/users/profile/').json()['username'], 'ana')
+
+    @override_settings(PASSWORD_HASHERS=['api.hashers.ConfigurablePBKDF2PasswordHasher'], PASSWORD_HASH_ITERATIONS=1000)
+    def test_changed_work_factor_rehashes_on_login(self):
+        user = CustomUser.objects.create_user(username='ben', email='ben@example.com', password='pass')
+        self.assertTrue(user.password.startswith('pbkdf2_sha256$1000$'))
+        with self.settings(PASSWORD_HASH_ITERATIONS=2000):
+            response = APIClient().post('/api/token/', {'username': 'ben', 'password': 'pass'}, format='json')
+            self.assertEqual(response.status_code, 200)
+            user.refresh_from_db()
+            self.assertTrue(user.password.startswith('pbkdf2_sha256$2000$'))
+            self.assertTrue(user.check_password('pass'))
+
+
+def png_upload(name='face.png', color=(200, 30, 30), size=(600, 400)):
+    output = io.BytesIO()
+    Image.new('RGB', size, color).save(output, 'PNG')
+    return SimpleUploadedFile(name, output.getvalue(), content_type='image/png')
+
+
+class MediaFixtureMixin:
+    """
+    A throwaway MEDIA_ROOT, and a user uploading profile pictures into it
+    """
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = self.settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        caches['users'].clear()
+
+        self.user = CustomUser.objects.create_user(username='pic', email='pic@example.com', password='pass')
+        self.client = self.client_for(self.user)
+
+    def client_for(self, user):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(user).access_token}')
+        return client
+
+    def upload(self, client=None, **kwargs):
+        response = (client or self.client).put(
+            '/api/users/update_profile/', {'profile_picture': png_upload(**kwargs)}, format='multipart'
+        )
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS, AVATAR_SIZES=(48, 128))
+class AvatarTestCase(MediaFixtureMixin, TestCase):
+
+    def test_upload_builds_variants(self):
+        data = self.upload()
+        self.user.refresh_from_db()
+        digest = self.user.avatar_hash
+        self.assertEqual(len(digest), 16)
+        self.assertEqual(set(data['avatar']), {'48', '128'})
+        self.assertTrue(data['avatar']['128']['webp'].endswith(f'/api/avatars/{digest}/128.webp'))
+
+        response = self.client.get(f'/api/avatars/{digest}/128.webp')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'image/webp')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertEqual(Image.open(io.BytesIO(b''.join(response.streaming_content))).size, (128, 128))
+
+        self.assertNotEqual(self.upload(color=(30, 30, 200))['avatar'], data['avatar'])
+
+    def test_variants_are_built_on_first_request(self):
+        self.upload()
+        self.user.refresh_from_db()
+        digest = self.user.avatar_hash
+        shutil.rmtree(os.path.join(settings.MEDIA_ROOT, 'avatars'))
+
+        response = APIClient().get(f'/api/avatars/{digest}/48.jpg')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        self.assertTrue(default_storage.exists(f'avatars/{digest}/48.webp'))
+
+    def test_unknown_variants_are_not_found(self):
+        self.upload()
+        self.user.refresh_from_db()
+        digest = self.user.avatar_hash
+        for url in (f'/api/avatars/{digest}/64.webp', f'/api/avatars/{digest}/48.gif',
+                    '/api/avatars/0123456789abcdef/48.webp'):
+            self.assertEqual(APIClient().get(url).status_code, 404)
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS, AVATAR_SIZES=(48,))
+class MediaStorageTestCase(MediaFixtureMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.other = CustomUser.objects.create_user(username='twin', email='twin@example.com', password='pass')
+
+    def picture_files(self):
+        return sorted(default_storage.listdir('profile_pictures')[1])
+
+    def collect(self, *args):
+        call_command('collect_media', '--min-age=0', *args, stdout=io.StringIO())
+
+    def test_identical_uploads_share_a_file(self):
+        self.upload(name='mine.png')
+        self.upload(self.client_for(self.other), name='Other.PNG')
+        self.user.refresh_from_db()
+        self.other.refresh_from_db()
+        self.assertEqual(self.user.profile_picture.name, self.other.profile_picture.name)
+        self.assertEqual(self.user.profile_picture.name, f'profile_pictures/{self.user.avatar_hash}.png')
+        self.assertEqual(self.picture_files(), [f'{self.user.avatar_hash}.png'])
+
+    def test_collect_deletes_only_unreferenced_media(self):
+        default_storage.save('profile_pictures/profile.png', png_upload())
+        self.upload(color=(1, 2, 3))
+        self.upload(self.client_for(self.other), color=(1, 2, 3))
+        self.user.refresh_from_db()
+        replaced = self.user.avatar_hash
+        self.upload(color=(4, 5, 6))
+        self.upload(self.client_for(self.other), color=(7, 8, 9))
+        self.user.refresh_from_db()
+        self.other.refresh_from_db()
+        self.assertEqual(len(self.picture_files()), 4)
+
+        self.collect('--dry-run')
+        self.assertEqual(len(self.picture_files()), 4)
+        call_command('collect_media', stdout=io.StringIO())
+        self.assertEqual(len(self.picture_files()), 4)
+
+        self.collect('--batch-size=1')
+        self.assertEqual(self.picture_files(), sorted([
+            'profile.png', f'{self.user.avatar_hash}.png', f'{self.other.avatar_hash}.png'
+        ]))
+        self.assertFalse(default_storage.exists(f'avatars/{replaced}'))
+        self.assertTrue(default_storage.exists(f'avatars/{self.user.avatar_hash}/48.webp'))
+
+    def test_collect_keeps_media_picked_up_during_the_sweep(self):
+        self.upload(color=(1, 2, 3))
+        self.user.refresh_from_db()
+        orphan = self.user.profile_picture.name
+        self.upload(color=(4, 5, 6))
+        os.utime(default_storage.path(orphan), (0, 0))
+        referenced = collect_media.Command.referenced
+
+        def reupload_while_checking(command, field, values):
+            # The other user uploads the orphaned picture between the check and the delete
+            found = referenced(command, field, values)
+            if field == 'profile_picture' and not self.other.profile_picture.name.endswith(orphan):
+                self.upload(self.client_for(self.other), color=(1, 2, 3))
+                self.other.refresh_from_db()
+            return found
+
+        with patch.object(collect_media.Command, 'referenced', reupload_while_checking):
+            self.collect()
+        self.assertEqual(self.other.profile_picture.name, orphan)
+        self.assertTrue(default_storage.exists(orphan))
+
+        # With the row reference gone again, the refreshed file is still too young
+        self.other.profile_picture = None
+        self.other.save()
+        call_command('collect_media', stdout=io.StringIO())
+        self.assertTrue(default_storage.exists(orphan))
+
+
+def png_header(width, height):
+    """
+    A PNG claiming the given dimensions, with no pixel data behind them
+    """
+    def chunk(kind, data):
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+
+    content = (b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0))
+               + chunk(b'IDAT', zlib.compress(b'')) + chunk(b'IEND', b''))
+    return SimpleUploadedFile('bomb.png', content, content_type='image/png')
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS, PROFILE_PICTURE_MAX_DIMENSION=1000)
+class UploadLimitTestCase(MediaFixtureMixin, TestCase):
+
+    def rejected(self, picture):
+        response = self.client.put('/api/users/update_profile/', {'profile_picture': picture}, format='multipart')
+        self.assertEqual(response.status_code, 400)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.profile_picture.name, 'profile_pictures/profile.png')
+        self.assertFalse(default_storage.exists('profile_pictures'))
+        return response.json()['profile_picture'][0]
+
+    @override_settings(PROFILE_PICTURE_MAX_BYTES=4096, FILE_UPLOAD_MAX_MEMORY_SIZE=0, FILE_UPLOAD_TEMP_DIR=os.devnull)
+    def test_oversized_uploads_are_discarded_while_streaming(self):
+        # Noise does not compress, so this PNG is far over the limit. Any
+        # upload reaching a temporary file would fail under FILE_UPLOAD_TEMP_DIR.
+        noise = Image.frombytes('RGB', (200, 200), os.urandom(200 * 200 * 3))
+        output = io.BytesIO()
+        noise.save(output, 'PNG')
+        picture = SimpleUploadedFile('noise.png', output.getvalue(), content_type='image/png')
+        self.assertEqual(self.rejected(picture), 'Profile picture must be at most 4096 bytes.')
+        self.upload(size=(64, 64))
+
+    def test_dimensions_come_from_the_header(self):
+        message = 'Profile picture must be at most 1000x1000 pixels.'
+        self.assertEqual(self.rejected(png_header(1001, 10)), message)
+        self.assertEqual(self.rejected(png_header(100000, 100000)), message)
+
+    def test_unsupported_formats(self):
+        output = io.BytesIO()
+        Image.new('RGB', (10, 10)).save(output, 'BMP')
+        picture = SimpleUploadedFile('face.bmp', output.getvalue(), content_type='image/bmp')
+        self.assertEqual(self.rejected(picture), 'Profile picture must be one of: GIF, JPEG, PNG, WEBP.')
@@ -0,0 +1,121 @@
+# uploads.py
+"""
+Bounded handling of profile picture uploads.
+
+BoundedUploadHandler keeps each profile picture in memory while it
+streams in. It discards the rest of a picture once the picture passes
+PROFILE_PICTURE_MAX_BYTES, so an upload never costs more than that much
+memory and never reaches a temporary file on disk.
+
+ProfilePictureField rejects oversized uploads and reads the format and
+dimensions from the image header before any further validation. Pillow
+opens images lazily, so an image too large to decode is refused without
+its pixels ever being decoded.
+"""
+import io
+from django.conf import settings
+from django.core.files.uploadedfile import InMemoryUploadedFile, UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler, StopFutureHandlers
+from PIL import Image
+from rest_framework import serializers
+
+# Multipart fields whose files go through BoundedUploadHandler
+BOUNDED_FIELDS = {'profile_picture'}
+PICTURE_FORMATS = {'JPEG', 'PNG', 'WEBP', 'GIF'}
+
+
+def picture_max_bytes():
+    return getattr(settings, 'PROFILE_PICTURE_MAX_BYTES', 5 * 1024 * 1024)
+
+
+def picture_max_dimension():
+    return getattr(settings, 'PROFILE_PICTURE_MAX_DIMENSION', 4096)
+
+
+class OversizedUpload(UploadedFile):
+    """
+    Stands in for an upload whose content was discarded for being too
+    large, so validation can report it. size is the bytes received.
+    """
+
+    def __init__(self, name, content_type, size):
+        super().__init__(io.BytesIO(), name, content_type, size)
+
+
+class BoundedUploadHandler(FileUploadHandler):
+    """
+    Keeps files of BOUNDED_FIELDS in memory up to picture_max_bytes().
+    Files of other fields go on to the next handlers.
+
+    This handler must come first in FILE_UPLOAD_HANDLERS.
+    """
+    chunk_size = 64 * 1024
+
+    def new_file(self, field_name, *args, **kwargs):
+        super().new_file(field_name, *args, **kwargs)
+        self.bounded = field_name in BOUNDED_FIELDS
+        if not self.bounded:
+            return
+        self.limit = picture_max_bytes()
+        self.oversized = self.content_length is not None and self.content_length > self.limit
+        self.file = io.BytesIO()
+        # The later handlers never see this file, so none of them opens a temporary file
+        raise StopFutureHandlers()
+
+    def receive_data_chunk(self, raw_data, start):
+        if not self.bounded:
+            return raw_data
+        if not self.oversized and start + len(raw_data) > self.limit:
+            self.oversized = True
+            self.file = io.BytesIO()
+        if not self.oversized:
+            self.file.write(raw_data)
+
+    def file_complete(self, file_size):
+        if not self.bounded:
+            return None
+        if self.oversized:
+            return OversizedUpload(self.file_name, self.content_type, file_size)
+        self.file.seek(0)
+        return InMemoryUploadedFile(
+            file=self.file,
+            field_name=self.field_name,
+            name=self.file_name,
+            content_type=self.content_type,
+            size=file_size,
+            charset=self.charset,
+            content_type_extra=self.content_type_extra,
+        )
+
+
+class ProfilePictureField(serializers.ImageField):
+    default_error_messages = {
+        'too_large': 'Profile picture must be at most {max_bytes} bytes.',
+        'dimensions': 'Profile picture must be at most {max_dimension}x{max_dimension} pixels.',
+        'format': 'Profile picture must be one of: {formats}.',
+    }
+
+    def to_internal_value(self, data):
+        if not isinstance(data, UploadedFile):
+            # Not a file; the base class rejects it
+            return super().to_internal_value(data)
+        max_bytes = picture_max_bytes()
+        if isinstance(data, OversizedUpload) or (data.size or 0) > max_bytes:
+            self.fail('too_large', max_bytes=max_bytes)
+        try:
+            # Reads the header only; pixels are decoded on first access
+            with Image.open(data) as image:
+                image_format, (width, height) = image.format, image.size
+        except Image.DecompressionBombError:
+            # More pixels than Pillow will open at all
+            width = height = None
+        except (OSError, ValueError):
+            self.fail('invalid_image')
+        finally:
+            data.seek(0)
+        max_dimension = picture_max_dimension()
+        if width is None or max(width, height) > max_dimension:
+            self.fail('dimensions', max_dimension=max_dimension)
+        if image_format not in PICTURE_FORMATS:
+            self.fail('format', formats=', '.join(sorted(PICTURE_FORMATS)))
+        return super().to_internal_value(data)
@@ -5,7 +5,8 @@ from rest_framework_simplejwt.views import (
     TokenObtainPairView,
     TokenRefreshView,
 )
-from .views import ClassViewSet, CustomUserViewSet, QuestionBankViewSet, QuizAttemptViewSet, QuizViewSet, EmailTokenObtainPairView
+from . import async_views
+from .views import ClassViewSet, CustomUserViewSet, QuestionBankViewSet, QuizAttemptViewSet, QuizViewSet, EmailTokenObtainPairView, avatar_variant
 
 router = DefaultRouter()
 router.register(r'users', CustomUserViewSet)
@@ -20,4 +21,11 @@ urlpatterns = [
     path('token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
     path('users/change_password/', CustomUserViewSet.as_view({'post': 'change_password'}), name='change_password'),
     path('users/delete_account/', CustomUserViewSet.as_view({'delete': 'delete_account'}), name='delete_account'),
+    path('avatars/<slug:digest>/<int:size>.<slug:extension>', avatar_variant, name='avatar_variant'),
+    # Async read paths, served without a worker thread under ASGI
+    path('async/users/profile/', async_views.profile, name='async_profile'),
+    path('async/classes/', async_views.class_list, name='async_class_list'),
+    path('async/attempts/', async_views.attempt_list, name='async_attempt_list'),
+    path('async/quizzes/<int:pk>/', async_views.quiz_detail, name='async_quiz_detail'),
+    path('async/token/', async_views.token_obtain, name='async_token_obtain_pair'),
 ]
\ No newline at end of file
@@ -4,19 +4,76 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework_simplejwt.views import TokenObtainPairView
+from django.core.files.storage import default_storage
+from django.http import FileResponse, Http404
 from django.shortcuts import get_object_or_404
+from django.views.decorators.http import require_safe
 from django.utils import timezone
-from django.db.models import Q
+from django.db.models import F, OuterRef, Q, Subquery
 from api.models import Class, CustomUser, QuestionBank, Quiz, QuizAttempt
 from api.serializers import ClassSerializer, CustomUserSerializer, QuestionBankSerializer, QuizAttemptSerializer, QuizSerializer, EmailTokenObtainPairSerializer
-from rest_framework.exceptions import ValidationError
+from api.analytics import quiz_analytics
+from api.avatars import FORMATS as AVATAR_FORMATS, variant_file
+from api import leaderboards
+from api.caching import (
+    accessible_quiz_ids, cached_response, get_quiz_list_version, get_quiz_version, get_removals_version,
+    get_roster_versions, get_user_version, response_cache_key
+)
+from api.conditional import ConditionalListMixin, make_etag
+from api.exports import EXPORT_FORMATS, export_response
+from api.imports import CSVParser, clamp_points, import_questions, question_rows
+from api.pagination import AttemptCursorPagination
+from api.regrade import regrade_attempts
+from api.replicas import ReplicaReadMixin
+from api.quiz_sessions import (
+    close_session, get_session, is_open, remaining_seconds, save_answers, sessions_required, start_session,
+    submission_answers
+)
+from api.submission_queue import attempt_status
+from api.submissions import enqueue_attempt, queue_submissions, stored_result, submit_attempt
+from api.rosters import (
+    class_id_for_join_code, enroll_students, is_enrolled, join_class, remove_students,
+    resolve_students, save_with_join_code
+)
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.parsers import FormParser, JSONParser, MultiPartParser
 from django.contrib.auth.password_validation import validate_password
 from django.contrib.auth import logout
 
+def leaderboard_limit(request):
+    try:
+        limit = int(request.query_params.get('limit', 10))
+    except (ValueError, TypeError):
+        limit = 10
+    return min(max(limit, 1), leaderboards.TOP_SIZE)
+
+def export_options(request):
+    """
+    Read ?output=csv|ndjson and ?flatten=true for the export endpoints
+    """
+    output = request.query_params.get('output', 'csv')
+    if output not in EXPORT_FORMATS:
+        raise ValidationError({'output': [f'Must be one of: {", ".join(EXPORT_FORMATS)}']})
+    flatten = request.query_params.get('flatten', '').lower() in ('1', 'true', 'yes')
+    return output, flatten
+
+def submission_status_response(request, attempt_id, replayed=False):
+    """
+    202 with a status link while a queued submission waits, the result once graded
+    """
+    headers = {'Idempotent-Replayed': 'true'} if replayed else {}
+    data = attempt_status(attempt_id)
+    if data is None:
+        raise NotFound()
+    if data['status'] == QuizAttempt.GRADED:
+        return Response(data, headers=headers)
+    data['status_url'] = request.build_absolute_uri(f'/api/attempts/{attempt_id}/status/')
+    return Response(data, status=status.HTTP_202_ACCEPTED, headers=headers)
+
 class EmailTokenObtainPairView(TokenObtainPairView):
     serializer_class = EmailTokenObtainPairSerializer
 
-class CustomUserViewSet(viewsets.ModelViewSet):
+class CustomUserViewSet(ReplicaReadMixin, viewsets.ModelViewSet):
     queryset = CustomUser.objects.all()
     serializer_class = CustomUserSerializer
 
@@ -62,6 +119,7 @@ class CustomUserViewSet(viewsets.ModelViewSet):
             # Handle profile picture removal
             if request.data.get('remove_profile_picture') == 'true':
                 user.profile_picture = 'profile_pictures/profile.png'
+                user.avatar_hash = ''
                 user.save()
 
             # Save the updated user data
@@ -115,16 +173,43 @@ class CustomUserViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-class ClassViewSet(viewsets.ModelViewSet):
+class ClassViewSet(ReplicaReadMixin, ConditionalListMixin, viewsets.ModelViewSet):
     queryset = Class.objects.all()
     serializer_class = ClassSerializer
     permission_classes = [IsAuthenticated]
+    # Boards are cached, and must not be filled from a lagging replica
+    primary_actions = ('leaderboard',)
+    conditional_timestamp_fields = (
+        'updated_at',
+        'teacher__updated_at',
+        # The newest of each class's students, as a subquery per class; a
+        # students join would reuse the one filtering a student's own classes
+        Subquery(
+            CustomUser.objects.filter(enrolled_classes=OuterRef('pk')).order_by('-updated_at').values('updated_at')[:1]
+        ),
+    )
+
+    def conditional_state(self, queryset):
+        # Joins and removals bump the classes' roster tokens rather than
+        # their rows, so the ids come back with the timestamps in one query
+        names = self.conditional_timestamps(lambda field: field)
+        rows = queryset.order_by().annotate(**{
+            name: F(field) if isinstance(field, str) else field for name, field in names.items()
+        }).values_list('id', *names)
+        timestamps = [value for row in rows for value in row[1:] if value is not None]
+        versions = [get_removals_version(), *get_roster_versions([row[0] for row in rows])]
+        return max(timestamps, default=None), versions
 
     def get_queryset(self):
         user = self.request.user
         if user.is_teacher:
-            return Class.objects.filter(teacher=user)
-        return Class.objects.filter(students=user)
+            queryset = Class.objects.filter(teacher=user)
+        else:
+            queryset = Class.objects.filter(students=user)
+
+        if self.action in ('export', 'leaderboard', 'add_students', 'remove_students'):
+            return queryset
+        return ClassSerializer.setup_eager_loading(queryset, self.request)
 
     def perform_create(self, serializer):
         if not self.request.user.is_teacher:
@@ -132,7 +217,7 @@ class ClassViewSet(viewsets.ModelViewSet):
                 {'error': 'Only teachers can create classes'},
                 status=status.HTTP_403_FORBIDDEN
             )
-        serializer.save(teacher=self.request.user)
+        save_with_join_code(lambda **kwargs: serializer.save(teacher=self.request.user, **kwargs))
 
     def update(self, request, *args, **kwargs):
         partial = kwargs.pop('partial', False)
@@ -153,7 +238,7 @@ class ClassViewSet(viewsets.ModelViewSet):
                 student = CustomUser.objects.get(id=student_id)
 
                 # Check if student is in the class
-                if student not in instance.students.all():
+                if not is_enrolled(instance.pk, student.pk):
                     return Response(
                         {'error': 'Student is not in this class'},
                         status=status.HTTP_400_BAD_REQUEST
@@ -178,6 +263,59 @@ class ClassViewSet(viewsets.ModelViewSet):
 
         return Response(serializer.data)
 
+    def roster_students(self, request, class_obj):
+        """
+        Resolve the "students" list of a roster request, or return an error response
+        """
+        if class_obj.teacher_id != request.user.id:
+            return None, Response(
+                {'error': 'Only the class teacher can change the roster'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        identifiers = request.data.get('students')
+        if not isinstance(identifiers, list) or not identifiers:
+            return None, Response(
+                {'error': 'students must be a non-empty list of ids (numbers), usernames or emails'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return resolve_students(identifiers), None
+
+    @action(detail=True, methods=['post'])
+    def add_students(self, request, pk=None):
+        """
+        Enroll many students at once by id, username or email
+        """
+        class_obj = self.get_object()
+        resolved, error = self.roster_students(request, class_obj)
+        if error:
+            return error
+        student_ids, not_found = resolved
+        added = enroll_students(class_obj, student_ids)
+        added_ids = set(added)
+        return Response({
+            'added': added,
+            'already_enrolled': [student_id for student_id in student_ids if student_id not in added_ids],
+            'not_found': not_found,
+        })
+
+    @action(detail=True, methods=['post'])
+    def remove_students(self, request, pk=None):
+        """
+        Remove many students at once by id, username or email
+        """
+        class_obj = self.get_object()
+        resolved, error = self.roster_students(request, class_obj)
+        if error:
+            return error
+        student_ids, not_found = resolved
+        removed = remove_students(class_obj, student_ids)
+        removed_ids = set(removed)
+        return Response({
+            'removed': removed,
+            'not_enrolled': [student_id for student_id in student_ids if student_id not in removed_ids],
+            'not_found': not_found,
+        })
+
     @action(detail=False, methods=['post'])
     def join(self, request):
         if request.user.is_teacher:
@@ -186,25 +324,53 @@ class ClassViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_403_FORBIDDEN
             )
 
-        join_code = request.data.get('join_code')
-        try:
-            class_obj = Class.objects.get(join_code=join_code)
-            if request.user in class_obj.students.all():
-                return Response(
-                    {'error': 'Already a member of this class'},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-            class_obj.students.add(request.user)
-            return Response({'message': 'Successfully joined class'})
-        except Class.DoesNotExist:
+        class_id = class_id_for_join_code(request.data.get('join_code'))
+        if class_id is None:
             return Response(
                 {'error': 'Invalid join code'},
                 status=status.HTTP_404_NOT_FOUND
             )
+        if not join_class(class_id, request.user):
+            return Response(
+                {'error': 'Already a member of this class'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return Response({'message': 'Successfully joined class'})
+
+    @action(detail=True, methods=['get'])
+    def export(self, request, pk=None):
+        """
+        Stream the class gradebook: every attempt by its students on its quizzes
+        """
+        if not request.user.is_teacher:
+            return Response(
+                {'error': 'Only teachers can export results'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        class_obj = self.get_object()
+        output, flatten = export_options(request)
+        attempts = QuizAttempt.objects.filter(
+            quiz__classes=class_obj,
+            student__enrolled_classes=class_obj
+        )
+        return export_response(attempts, f'class-{class_obj.pk}-results', output, flatten)
 
-class QuizViewSet(viewsets.ModelViewSet):
+    @action(detail=True, methods=['get'])
+    def leaderboard(self, request, pk=None):
+        """
+        Students ranked by total points across the class's quizzes
+        """
+        class_obj = self.get_object()
+        board = leaderboards.get_class_board(class_obj.pk)
+        me = leaderboards.class_position(class_obj.pk, request.user.pk)
+        return Response(leaderboards.leaderboard_response(board, me, leaderboard_limit(request)))
+
+class QuizViewSet(ReplicaReadMixin, ConditionalListMixin, viewsets.ModelViewSet):
     queryset = Quiz.objects.all()
     serializer_class = QuizSerializer
+    # Their payloads are cached under version tokens bumped by the primary's writes
+    primary_actions = ('list', 'retrieve', 'leaderboard')
+
     def get_permissions(self):
         if self.action in ['list', 'retrieve']:
             permission_classes = [AllowAny]
@@ -213,13 +379,50 @@ class QuizViewSet(viewsets.ModelViewSet):
         return [permission() for permission in permission_classes]
 
     def get_queryset(self):
-        if not self.request.user.is_authenticated:
-            return Quiz.objects.all()  # Or filter as needed for public view
-
         user = self.request.user
-        if user.is_teacher:
-            return Quiz.objects.filter(teacher=user)
-        return Quiz.objects.filter(classes__students=user)
+        if not user.is_authenticated:
+            queryset = Quiz.objects.all()  # Or filter as needed for public view
+        elif user.is_teacher:
+            queryset = Quiz.objects.filter(teacher=user)
+        else:
+            # A student in several classes sharing a quiz would see it repeated
+            queryset = Quiz.objects.filter(classes__students=user).distinct()
+
+        if self.action in ('take_quiz', 'start_attempt', 'export', 'analytics', 'leaderboard'):
+            # These read the quiz row only, never the serialized quiz
+            return queryset
+        return QuizSerializer.setup_eager_loading(queryset, self.request)
+
+    def list_versions(self, request):
+        # Every quiz change bumps the list version, and a student's own
+        # roster changes bump their user version
+        versions = [get_quiz_list_version()]
+        if request.user.is_authenticated:
+            versions.append(get_user_version(request.user.pk))
+        return versions
+
+    def list_validators(self, request):
+        # Polls are answered from the version tokens without touching the database
+        versions = self.list_versions(request)
+        return make_etag(request, *versions), max(versions) // 10 ** 9
+
+    def list_response(self, request, *args, **kwargs):
+        key = response_cache_key('quiz-list', request, *self.list_versions(request))
+        return cached_response(request, key, lambda: super(QuizViewSet, self).list_response(request, *args, **kwargs))
+
+    def retrieve(self, request, *args, **kwargs):
+        try:
+            quiz_id = int(kwargs[self.lookup_field])
+        except (KeyError, ValueError):
+            return super().retrieve(request, *args, **kwargs)
+
+        user = request.user
+        if user.is_authenticated and quiz_id not in accessible_quiz_ids(user, self.get_queryset()):
+            raise NotFound()
+
+        # Everyone allowed to open the quiz sees the same payload
+        key = response_cache_key('quiz-detail', request, get_quiz_version(quiz_id), per_user=False)
+        return cached_response(request, key, lambda: super(QuizViewSet, self).retrieve(request, *args, **kwargs))
 
     def perform_create(self, serializer):
         if not self.request.user.is_teacher:
@@ -233,7 +436,10 @@ class QuizViewSet(viewsets.ModelViewSet):
         )
 
     @action(detail=True, methods=['post'])
-    def take_quiz(self, request, pk=None):
+    def start_attempt(self, request, pk=None):
+        """
+        Open (or resume) a timed session; answers can then be autosaved with save_answers
+        """
         quiz = self.get_object()
 
         if not quiz.is_active():
@@ -242,134 +448,175 @@ class QuizViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        if QuizAttempt.objects.filter(quiz=quiz, student=request.user).exists():
+        session = None
+        if not QuizAttempt.objects.filter(quiz=quiz, student=request.user).exists():
+            session = start_session(quiz, request.user)
+        if session is None:
             return Response(
                 {'error': 'You have already attempted this quiz'},
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        # Process answers
-        answers = request.data.get('answers', {})
-        questions = quiz.questions.all()
-        correct_count = 0
-        total_points = 0
-        max_points = sum(question.points for question in questions)
-        results = []
-
-        for question in questions:
-            # Get raw answer and correct answer
-            raw_answer = answers.get(str(question.id), '')
-            raw_correct = question.correct_answer
-
-            # Convert to strings and strip whitespace
-            answer = str(raw_answer).strip()
-            correct_answer = str(raw_correct).strip()
-
-            print(f"Question {question.id} - Type: {question.question_type}")
-            print(f"Raw answer: '{raw_answer}' ({type(raw_answer)})")
-            print(f"Raw correct: '{raw_correct}' ({type(raw_correct)})")
-            print(f"Processed answer: '{answer}'")
-            print(f"Processed correct: '{correct_answer}'")
-
-            # Handle different question types
-            if question.question_type == 'MC':
-                # Check if answer is the option text
-                if answer in [question.option_a, question.option_b, question.option_c, question.option_d]:
-                    options = [question.option_a, question.option_b, question.option_c, question.option_d]
-                    answer = str(options.index(answer))
-                    print(f"Converted MC text answer to index: {answer}")
-
-                # Check if correct_answer is the option text
-                if correct_answer in [question.option_a, question.option_b, question.option_c, question.option_d]:
-                    options = [question.option_a, question.option_b, question.option_c, question.option_d]
-                    correct_answer = str(options.index(correct_answer))
-                    print(f"Converted MC correct answer to index: {correct_answer}")
-
-            elif question.question_type == 'TF':
-                # Normalize True/False answers
-                answer = answer.lower()
-                correct_answer = correct_answer.lower()
-                # Map variations to standard format
-                true_values = ['true', 't', '1', 'yes']
-                false_values = ['false', 'f', '0', 'no']
-                answer = 'true' if answer in true_values else 'false' if answer in false_values else answer
-                correct_answer = 'true' if correct_answer in true_values else 'false' if correct_answer in false_values else correct_answer
-
-            elif question.question_type == 'ID':
-                # Case-insensitive comparison for identification questions
-                answer = answer.lower()
-                correct_answer = correct_answer.lower()
-
-            # Debug print before comparison
-            print(f"Final comparison - Answer: '{answer}', Correct: '{correct_answer}'")
-
-            # Perform the comparison
-            is_correct = answer == correct_answer
-            print(f"Is correct: {is_correct}")
-
-            if is_correct:
-                correct_count += 1
-                total_points += question.points
-
-            # Get display answer for results
-            display_answer = answer
-            if question.question_type == 'MC':
-                options = {
-                    '0': question.option_a,
-                    '1': question.option_b,
-                    '2': question.option_c,
-                    '3': question.option_d
-                }
-                display_answer = options.get(answer, answer)
-                correct_display = options.get(correct_answer, correct_answer)
-                if not display_answer and answer in [question.option_a, question.option_b, question.option_c, question.option_d]:
-                    display_answer = answer
-                if not correct_display and correct_answer in [question.option_a, question.option_b, question.option_c, question.option_d]:
-                    correct_display = correct_answer
-            else:
-                correct_display = correct_answer
-
-            results.append({
-                'question_id': question.id,
-                'correct': is_correct,
-                'user_answer': display_answer,
-                'correct_answer': correct_display if quiz.show_correct_answers else None,
-                'points': question.points if is_correct else 0,
-                'max_points': question.points
-            })
-
-        # Calculate percentage score
-        score = (total_points / max_points) * 100 if max_points > 0 else 0
-
-        # Create attempt
-        attempt = QuizAttempt.objects.create(
-            student=request.user,
-            quiz=quiz,
-            score=score,
-            total_questions=len(questions),
-            correct_questions=correct_count,
-            total_points=total_points,
-            max_points=max_points,
-            results=results
-        )
+        return Response({
+            'session': session['id'],
+            'deadline': session['deadline'],
+            'remaining_seconds': remaining_seconds(session),
+            'answers': session['answers'],
+        })
+
+    @action(detail=True, methods=['post'])
+    def save_answers(self, request, pk=None):
+        """
+        Autosave partial answers into the open session.
+
+        Access was checked by start_attempt; the session is read from the
+        cache and written back in batches, so a save rarely touches the database.
+        """
+        try:
+            quiz_id = int(pk)
+        except (TypeError, ValueError):
+            raise NotFound()
 
+        answers = request.data.get('answers')
+        if not isinstance(answers, dict):
+            return Response(
+                {'error': 'answers must be an object of question id to answer'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        session = get_session(quiz_id, request.user)
+        if session is None:
+            return Response(
+                {'error': 'Start the quiz before saving answers'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if not is_open(session):
+            return Response(
+                {'error': 'Time is up for this quiz'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        save_answers(quiz_id, request.user, session, answers)
         return Response({
-            'score': score,
-            'correct_questions': correct_count,
-            'total_questions': len(questions),
-            'total_points': total_points,
-            'max_points': max_points,
-            'results': results
+            'saved': len(answers),
+            'remaining_seconds': remaining_seconds(session),
         })
 
-class QuestionBankViewSet(viewsets.ModelViewSet):
+    @action(detail=True, methods=['post'])
+    def take_quiz(self, request, pk=None):
+        quiz = self.get_object()
+
+        # A retried submission gets the first response back without regrading
+        idempotency_key = request.headers.get('Idempotency-Key')
+        stored = stored_result(request.user, quiz, idempotency_key)
+        if stored is not None:
+            if 'attempt_id' in stored:
+                return submission_status_response(request, stored['attempt_id'], replayed=True)
+            return Response(stored, headers={'Idempotent-Replayed': 'true'})
+
+        # An open session may be submitted after its deadline; only the
+        # answers saved in time are graded then
+        session = get_session(quiz.pk, request.user)
+        if session is None and not quiz.is_active():
+            return Response(
+                {'error': 'Quiz is not currently available'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        if QuizAttempt.objects.filter(quiz=quiz, student=request.user).exists():
+            return Response(
+                {'error': 'You have already attempted this quiz'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        # The time limit runs from start_attempt; where sessions are
+        # required, a timed quiz cannot be submitted around it
+        if session is None and quiz.time_limit_minutes > 0 and sessions_required():
+            return Response(
+                {'error': 'Start the quiz before submitting'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        answers = submission_answers(session, request.data.get('answers') or {})
+        if queue_submissions():
+            # Graded later by the process_submissions worker
+            attempt_id, created = enqueue_attempt(quiz, request.user, answers, idempotency_key)
+            if created and session is not None:
+                close_session(quiz.pk, request.user, session, answers)
+            if attempt_id is None:
+                return Response(
+                    {'error': 'You have already attempted this quiz'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            return submission_status_response(request, attempt_id, replayed=not created)
+
+        graded, created = submit_attempt(quiz, request.user, answers, idempotency_key)
+        if created and session is not None:
+            close_session(quiz.pk, request.user, session, answers)
+        if graded is None:
+            return Response(
+                {'error': 'You have already attempted this quiz'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if not created:
+            return Response(graded, headers={'Idempotent-Replayed': 'true'})
+        return Response(graded)
+
+    @action(detail=True, methods=['get'])
+    def export(self, request, pk=None):
+        """
+        Stream every attempt of the quiz as CSV or NDJSON
+        """
+        if not request.user.is_teacher:
+            return Response(
+                {'error': 'Only teachers can export results'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        quiz = self.get_object()
+        output, flatten = export_options(request)
+        question_ids = quiz.questions.order_by('id').values_list('id', flat=True) if flatten else None
+        return export_response(
+            QuizAttempt.objects.filter(quiz=quiz),
+            f'quiz-{quiz.pk}-results',
+            output,
+            flatten,
+            question_ids
+        )
+
+    @action(detail=True, methods=['get'])
+    def analytics(self, request, pk=None):
+        """
+        Item statistics for the quiz, served from the running aggregates
+        """
+        if not request.user.is_teacher:
+            return Response(
+                {'error': 'Only teachers can view quiz analytics'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        return Response(quiz_analytics(self.get_object()))
+
+    @action(detail=True, methods=['get'])
+    def leaderboard(self, request, pk=None):
+        """
+        Attempts ranked by points, with the caller's own position
+        """
+        quiz = self.get_object()
+        board = leaderboards.get_quiz_board(quiz.pk)
+        me = leaderboards.quiz_position(quiz.pk, request.user.pk)
+        return Response(leaderboards.leaderboard_response(board, me, leaderboard_limit(request)))
+
+class QuestionBankViewSet(ReplicaReadMixin, viewsets.ModelViewSet):
     queryset = QuestionBank.objects.all()
     serializer_class = QuestionBankSerializer
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
         if self.request.user.is_teacher:
-            return QuestionBank.objects.filter(teacher=self.request.user)
+            queryset = QuestionBank.objects.filter(teacher=self.request.user)
+            question_type = self.request.query_params.get('type')
+            if question_type:
+                queryset = queryset.filter(question_type=question_type)
+            return QuestionBankSerializer.setup_eager_loading(queryset, self.request)
         return QuestionBank.objects.none()
 
     def perform_create(self, serializer):
@@ -379,20 +626,88 @@ class QuestionBankViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_403_FORBIDDEN
             )
         # Update points handling
-        points = self.request.data.get('points')
-        try:
-            points = int(points) if points else 1
-            if points < 1:
-                points = 1
-        except (ValueError, TypeError):
-            points = 1
-
+        points = clamp_points(self.request.data.get('points'))
         serializer.save(teacher=self.request.user, points=points)
 
-class QuizAttemptViewSet(viewsets.ReadOnlyModelViewSet):
+    @action(detail=False, methods=['post'], parser_classes=[JSONParser, CSVParser, MultiPartParser, FormParser])
+    def bulk(self, request):
+        """
+        Import many questions at once from CSV or JSON, optionally adding them to a quiz.
+
+        Rows are validated one by one; valid rows are inserted together and
+        invalid ones are reported by row number.
+        """
+        if not request.user.is_teacher:
+            return Response(
+                {'error': 'Only teachers can create questions'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+
+        quiz = None
+        quiz_id = request.query_params.get('quiz')
+        if quiz_id is None and hasattr(request.data, 'get'):
+            quiz_id = request.data.get('quiz')
+        if quiz_id:
+            try:
+                quiz = Quiz.objects.get(id=quiz_id, teacher=request.user)
+            except (Quiz.DoesNotExist, ValueError, TypeError):
+                return Response(
+                    {'error': 'Quiz not found'},
+                    status=status.HTTP_404_NOT_FOUND
+                )
+
+        questions, errors = import_questions(request.user, question_rows(request), quiz)
+        if not questions:
+            return Response(
+                {'error': 'No valid questions to import', 'errors': errors},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return Response({
+            'created': len(questions),
+            'question_ids': [question.id for question in questions],
+            'quiz': quiz.id if quiz else None,
+            'errors': errors,
+        }, status=status.HTTP_201_CREATED)
+
+    @action(detail=False, methods=['post'])
+    def regrade(self, request):
+        """
+        Regrade every attempt of the teacher's quizzes that use the given questions
+        """
+        if not request.user.is_teacher:
+            return Response(
+                {'error': 'Only teachers can regrade attempts'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+
+        question_ids = request.data.get('questions', [])
+        if not isinstance(question_ids, list) or not question_ids:
+            return Response(
+                {'error': 'questions must be a non-empty list of question ids'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        question_ids = list(
+            self.get_queryset().filter(id__in=question_ids).values_list('id', flat=True)
+        )
+        if not question_ids:
+            return Response(
+                {'error': 'Questions not found'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+
+        summary = regrade_attempts(question_ids=question_ids, teacher=request.user)
+        return Response(summary)
+
+class QuizAttemptViewSet(ReplicaReadMixin, ConditionalListMixin, viewsets.ReadOnlyModelViewSet):
     queryset = QuizAttempt.objects.all()
     serializer_class = QuizAttemptSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = AttemptCursorPagination
+    # Attempts embed their quiz and student
+    conditional_timestamp_fields = ('updated_at', 'quiz__updated_at', 'student__updated_at')
+    # Polled right after submitting, often past the sticky window
+    primary_actions = ('status',)
 
     def get_queryset(self):
         user = self.request.user
@@ -409,4 +724,28 @@ class QuizAttemptViewSet(viewsets.ReadOnlyModelViewSet):
         if quiz_id is not None:
             queryset = queryset.filter(quiz_id=quiz_id)
 
-        return queryset
\ No newline at end of file
+        if self.action == 'status':
+            return queryset
+        return QuizAttemptSerializer.setup_eager_loading(queryset, self.request)
+
+    @action(detail=True, methods=['get'])
+    def status(self, request, pk=None):
+        """
+        Whether a submission has been graded yet, with its result when it has
+        """
+        attempt = self.get_object()
+        return submission_status_response(request, attempt.pk)
+
+
+@require_safe
+def avatar_variant(request, digest, size, extension):
+    """
+    A resized profile picture, built on its first request. The URL names
+    the picture's content, so browsers and CDNs may keep it for good.
+    """
+    name = variant_file(digest, size, extension)
+    if name is None:
+        raise Http404
+    response = FileResponse(default_storage.open(name, 'rb'), content_type=AVATAR_FORMATS[extension][1])
+    response['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
@@ -47,8 +47,11 @@ INSTALLED_APPS = [
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'api.authentication.CachedJWTAuthentication',
     ),
+    # Keyset pagination, so list endpoints never run COUNT(*) on large tables
+    'DEFAULT_PAGINATION_CLASS': 'api.pagination.IdCursorPagination',
+    'PAGE_SIZE': int(os.environ.get('API_PAGE_SIZE', 50)),
 }
 
 SIMPLE_JWT = {
@@ -81,7 +84,7 @@ SIMPLE_JWT = {
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',
+    'api.middleware.StaticFilesMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -114,19 +117,166 @@ WSGI_APPLICATION = 'quizappapi.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+#
+# DB_PROFILE picks the database: 'sqlite' (default) or 'postgres'.
+
+DB_PROFILE = os.environ.get('DB_PROFILE', 'sqlite')
+
+if DB_PROFILE == 'postgres':
+    # psycopg 3 connection pool (pip install "psycopg[binary,pool]"). Pooled
+    # connections are handed back after each request, so CONN_MAX_AGE stays 0.
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('POSTGRES_DB', 'quizappapi'),
+            'USER': os.environ.get('POSTGRES_USER', 'quizappapi'),
+            'PASSWORD': os.environ.get('POSTGRES_PASSWORD', ''),
+            'HOST': os.environ.get('POSTGRES_HOST', 'localhost'),
+            'PORT': os.environ.get('POSTGRES_PORT', '5432'),
+            'CONN_MAX_AGE': 0,
+            'OPTIONS': {
+                'pool': {
+                    'min_size': int(os.environ.get('DB_POOL_MIN_SIZE', 2)),
+                    'max_size': int(os.environ.get('DB_POOL_MAX_SIZE', 10)),
+                    'timeout': int(os.environ.get('DB_POOL_TIMEOUT', 10)),
+                },
+            },
+        }
+    }
+else:
+    # WAL lets readers run alongside the single writer; writers queue on
+    # busy_timeout instead of failing with "database is locked", and
+    # IMMEDIATE transactions take the write lock up front so they never
+    # fail halfway through when upgrading from a read lock.
+    SQLITE_PRAGMAS = [
+        'PRAGMA journal_mode=WAL',
+        'PRAGMA synchronous=NORMAL',
+        f"PRAGMA busy_timeout={int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000))}",
+        f"PRAGMA mmap_size={int(os.environ.get('SQLITE_MMAP_SIZE', 128 * 1024 * 1024))}",
+        f"PRAGMA cache_size=-{int(os.environ.get('SQLITE_CACHE_KB', 20000))}",
+        'PRAGMA temp_store=MEMORY',
+    ]
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('SQLITE_PATH', BASE_DIR / 'db.sqlite3'),
+            'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 600)),
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {
+                'init_command': '; '.join(SQLITE_PRAGMAS),
+                'transaction_mode': 'IMMEDIATE',
+            },
+        }
+    }
+
+# Optional read replica, taking the reads of safe API requests (see
+# api/replicas.py). SQLITE_REPLICA_PATH points at a second SQLite file, kept
+# up to date locally with `manage.py sync_sqlite_replica`; POSTGRES_REPLICA_HOST
+# at a streaming replica of the primary.
+
+if DB_PROFILE == 'postgres' and os.environ.get('POSTGRES_REPLICA_HOST'):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'HOST': os.environ['POSTGRES_REPLICA_HOST'],
+        'PORT': os.environ.get('POSTGRES_REPLICA_PORT', DATABASES['default']['PORT']),
     }
+elif DB_PROFILE != 'postgres' and os.environ.get('SQLITE_REPLICA_PATH'):
+    DATABASES['replica'] = {**DATABASES['default'], 'NAME': os.environ['SQLITE_REPLICA_PATH']}
+
+if 'replica' in DATABASES:
+    DATABASES['replica']['TEST'] = {'MIRROR': 'default'}
+    DATABASE_REPLICA = 'replica'
+    DATABASE_ROUTERS = ['api.replicas.ReplicaRouter']
+
+# Seconds a user's reads stay on the primary after they write
+REPLICA_STICKY_SECONDS = int(os.environ.get('REPLICA_STICKY_SECONDS', 10))
+
+# Caches
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+#
+# Process-local by default. Point CACHE_BACKEND/CACHE_LOCATION at a shared
+# backend (e.g. django.core.cache.backends.redis.RedisCache) when running
+# several workers so cache invalidation reaches all of them.
+
+CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache')
+CACHE_LOCATION = os.environ.get('CACHE_LOCATION', '')
+LOCAL_CACHE = CACHE_BACKEND.endswith('LocMemCache')
+
+CACHES = {
+    'default': {
+        'BACKEND': CACHE_BACKEND,
+        'LOCATION': CACHE_LOCATION,
+    },
+    # Rendered quiz payloads, keyed by quiz version. LocMemCache evicts least
+    # recently used entries once MAX_ENTRIES is reached.
+    'responses': {
+        'BACKEND': CACHE_BACKEND,
+        'LOCATION': CACHE_LOCATION or 'responses',
+        'KEY_PREFIX': 'responses',
+        'TIMEOUT': int(os.environ.get('RESPONSE_CACHE_TIMEOUT', 3600)),
+        **({'OPTIONS': {'MAX_ENTRIES': int(os.environ.get('RESPONSE_CACHE_MAX_ENTRIES', 2000))}} if LOCAL_CACHE else {}),
+    },
+    # Users resolved by JWT authentication, keyed by user id and version
+    'users': {
+        'BACKEND': CACHE_BACKEND,
+        'LOCATION': CACHE_LOCATION or 'users',
+        'KEY_PREFIX': 'users',
+        'TIMEOUT': int(os.environ.get('USER_CACHE_TIMEOUT', 60)),
+        **({'OPTIONS': {'MAX_ENTRIES': int(os.environ.get('USER_CACHE_MAX_ENTRIES', 5000))}} if LOCAL_CACHE else {}),
+    },
 }
 
+RESPONSE_CACHE_ALIAS = 'responses'
+USER_CACHE_ALIAS = 'users'
+
+# Seconds a quiz version token lives. Bumps only reach the worker that made
+# them when the cache is process-local, so tokens expire there to bound how
+# long other workers can serve stale data.
+QUIZ_VERSION_TIMEOUT = 60 if LOCAL_CACHE else None
+
+# Serve authenticated users from the 'users' cache. On by default only when
+# the cache is shared: with the default process-local cache this is off, and
+# every request loads its user by primary key as plain simplejwt does. A
+# process-local copy would keep a deactivated, deleted or re-passworded user
+# valid for up to USER_CACHE_TIMEOUT on every worker but the one that changed
+# it; set CACHE_AUTHENTICATED_USERS=1 to accept that lag anyway.
+CACHE_AUTHENTICATED_USERS = os.environ.get('CACHE_AUTHENTICATED_USERS', '0' if LOCAL_CACHE else '1') == '1'
+
+# Autosaved quiz answers are buffered in the cache between writes only when
+# the cache is shared; with the process-local one each worker would buffer
+# its own copy, so every save writes the session row instead.
+QUIZ_SESSION_WRITE_BEHIND = not LOCAL_CACHE
+
+# Timed quizzes accept take_quiz without a started session unless this is
+# set; only sessions enforce the time limit then.
+QUIZ_SESSION_REQUIRED = os.environ.get('QUIZ_SESSION_REQUIRED') == '1'
+
+# Migration 0008 adds the one-attempt-per-student constraint. It stops and
+# lists any duplicate attempts unless this is set, in which case it keeps
+# each student's first attempt and deletes the rest; run rebuild_analytics and
+# rebuild_leaderboards afterwards.
+REMOVE_DUPLICATE_ATTEMPTS = os.environ.get('REMOVE_DUPLICATE_ATTEMPTS') == '1'
+
 AUTHENTICATION_BACKENDS = [
     'django.contrib.auth.backends.ModelBackend',
 ]
 
 AUTH_USER_MODEL = 'api.CustomUser'  # Replace 'yourappname' with your actual app name
 
+# Password hashing. PBKDF2 with a configurable work factor; stored hashes
+# with another iteration count are rehashed on the next login. Login hashing
+# runs on a pool of LOGIN_HASH_WORKERS threads (default: one per core).
+
+PASSWORD_HASHERS = [
+    'api.hashers.ConfigurablePBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
+PASSWORD_HASH_ITERATIONS = int(os.environ.get('PASSWORD_HASH_ITERATIONS', 870000))
+LOGIN_HASH_WORKERS = int(os.environ.get('LOGIN_HASH_WORKERS', 0)) or None
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -180,6 +330,18 @@ STATICFILES_STORAGE = "whitenoise.storage.CompressedManifestStaticFilesStorage"
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Profile pictures are held in memory while they upload and refused once
+# they pass PROFILE_PICTURE_MAX_BYTES, or when their header names an image
+# wider or taller than PROFILE_PICTURE_MAX_DIMENSION (see api/uploads.py).
+
+FILE_UPLOAD_HANDLERS = [
+    'api.uploads.BoundedUploadHandler',
+    'django.core.files.uploadhandler.MemoryFileUploadHandler',
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+]
+PROFILE_PICTURE_MAX_BYTES = int(os.environ.get('PROFILE_PICTURE_MAX_BYTES', 5 * 1024 * 1024))
+PROFILE_PICTURE_MAX_DIMENSION = int(os.environ.get('PROFILE_PICTURE_MAX_DIMENSION', 4096))
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 